@@ -0,0 +1,86 @@
+import os
+import time
+import argparse
+import torch.nn as nn
+import torch.optim as optim
+from handdata import HandPositionDataset, build_transforms, IMAGE_EXTENSIONS
+from handmodels import build_model, BACKBONES
+from loaderconfig import make_loader, set_threads
+from tensorcache import TensorCache, CachedHandPositionDataset, IMAGENET_MEAN, IMAGENET_STD
+
+# Throughput benchmark for the training input pipeline.
+# For each worker count reports images/sec for
+#   load  - iterating the DataLoader only
+#   train - DataLoader + forward/backward/optimizer step
+# e.g. python benchloader.py --data clapsgood --workers 0,2,4 --threads 8 --cache
+
+
+def run_batches(loader, num_batches, step=None):
+    images_seen = 0
+    start = None
+    for i, (images, labels) in enumerate(loader):
+        if i == 0:
+            # first batch pays for worker start-up, time from the second one on
+            start = time.perf_counter()
+            continue
+        if step:
+            step(images, labels)
+        images_seen += images.size(0)
+        if i >= num_batches:
+            break
+    elapsed = time.perf_counter() - start if start else 0.0
+    return images_seen / elapsed if elapsed > 0 else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DataLoader settings for the training scripts')
+    parser.add_argument('--data', default='clapsgood', help='Image folder')
+    parser.add_argument('--size', type=int, default=224, help='Input resolution')
+    parser.add_argument('--model', default='mobilenet_v3_large', choices=sorted(BACKBONES))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--batches', type=int, default=20, help='Timed batches per configuration')
+    parser.add_argument('--workers', default='0,2,4', help='Comma separated worker counts')
+    parser.add_argument('--prefetch-factor', type=int, default=2)
+    parser.add_argument('--pin-memory', action='store_true')
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    parser.add_argument('--cache', action='store_true', help='Read from the tensorcache.py memmap instead of PNGs')
+    args = parser.parse_args()
+
+    num_threads = set_threads(args.threads)
+    file_list = sorted(os.path.join(args.data, f) for f in os.listdir(args.data)
+                       if f.lower().endswith(IMAGE_EXTENSIONS))
+    labels = [0] * len(file_list)  # labels don't matter for throughput
+
+    if args.cache:
+        cache = TensorCache(file_list, size=args.size, dtype='float16', mean=IMAGENET_MEAN, std=IMAGENET_STD)
+        dataset = CachedHandPositionDataset(cache, file_list, labels)
+    else:
+        dataset = HandPositionDataset(file_list, labels, transform=build_transforms(args.size))
+
+    model = build_model(args.model, image_size=args.size)
+    model.train()
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+
+    def train_step(images, labels):
+        optimizer.zero_grad()
+        loss = criterion(model(images), labels)
+        loss.backward()
+        optimizer.step()
+
+    print(f'{len(file_list)} images, model {args.model}, batch {args.batch_size}, '
+          f'torch threads {num_threads}, cache {args.cache}')
+    print(f'{"workers":>8} {"load img/s":>12} {"train img/s":>12}')
+
+    for num_workers in [int(w) for w in args.workers.split(',')]:
+        def loader():
+            return make_loader(dataset, args.batch_size, shuffle=True, num_workers=num_workers,
+                               prefetch_factor=args.prefetch_factor, pin_memory=args.pin_memory)
+
+        load_rate = run_batches(loader(), args.batches)
+        train_rate = run_batches(loader(), args.batches, step=train_step)
+        print(f'{num_workers:>8} {load_rate:>12.1f} {train_rate:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+import json
+import time
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from handdata import get_image_paths_and_labels, split_dataset, label_names
+from handmodels import load_model, INPUT_CONFIG, BACKBONES
+from framepreprocess import FramePreprocessor
+from loaderconfig import set_threads
+
+# Two-stage cascade: a cheap model classifies every frame, the heavy one only
+# runs on frames where the cheap one is unsure.
+#   python cascade.py --fast-backbone slimcnn --fast-model slimcnn_distilled.pth \
+#       --heavy-backbone efficientnet_v2_s --heavy-model 1efficientnetv2_clapsgood.pth \
+#       --data clapsgood --label-scheme name --output cascade.json
+#   engine = CascadeClassifier.from_config('cascade.json')
+#   predictions, probabilities, escalated = engine(frames)     # uint8 RGB frames
+# A frame escalates when the fast stage's top-1 probability ('confidence') or
+# top-1 minus top-2 probability ('margin') is below the threshold. The threshold
+# is calibrated on half of the validation split: the lowest one whose cascade
+# accuracy stays within --tolerance points of the heavy model alone. The other
+# half reports accuracy, escalation rate and measured per-frame cost.
+# Both stages are image models: the capture folders have no joint coordinates
+# to pair with landmarks.py, so a joint-based first stage can't be calibrated here.
+
+
+class Stage:
+    def __init__(self, backbone, model_path, batch_size=32):
+        input_config = INPUT_CONFIG[backbone]
+        self.backbone = backbone
+        self.model_path = model_path
+        self.model = load_model(backbone, model_path, num_classes=len(label_names),
+                                image_size=input_config['image_size'])
+        self.kernel = FramePreprocessor(input_config['image_size'], input_config['normalize'])
+        self.batch_size = batch_size
+
+    # frames: uint8 [N, H, W, 3] or a list of [H, W, 3] (sizes may differ)
+    def __call__(self, frames):
+        probabilities = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            if isinstance(chunk, np.ndarray):
+                batch = self.kernel(chunk)
+            else:
+                batch = np.concatenate([self.kernel(frame) for frame in chunk])
+            with torch.no_grad():
+                probabilities.append(torch.softmax(self.model(torch.from_numpy(batch)), 1).numpy())
+        return np.concatenate(probabilities)
+
+
+def gate_scores(probabilities, criterion='confidence'):
+    if criterion == 'confidence':
+        return probabilities.max(1)
+    top2 = np.partition(probabilities, -2, axis=1)[:, -2:]
+    return top2[:, 1] - top2[:, 0]
+
+
+class CascadeClassifier:
+    def __init__(self, fast, heavy, threshold, criterion='confidence'):
+        if criterion not in ('confidence', 'margin'):
+            raise ValueError(f'Unknown criterion: {criterion}')
+        self.fast = fast
+        self.heavy = heavy
+        self.threshold = threshold
+        self.criterion = criterion
+        self.frames = 0
+        self.escalated = 0
+
+    @classmethod
+    def from_config(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+        return cls(Stage(config['fast']['backbone'], config['fast']['model']),
+                   Stage(config['heavy']['backbone'], config['heavy']['model']),
+                   config['threshold'], config['criterion'])
+
+    def save(self, path, **extra):
+        config = {'fast': {'backbone': self.fast.backbone, 'model': self.fast.model_path},
+                  'heavy': {'backbone': self.heavy.backbone, 'model': self.heavy.model_path},
+                  'criterion': self.criterion, 'threshold': self.threshold}
+        config.update(extra)
+        with open(path, 'w') as f:
+            json.dump(config, f, indent=2)
+
+    def __call__(self, frames):
+        probabilities = self.fast(frames)
+        escalated = gate_scores(probabilities, self.criterion) < self.threshold
+        if escalated.any():
+            indices = np.flatnonzero(escalated)
+            if isinstance(frames, np.ndarray):
+                subset = frames[indices]
+            else:
+                subset = [frames[i] for i in indices]
+            probabilities[indices] = self.heavy(subset)
+        self.frames += len(escalated)
+        self.escalated += int(escalated.sum())
+        return probabilities.argmax(1), probabilities, escalated
+
+    @property
+    def escalation_rate(self):
+        return self.escalated / self.frames if self.frames else 0.
+
+
+# Lowest threshold whose cascade accuracy is within `tolerance` points of the
+# heavy model. Frames with score < threshold escalate; thresholds are only tried
+# between distinct scores so ties stay on one side.
+def calibrate(scores, fast_predictions, heavy_predictions, labels, tolerance=0.):
+    order = np.argsort(scores, kind='stable')
+    scores = scores[order]
+    fast_correct = (fast_predictions == labels)[order]
+    heavy_correct = (heavy_predictions == labels)[order]
+    n = len(scores)
+    # escalate the first k frames: heavy on [0, k), fast on [k, n)
+    accuracy = 100. * (np.concatenate([[0], np.cumsum(heavy_correct)]) +
+                       np.concatenate([np.cumsum(fast_correct[::-1])[::-1], [0]])) / n
+    boundaries = np.concatenate([[0], np.flatnonzero(np.diff(scores)) + 1, [n]])
+    target = 100. * heavy_correct.mean() - tolerance
+    k = next(k for k in boundaries if accuracy[k] >= target - 1e-9)
+    threshold = float(scores[k]) if k < n else float('inf')
+    return threshold, accuracy[k], k / n
+
+
+def load_frames(files):
+    return [np.asarray(Image.open(f).convert('RGB')) for f in files]
+
+
+def per_frame_ms(fn, frames):
+    fn(frames[:1])  # warm-up
+    start = time.perf_counter()
+    for i in range(len(frames)):
+        fn(frames[i:i + 1])
+    return (time.perf_counter() - start) / len(frames) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Calibrate and evaluate a two-stage gesture cascade')
+    parser.add_argument('--fast-backbone', default='slimcnn', choices=sorted(BACKBONES))
+    parser.add_argument('--fast-model', required=True)
+    parser.add_argument('--heavy-backbone', default='efficientnet_v2_s', choices=sorted(BACKBONES))
+    parser.add_argument('--heavy-model', default='1efficientnetv2_clapsgood.pth')
+    parser.add_argument('--data', default='clapsgood')
+    parser.add_argument('--label-scheme', default='name', choices=['clap', 'name'])
+    parser.add_argument('--criterion', default='confidence', choices=['confidence', 'margin'])
+    parser.add_argument('--tolerance', type=float, default=0., help='Accuracy points the cascade may lose vs the heavy model')
+    parser.add_argument('--timing-frames', type=int, default=50, help='Frames timed one by one for the cost estimate')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--output', default='cascade.json')
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    file_list, labels = get_image_paths_and_labels(args.data, args.label_scheme)
+    _, val_files, _, val_labels = split_dataset(file_list, labels)
+    frames = load_frames(val_files)
+    val_labels = np.array(val_labels)
+    # calibrate on one half of the validation split, report on the other
+    calibration, evaluation = np.arange(0, len(frames), 2), np.arange(1, len(frames), 2)
+
+    fast = Stage(args.fast_backbone, args.fast_model)
+    heavy = Stage(args.heavy_backbone, args.heavy_model)
+    fast_probabilities = fast(frames)
+    heavy_predictions = heavy(frames).argmax(1)
+    scores = gate_scores(fast_probabilities, args.criterion)
+    fast_predictions = fast_probabilities.argmax(1)
+
+    threshold, calibration_acc, calibration_rate = calibrate(
+        scores[calibration], fast_predictions[calibration], heavy_predictions[calibration],
+        val_labels[calibration], args.tolerance)
+    print(f'Calibrated on {len(calibration)} frames: {args.criterion} threshold {threshold:.4f}, '
+          f'escalation {calibration_rate:.1%}, cascade acc {calibration_acc:.2f}%')
+
+    escalated = scores[evaluation] < threshold
+    cascade_predictions = np.where(escalated, heavy_predictions[evaluation], fast_predictions[evaluation])
+    labels_eval = val_labels[evaluation]
+    accuracy = {name: 100. * (predictions == labels_eval).mean() for name, predictions in
+                (('fast', fast_predictions[evaluation]), ('heavy', heavy_predictions[evaluation]),
+                 ('cascade', cascade_predictions))}
+
+    engine = CascadeClassifier(fast, heavy, threshold, args.criterion)
+    timing = [frames[i] for i in evaluation[:args.timing_frames]]
+    cost = {'fast': per_frame_ms(fast, timing), 'heavy': per_frame_ms(heavy, timing),
+            'cascade': per_frame_ms(engine, timing)}
+    print(f'{"model":>8} {"acc %":>7} {"escalated":>10} {"ms/frame":>9} {"vs heavy":>9}')
+    for name in ('fast', 'heavy', 'cascade'):
+        rate = f'{escalated.mean():.1%}' if name == 'cascade' else ''
+        print(f'{name:>8} {accuracy[name]:>7.2f} {rate:>10} {cost[name]:>9.2f} {cost["heavy"] / cost[name]:>8.2f}x')
+
+    engine.save(args.output, calibration={'frames': len(calibration), 'escalation_rate': calibration_rate,
+                                          'accuracy': calibration_acc, 'tolerance': args.tolerance},
+                evaluation={'frames': len(evaluation), 'escalation_rate': float(escalated.mean()),
+                            'accuracy': accuracy, 'ms_per_frame': cost})
+    print(f'Cascade config written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
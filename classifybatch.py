@@ -0,0 +1,182 @@
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+from handdata import label_names, IMAGE_EXTENSIONS
+from framepreprocess import FramePreprocessor
+from handmodels import load_model, INPUT_CONFIG, BACKBONES
+from loaderconfig import set_threads
+
+# Batched version of classifyimagetransfer.py for relabelling / auditing captures.
+#   python classifybatch.py captures/ "clapsgood/*left*.png" > predictions.jsonl
+#   find captures -name "*.png" | python classifybatch.py - --batch-size 64
+# Images are decoded + preprocessed in a thread pool and grouped into batches of
+# up to --batch-size, waiting at most --max-latency-ms for a batch to fill up.
+# Output is one JSON line per image with the label and all class probabilities.
+
+_END = object()
+
+
+# Expand directories, globs and '-' (one path per line on stdin) into image paths
+def iter_paths(inputs):
+    for item in inputs:
+        if item == '-':
+            for line in sys.stdin:
+                line = line.strip()
+                if line:
+                    yield line
+        elif os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(item, name)
+        elif glob.has_magic(item):
+            yield from sorted(glob.glob(item, recursive=True))
+        else:
+            yield item
+
+
+# Same output as build_transforms(image_size, normalize), via framepreprocess.py.
+# raw=True stops after the resize: uint8 [H, W, 3] for exportonnx.py graphs,
+# which do ToTensor/Normalize themselves.
+# One kernel per thread, the kernel reuses its buffers between calls.
+class Preprocessor:
+    def __init__(self, image_size=224, normalize=True, raw=False):
+        self.image_size = image_size
+        self.normalize = normalize
+        self.raw = raw
+        self.local = threading.local()
+
+    def __call__(self, path):
+        kernel = getattr(self.local, 'kernel', None)
+        if kernel is None:
+            kernel = self.local.kernel = FramePreprocessor(self.image_size, self.normalize)
+        image = np.asarray(Image.open(path).convert('RGB'))
+        if self.raw:
+            return torch.from_numpy(kernel.resize_frames(image)[0].copy())
+        return torch.from_numpy(kernel(image)[0].copy())
+
+
+# Yields lists of (path, tensor or exception), in input order.
+# Decoding runs ahead in the pool (bounded to a few batches in flight).
+def iter_batches(paths, preprocess, batch_size=32, max_latency=0.05, num_workers=4):
+    pending = queue.Queue(maxsize=batch_size * 2)
+
+    def submit_all(pool):
+        for path in paths:
+            pending.put((path, pool.submit(preprocess, path)))
+        pending.put(_END)
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        producer = threading.Thread(target=submit_all, args=(pool,), daemon=True)
+        producer.start()
+
+        batch = []
+        deadline = None
+        finished = False
+        while not finished:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = pending.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _END:
+                finished = True
+            elif item is not None:
+                path, future = item
+                try:
+                    batch.append((path, future.result()))
+                except Exception as e:
+                    batch.append((path, e))
+                if deadline is None:
+                    deadline = time.monotonic() + max_latency
+
+            full = len(batch) >= batch_size
+            expired = deadline is not None and time.monotonic() >= deadline
+            if batch and (full or expired or finished):
+                yield batch
+                batch = []
+                deadline = None
+
+        producer.join()
+
+
+def predict_batch(model, images, device):
+    with torch.no_grad():
+        outputs = model(torch.stack(images).to(device))
+        return torch.softmax(outputs.float(), dim=1).cpu()
+
+
+def classify(model, paths, device, out, batch_size=32, max_latency=0.05, num_workers=4,
+             image_size=224, normalize=True):
+    preprocess = Preprocessor(image_size, normalize, raw=getattr(model, 'takes_frames', False))
+    count = 0
+    start = time.perf_counter()
+
+    for batch in iter_batches(paths, preprocess, batch_size, max_latency, num_workers):
+        images = [image for _, image in batch if not isinstance(image, Exception)]
+        probabilities = iter(predict_batch(model, images, device).tolist() if images else [])
+
+        for path, image in batch:
+            if isinstance(image, Exception):
+                out.write(json.dumps({'path': path, 'error': str(image)}) + '\n')
+                continue
+            probs = next(probabilities)
+            index = max(range(len(probs)), key=probs.__getitem__)
+            out.write(json.dumps({
+                'path': path,
+                'label': label_names[index],
+                'index': index,
+                'confidence': round(probs[index], 6),
+                'probabilities': {name: round(p, 6) for name, p in zip(label_names, probs)},
+            }) + '\n')
+        out.flush()
+        count += len(batch)
+
+    elapsed = time.perf_counter() - start
+    print(f'Classified {count} images in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} img/s)', file=sys.stderr)
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify many hand gesture images, JSONL output')
+    parser.add_argument('inputs', nargs='+', help="Image files, directories, globs or '-' for paths on stdin")
+    parser.add_argument('--model', default='mobilenetv3_hand_position.pth', help='Trained state_dict')
+    parser.add_argument('--backbone', default='mobilenet_v3_large', choices=sorted(BACKBONES))
+    parser.add_argument('--onnx', help='Run this exported ONNX model with onnxruntime instead of --model')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-latency-ms', type=float, default=50, help='Max wait for a batch to fill up')
+    parser.add_argument('--workers', type=int, default=4, help='Decode/preprocess threads')
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    parser.add_argument('--output', default='-', help="JSONL file, '-' for stdout")
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    input_config = INPUT_CONFIG[args.backbone]
+    if args.onnx:
+        from onnxinfer import OnnxClassifier
+        model = OnnxClassifier(args.onnx, intra_op_threads=args.threads)
+    else:
+        model = load_model(args.backbone, args.model, num_classes=len(label_names),
+                           image_size=input_config['image_size'], device=device)
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        classify(model, iter_paths(args.inputs), device, out, batch_size=args.batch_size,
+                 max_latency=args.max_latency_ms / 1000, num_workers=args.workers, **input_config)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
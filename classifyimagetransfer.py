@@ -3,6 +3,7 @@ import torch.nn as nn
 import torchvision.transforms as transforms
 from torchvision import models
 from PIL import Image
+from handconstants import label_names
 
 # Device setup
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -12,16 +13,7 @@ MODEL_PATH = 'mobilenetv3_hand_position.pth'
 IMAGE_PATH = "samp.png"
 
 # Class labels
-label_map = {
-    0: "left",
-    1: "up",
-    2: "right",
-    3: "down",
-    4: "backwards",
-    5: "forward",
-    6: "turn left",
-    7: "turn right"
-}
+label_map = dict(enumerate(label_names))
 
 # Load MobileNetV3 model
 def load_model(model_path, num_classes=8):
@@ -51,8 +43,9 @@ def predict(image_path, model):
         _, predicted = torch.max(outputs, 1)
     return label_map[predicted.item()]
 
-# Load model and predict
-model = load_model(MODEL_PATH)
-prediction = predict(IMAGE_PATH, model)
+# Load model and predict (for many images at once use classifybatch.py)
+if __name__ == '__main__':
+    model = load_model(MODEL_PATH)
+    prediction = predict(IMAGE_PATH, model)
 
-print(f"Predicted class: {prediction}")
+    print(f"Predicted class: {prediction}")
@@ -0,0 +1,264 @@
+import os
+import re
+import csv
+import json
+import argparse
+import numpy as np
+from PIL import Image
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from handdata import get_image_paths_and_labels, label_names
+from incremental import content_hash
+from tensorcache import file_signature
+
+# Index + near-duplicate removal for the capture folders (newdata, clapsgood).
+# The frames come from a continuous stream, so most of them are near-identical.
+#   python dataindex.py newdata --label-scheme clap --split-file newdata_split.csv
+#   python dataindex.py clapsgood --label-scheme name --keep coreset --per-cluster 3
+#   python handtrain.py --preset mobilenet --split-file newdata_split.csv
+# The index (dataset_index/<folder>.json) stores per image: path, label, file
+# size, image size, mtime, sha1 and a 64-bit perceptual hash (DCT pHash); only
+# new or modified images are read again. Images whose pHashes are within
+# --threshold bits are clustered (blockwise XOR + popcount, connected components)
+# per label. --keep dedup keeps the medoid of every cluster, --keep coreset up to
+# --per-cluster frames spread over the cluster's time range, --keep all every image.
+# Capture sessions are runs of frames without a gap of more than --session-gap
+# seconds (mtime), or a --session-pattern regex on the file name; the train/val
+# split is grouped by session so frames of one recording never land on both sides.
+# Whole groups go to val while that brings the per-label val counts closer to
+# --test-size of the images; if sessions can't give a val side with every label
+# (e.g. only two long recordings), the split is grouped by cluster instead.
+# The split file (path,label,split,session,cluster) is what --split-file reads;
+# its paths are relative to the split file, so it works from any directory.
+
+INDEX_DIR = 'dataset_index'
+INDEX_VERSION = 1
+HASH_SIZE = 8  # 8x8 DCT coefficients -> 64 bits
+DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2. / n)
+    matrix[0] /= np.sqrt(2.)
+    return matrix
+
+
+DCT = _dct_matrix(DCT_SIZE)[:HASH_SIZE]
+
+
+# pHash: 32x32 grayscale -> 2D DCT -> 8x8 lowest frequencies > their median
+def perceptual_hash(image):
+    pixels = np.asarray(image.convert('L').resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS), dtype=np.float64)
+    coefficients = DCT @ pixels @ DCT.T
+    bits = (coefficients > np.median(coefficients.reshape(-1)[1:])).reshape(-1)  # median without the DC term
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(x):
+        return np.bitwise_count(x)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(x):
+        return _POPCOUNT_TABLE[x[..., None].view(np.uint8)].sum(-1, dtype=np.uint8)
+
+
+def hamming(a, b):
+    return popcount(a[:, None] ^ b[None, :])
+
+
+def index_path(folder):
+    return os.path.join(INDEX_DIR, os.path.basename(os.path.normpath(folder)) + '.json')
+
+
+def build_index(folder, label_scheme='clap'):
+    path = index_path(folder)
+    old = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            index = json.load(f)
+        if index.get('version') == INDEX_VERSION and index.get('label_scheme') == label_scheme:
+            old = {e['path']: e for e in index['entries']}
+
+    file_list, labels = get_image_paths_and_labels(folder, label_scheme)
+    entries = []
+    updated = 0
+    for file_path, label in zip(file_list, labels):
+        mtime_ns, size = file_signature(file_path)
+        entry = old.get(file_path)
+        if entry is None or entry['mtime_ns'] != mtime_ns or entry['size'] != size:
+            with Image.open(file_path) as image:
+                width, height = image.size
+                phash = perceptual_hash(image)
+            entry = {'path': file_path, 'label': label, 'size': size, 'width': width, 'height': height,
+                     'mtime_ns': mtime_ns, 'sha1': content_hash(file_path), 'phash': f'{phash:016x}'}
+            updated += 1
+        entries.append(dict(entry, label=label))
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'folder': folder, 'label_scheme': label_scheme, 'entries': entries}, f)
+    os.replace(path + '.tmp', path)
+    print(f'Indexed {len(entries)} images in {folder} ({updated} new or changed) -> {path}')
+    return entries
+
+
+# Connected components of the "within threshold bits" graph, computed blockwise
+# so memory stays at ~block x N distances
+def cluster_hashes(hashes, threshold, max_cells=4000000):
+    n = len(hashes)
+    block = max(1, max_cells // max(n, 1))
+    rows, cols = [], []
+    for start in range(0, n, block):
+        i, j = np.nonzero(hamming(hashes[start:start + block], hashes) <= threshold)
+        i += start
+        upper = i < j
+        rows.append(i[upper])
+        cols.append(j[upper])
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.intp)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+def sessions_from_times(mtimes_ns, gap_seconds):
+    order = np.argsort(mtimes_ns, kind='stable')
+    gaps = np.diff(np.asarray(mtimes_ns)[order]) > gap_seconds * 1e9
+    sessions = np.empty(len(order), dtype=np.int64)
+    sessions[order] = np.concatenate([[0], np.cumsum(gaps)])
+    return [f'session{s:03d}' for s in sessions]
+
+
+def sessions_from_names(paths, pattern):
+    regex = re.compile(pattern)
+    sessions = []
+    for path in paths:
+        match = regex.search(os.path.basename(path))
+        sessions.append((match.group(1) if match.groups() else match.group(0)) if match else 'unknown')
+    return sessions
+
+
+def medoid(members, hashes, max_cells=4000000):
+    if len(members) <= 2:
+        return members[0]
+    block = max(1, max_cells // len(members))
+    totals = np.concatenate([hamming(hashes[members[i:i + block]], hashes[members]).sum(1, dtype=np.int64)
+                             for i in range(0, len(members), block)])
+    return members[int(totals.argmin())]
+
+
+# members sorted by time; keep `count` spread evenly over the cluster
+def spread(members, count):
+    if len(members) <= count:
+        return list(members)
+    return [members[i] for i in np.unique(np.linspace(0, len(members) - 1, count).round().astype(int))]
+
+
+def select(entries, clusters, hashes, keep, per_cluster):
+    if keep == 'all':
+        return list(range(len(entries)))
+    by_cluster = {}
+    for i in sorted(range(len(entries)), key=lambda i: entries[i]['mtime_ns']):
+        by_cluster.setdefault(clusters[i], []).append(i)
+    if keep == 'dedup':
+        return sorted(medoid(members, hashes) for members in by_cluster.values())
+    return sorted(i for members in by_cluster.values() for i in spread(members, per_cluster))
+
+
+# Greedy grouped split: groups in seeded random order, largest first, go to val
+# when that reduces the total per-label distance to test_size of the images.
+def group_split(groups, labels, test_size=0.2, seed=42):
+    names, group_index = np.unique(groups, return_inverse=True)
+    counts = np.zeros((len(names), len(label_names)), dtype=np.int64)
+    np.add.at(counts, (group_index, labels), 1)
+    target = test_size * counts.sum(0)
+    order = np.random.default_rng(seed).permutation(len(names))
+    order = order[np.argsort(-counts[order].sum(1), kind='stable')]
+    val = np.zeros(len(label_names))
+    in_val = np.zeros(len(names), dtype=bool)
+    for g in order:
+        if np.abs(val + counts[g] - target).sum() < np.abs(val - target).sum():
+            val += counts[g]
+            in_val[g] = True
+    is_val = in_val[group_index]
+    return np.flatnonzero(~is_val), np.flatnonzero(is_val)
+
+
+# Labels that have train images but no val images (every train label if val is empty)
+def missing_val_labels(labels, train_idx, val_idx):
+    return sorted(set(labels[train_idx].tolist()) - set(labels[val_idx].tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index a capture folder and remove near-duplicate frames')
+    parser.add_argument('folder', nargs='?', default='newdata')
+    parser.add_argument('--label-scheme', default='clap', choices=['clap', 'name'])
+    parser.add_argument('--threshold', type=int, default=6, help='Max pHash Hamming distance (of 64 bits) for a near-duplicate')
+    parser.add_argument('--keep', default='dedup', choices=['dedup', 'coreset', 'all'])
+    parser.add_argument('--per-cluster', type=int, default=3, help='Frames kept per cluster with --keep coreset')
+    parser.add_argument('--session-gap', type=float, default=60., help='Seconds between frames that start a new session')
+    parser.add_argument('--session-pattern', help='Regex on the file name for the session id (first group, if any)')
+    parser.add_argument('--test-size', type=float, default=0.2, help='Share of the kept images (per label) for val')
+    parser.add_argument('--split-file', help='Write path,label,split,session,cluster for handtrain.py --split-file')
+    args = parser.parse_args()
+
+    entries = build_index(args.folder, args.label_scheme)
+    if not entries:
+        raise RuntimeError(f'No labelled images found in {args.folder}')
+    hashes = np.array([int(e['phash'], 16) for e in entries], dtype=np.uint64)
+    labels = np.array([e['label'] for e in entries])
+
+    # cluster across labels first: a cluster with several labels is probably mislabelled
+    components = cluster_hashes(hashes, args.threshold)
+    pairs = np.unique(np.stack([components, labels], 1), axis=0)
+    mixed = int((np.bincount(pairs[:, 0]) > 1).sum())
+    cluster_ids = {key: i for i, key in enumerate(sorted(set(zip(components.tolist(), labels.tolist()))))}
+    clusters = np.array([cluster_ids[key] for key in zip(components.tolist(), labels.tolist())])
+    exact = len(entries) - len({e['sha1'] for e in entries})
+
+    if args.session_pattern:
+        sessions = sessions_from_names([e['path'] for e in entries], args.session_pattern)
+    else:
+        sessions = sessions_from_times([e['mtime_ns'] for e in entries], args.session_gap)
+    selected = select(entries, clusters, hashes, args.keep, args.per_cluster)
+    train_idx, val_idx = group_split(np.array(sessions)[selected], labels[selected], args.test_size)
+    if missing_val_labels(labels[selected], train_idx, val_idx):
+        print(f'{len(set(sessions))} capture sessions can\'t give a val split with every label, '
+              f'grouping the split by cluster instead')
+        train_idx, val_idx = group_split(clusters[selected], labels[selected], args.test_size)
+    missing = missing_val_labels(labels[selected], train_idx, val_idx)
+    if missing:
+        print(f'Warning: no val images for {", ".join(label_names[label] for label in missing)}')
+    split = {selected[i]: 'train' for i in train_idx}
+    split.update({selected[i]: 'val' for i in val_idx})
+    crossing = len({clusters[i] for i, s in split.items() if s == 'train'} &
+                   {clusters[i] for i, s in split.items() if s == 'val'})
+
+    print(f'{len(entries)} images: {exact} exact duplicates, {len(cluster_ids)} near-duplicate clusters '
+          f'(threshold {args.threshold} bits), {len(set(sessions))} sessions')
+    if mixed:
+        print(f'Warning: {mixed} clusters contain more than one label (check for mislabelled frames)')
+    print(f'Keeping {len(selected)} images ({args.keep}): {len(train_idx)} train / {len(val_idx)} val, '
+          f'{crossing} clusters on both sides')
+    print(f'{"label":>12} {"images":>7} {"clusters":>9} {"kept":>6}')
+    for label, name in enumerate(label_names):
+        mask = labels == label
+        kept = sum(labels[i] == label for i in selected)
+        print(f'{name:>12} {int(mask.sum()):>7} {len(set(clusters[mask])):>9} {kept:>6}')
+
+    if args.split_file:
+        root = os.path.dirname(os.path.abspath(args.split_file))
+        with open(args.split_file, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['path', 'label', 'split', 'session', 'cluster'])
+            for i in selected:
+                path = os.path.relpath(os.path.abspath(entries[i]['path']), root)
+                writer.writerow([path, entries[i]['label'], split[i], sessions[i], clusters[i]])
+        print(f'Split written to {args.split_file}')
+
+
+if __name__ == '__main__':
+    main()
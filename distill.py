@@ -0,0 +1,164 @@
+import os
+import math
+import time
+import hashlib
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+from torch.utils.data import Dataset, DataLoader
+from handdata import build_datasets, datasets_from_files, label_names
+from handmodels import build_model, load_model, INPUT_CONFIG
+from handtrain import autocast
+from featurecache import FEATURE_CACHE_DIR, feature_cache_path
+from incremental import evaluate
+from loaderconfig import make_loader, set_threads
+from onnxinfer import time_batches
+from tensorcache import file_signature
+
+# Knowledge distillation: a trained EfficientNetV2-S (traineffic.py) teaches a
+# small student (slimcnn, mobilenet_v3_small, simplecnn, ...).
+#   python handtrain.py --preset distill
+#   python handtrain.py --preset distill --backbone slimcnn --image-size 128 --temperature 4 --alpha 0.9
+# The teacher runs once over the dataset with its own preprocessing; its logits
+# are stored in feature_cache/ (keyed by teacher checkpoint + file list) and
+# reused by every later run. The student minimizes
+#   alpha * T^2 * KL(softmax(teacher / T) || softmax(student / T)) + (1 - alpha) * CE(student, label)
+# Augmentation is off, the cached soft targets belong to the unmodified images.
+# The best epoch (student val accuracy) is saved, then student and teacher are
+# compared on accuracy, top-1 agreement, parameters, size and single-frame latency.
+
+
+class SoftTargetDataset(Dataset):
+    def __init__(self, dataset, logits):
+        self.dataset = dataset
+        self.logits = logits
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        image, label = self.dataset[idx]
+        return image, label, self.logits[idx]
+
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature=4., alpha=0.7):
+    soft = F.kl_div(F.log_softmax(student_logits / temperature, 1), F.softmax(teacher_logits / temperature, 1),
+                    reduction='batchmean') * temperature ** 2
+    return alpha * soft + (1. - alpha) * F.cross_entropy(student_logits, labels)
+
+
+# settings: the teacher's preprocessing (image_size, normalize), part of the cache key
+def teacher_logits(teacher, name, dataset, device, batch_size=32, settings=None):
+    path = feature_cache_path(name, dataset.file_list, dataset.labels, settings=settings)
+    if os.path.exists(path):
+        return torch.load(path)['logits']
+
+    start = time.time()
+    logits = []
+    teacher.eval()
+    with torch.no_grad():
+        for images, _ in DataLoader(dataset, batch_size=batch_size, shuffle=False):
+            logits.append(teacher(images.to(device)).float().cpu())
+    logits = torch.cat(logits)
+    print(f'Teacher logits for {len(logits)} images in {time.time() - start:.1f}s -> {path}')
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    torch.save({'logits': logits, 'labels': torch.as_tensor(dataset.labels)}, path)
+    return logits
+
+
+def model_stats(model, image_size, runs=20):
+    params = sum(p.numel() for p in model.parameters())
+    size_mb = sum(t.numel() * t.element_size() for t in model.state_dict().values()) / 1e6
+    model = model.cpu().eval()
+
+    def fn(batch):
+        with torch.no_grad():
+            model(batch)
+
+    p50, _, _ = time_batches(fn, torch.randn(1, 3, image_size, image_size), 1, runs)
+    return params, size_mb, p50
+
+
+def run_distill(config):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f'Using device: {device}')
+    print(f"Threads: {set_threads(config['num_threads'])}")
+
+    # same split for teacher and student, each with its own preprocessing
+    config = dict(config, augment=False)
+    train_dataset, val_dataset = build_datasets(config)
+    teacher_backbone = config['teacher_backbone']
+    teacher_input = INPUT_CONFIG[teacher_backbone]
+    teacher_config = dict(config, augment=False, **teacher_input)
+    teacher_train, teacher_val = datasets_from_files(teacher_config, train_dataset.file_list, train_dataset.labels,
+                                                     val_dataset.file_list, val_dataset.labels)
+
+    teacher = load_model(teacher_backbone, config['teacher_model'], num_classes=len(label_names),
+                         image_size=teacher_input['image_size'], device=device)
+    signature = hashlib.sha1(repr(file_signature(config['teacher_model'])).encode()).hexdigest()[:8]
+    name = f'teacher_{teacher_backbone}_{signature}'
+    train_logits = teacher_logits(teacher, name, teacher_train, device, config['batch_size'], teacher_input)
+    val_logits = teacher_logits(teacher, name, teacher_val, device, config['batch_size'], teacher_input)
+    val_labels = torch.as_tensor(val_dataset.labels)
+    teacher_acc = 100. * val_logits.argmax(1).eq(val_labels).float().mean().item()
+    print(f'Teacher val acc: {teacher_acc:.2f}%')
+
+    student = build_model(config['backbone'], num_classes=len(label_names), pretrained=config['pretrained'],
+                          image_size=config['image_size']).to(device)
+    train_loader = make_loader(SoftTargetDataset(train_dataset, train_logits), batch_size=config['batch_size'],
+                               shuffle=True, num_workers=config['num_workers'])
+    val_loader = make_loader(val_dataset, batch_size=config['batch_size'], shuffle=False, num_workers=config['num_workers'])
+    optimizer = optim.Adam(student.parameters(), lr=config['learning_rate'])
+    temperature, alpha = config['distill_temperature'], config['distill_alpha']
+
+    history = []
+    best_acc, best_state = float('nan'), None
+    start = time.perf_counter()
+    for epoch in range(config['num_epochs']):
+        epoch_start = time.perf_counter()
+        student.train()
+        running_loss = 0.0
+        correct = 0
+        total = 0
+        for images, labels, soft_targets in train_loader:
+            images, labels, soft_targets = images.to(device), labels.to(device), soft_targets.to(device)
+            optimizer.zero_grad()
+            with autocast(device, config['precision']):
+                outputs = student(images)
+            loss = distillation_loss(outputs.float(), soft_targets, labels, temperature, alpha)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item() * images.size(0)
+            correct += outputs.argmax(1).eq(labels).sum().item()
+            total += labels.size(0)
+
+        val_acc = evaluate(student, val_loader, device, config['precision'])
+        print(f"Epoch [{epoch+1}/{config['num_epochs']}] "
+              f'Distill Loss: {running_loss / total:.4f}, Train Acc: {100. * correct / total:.2f}% '
+              f'Val Acc: {val_acc:.2f}% (teacher {teacher_acc:.2f}%) Time: {time.perf_counter() - epoch_start:.1f}s')
+        history.append({'epoch': epoch + 1, 'train_loss': running_loss / total, 'train_acc': 100. * correct / total,
+                        'val_acc': val_acc, 'epoch_time': time.perf_counter() - epoch_start})
+        # the first epoch always counts; without validation images (nan) the last one is kept
+        if best_state is None or math.isnan(val_acc) or val_acc > best_acc:
+            best_acc = val_acc
+            best_state = {k: v.detach().clone() for k, v in student.state_dict().items()}
+    print(f'Total training time: {time.perf_counter() - start:.1f}s')
+
+    if best_state is not None:  # num_epochs 0: save the untrained student
+        student.load_state_dict(best_state)
+    torch.save(student.state_dict(), config['output'])
+    print(f"Best student (val acc {best_acc:.2f}%) saved to {config['output']}")
+
+    # student vs teacher
+    student.eval()
+    with torch.no_grad():
+        student_predictions = torch.cat([student(images.to(device)).argmax(1).cpu() for images, _ in val_loader])
+    agreement = 100. * student_predictions.eq(val_logits.argmax(1)).float().mean().item()
+    print(f'{"model":>28} {"val acc":>8} {"params M":>9} {"MB":>7} {"1-frame ms":>11}')
+    for label, model, image_size, acc in ((f'teacher {teacher_backbone}', teacher, teacher_input['image_size'], teacher_acc),
+                                          (f'student {config["backbone"]}', student, config['image_size'], best_acc)):
+        params, size_mb, latency = model_stats(model, image_size)
+        print(f'{label:>28} {acc:>8.2f} {params / 1e6:>9.2f} {size_mb:>7.1f} {latency:>11.2f}')
+    print(f'Student agrees with the teacher on {agreement:.1f}% of the validation images')
+    return student, history
@@ -0,0 +1,174 @@
+import io
+import os
+import json
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+import onnx
+from PIL import Image
+from handdata import label_names, build_transforms, IMAGE_EXTENSIONS
+from handmodels import load_model, INPUT_CONFIG, BACKBONES
+from tensorcache import IMAGENET_MEAN, IMAGENET_STD
+from onnxinfer import OnnxClassifier
+from classifybatch import classify, iter_paths
+
+# Deployment export for any of the three backbones (converteffic.py only does
+# EfficientNetV2-S with float NCHW input and the normalization left to the client).
+#   python exportonnx.py --backbone efficientnet_v2_s --model efficientnetv2_clapsgood.pth --images clapsgood
+#   python exportonnx.py --backbone simplecnn --model hand_position_classifier.pth --softmax
+#   python exportonnx.py --backbone mobilenet_v3_large --model mobilenetv3_hand_position.pth --flip-vertical
+# The graph takes the raw frame: uint8 [N, H, W, 3] at the model resolution (no
+# resize in the graph). uint8 -> float, /255, ImageNet mean/std (for backbones
+# trained with it) and the NHWC -> NCHW transpose are one Cast + Mul + Add +
+# Transpose in front of the network, so ProcessImageToTensor in dddtext.cs can
+# hand over pixel bytes as they are. --flip-vertical also bakes in the row flip
+# for bottom-up texture data (GetPixels), --softmax outputs probabilities.
+# Export is followed by constant folding / graph simplification (onnxsim if
+# installed, otherwise ONNX Runtime's provider independent basic optimizations)
+# and a numeric check against PyTorch + torchvision preprocessing on sample images.
+# With --images the exported file also goes through classifybatch.py end to end
+# (raw frames in, probabilities out) and has to agree with the PyTorch model.
+
+
+class DeployModel(nn.Module):
+    def __init__(self, model, normalize=True, softmax=False, flip_vertical=False, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        super().__init__()
+        self.model = model
+        self.softmax = softmax
+        self.flip_vertical = flip_vertical
+        # ToTensor (/255) and Normalize folded into one multiply-add per channel
+        mean = torch.tensor(mean if normalize else [0., 0., 0.]).view(1, 3, 1, 1)
+        std = torch.tensor(std if normalize else [1., 1., 1.]).view(1, 3, 1, 1)
+        self.register_buffer('scale', 1. / (255. * std))
+        self.register_buffer('bias', -mean / std)
+
+    def forward(self, frames):
+        if self.flip_vertical:
+            frames = torch.flip(frames, [1])
+        x = frames.permute(0, 3, 1, 2).float() * self.scale + self.bias
+        logits = self.model(x)
+        return torch.softmax(logits, 1) if self.softmax else logits
+
+
+def simplify(path):
+    try:
+        import onnxsim
+    except ImportError:
+        from onnxinfer import session_options
+        import onnxruntime as ort
+        optimized = path + '.opt.onnx'
+        ort.InferenceSession(path, session_options(optimization='basic', optimized_model_path=optimized),
+                             providers=['CPUExecutionProvider'])
+        # ORT splits some fused activations (e.g. HardSwish), keep whichever graph is smaller
+        if len(onnx.load(optimized).graph.node) > len(onnx.load(path).graph.node):
+            os.remove(optimized)
+            return 'torch constant folding only'
+        os.replace(optimized, path)
+        return 'onnxruntime basic'
+    model, ok = onnxsim.simplify(onnx.load(path))
+    if not ok:
+        raise RuntimeError('onnxsim could not validate the simplified model')
+    onnx.save(model, path)
+    return 'onnxsim'
+
+
+def export(backbone, model_path, output, softmax=False, flip_vertical=False, opset=17, simplify_graph=True):
+    input_config = INPUT_CONFIG[backbone]
+    size = input_config['image_size']
+    model = load_model(backbone, model_path, num_classes=len(label_names), image_size=size)
+    deploy = DeployModel(model, input_config['normalize'], softmax, flip_vertical).eval()
+
+    dummy = torch.randint(0, 256, (1, size, size, 3), dtype=torch.uint8)
+    output_name = 'probabilities' if softmax else 'logits'
+    torch.onnx.export(deploy, dummy, output, export_params=True, opset_version=opset, do_constant_folding=True,
+                      input_names=['frames'], output_names=[output_name],
+                      dynamic_axes={'frames': {0: 'batch_size'}, output_name: {0: 'batch_size'}}, dynamo=False)
+    nodes_before = len(onnx.load(output).graph.node)
+    simplifier = simplify(output) if simplify_graph else None
+
+    # labels + input contract for clients
+    onnx_model = onnx.load(output)
+    onnx.helper.set_model_props(onnx_model, {
+        'labels': json.dumps(label_names),
+        'backbone': backbone,
+        'input': f'uint8 NHWC [N, {size}, {size}, 3] RGB' + (', bottom row first' if flip_vertical else ''),
+        'output': output_name,
+        'normalization': 'imagenet' if input_config['normalize'] else 'none',
+    })
+    onnx.checker.check_model(onnx_model)
+    onnx.save(onnx_model, output)
+    print(f'Exported {output}: opset {opset}, {nodes_before} -> {len(onnx_model.graph.node)} nodes'
+          f'{f" ({simplifier})" if simplifier else ""}, {os.path.getsize(output) / 1e6:.1f} MB')
+    return deploy
+
+
+# Sample frames at the model resolution (resized like torchvision's Resize)
+def sample_frames(folder, size, limit=32):
+    if not folder:
+        return [Image.fromarray(a) for a in np.random.default_rng(0).integers(0, 256, (8, size, size, 3), dtype=np.uint8)]
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    return [Image.open(f).convert('RGB').resize((size, size), Image.BILINEAR) for f in files]
+
+
+def validate(deploy, onnx_path, frames, normalize, softmax, flip_vertical, atol=1e-3):
+    transform = build_transforms(frames[0].size[0], normalize)
+    with torch.no_grad():
+        expected = deploy.model(torch.stack([transform(frame) for frame in frames]))
+        if softmax:
+            expected = torch.softmax(expected, 1)
+    pixels = np.stack([np.asarray(frame) for frame in frames])
+    if flip_vertical:
+        pixels = pixels[:, ::-1]
+    actual = OnnxClassifier(onnx_path).run(pixels)
+    diff = np.abs(expected.numpy() - actual)
+    agreement = (expected.numpy().argmax(1) == actual.argmax(1)).mean() * 100
+    print(f'Validation on {len(frames)} frames: max |diff| {diff.max():.2e}, mean |diff| {diff.mean():.2e}, '
+          f'top-1 agreement {agreement:.1f}%')
+    if diff.max() > atol or agreement < 100:
+        raise RuntimeError(f'{onnx_path} does not match PyTorch (max |diff| {diff.max():.2e} > {atol:g})')
+    return diff.max(), agreement
+
+
+# classifybatch.py on the same files with the exported graph and with the PyTorch model
+def check_classifybatch(deploy, onnx_path, folder, input_config, limit=32, atol=1e-3):
+    paths = list(iter_paths([folder]))[:limit]
+    results = {}
+    for name, model in (('onnx', OnnxClassifier(onnx_path)), ('torch', deploy.model)):
+        out = io.StringIO()
+        classify(model, paths, torch.device('cpu'), out, num_workers=1, **input_config)
+        results[name] = [json.loads(line) for line in out.getvalue().splitlines()]
+    agreement = 100. * np.mean([a['index'] == b['index'] for a, b in zip(results['onnx'], results['torch'])])
+    diff = max(abs(a['probabilities'][k] - b['probabilities'][k])
+               for a, b in zip(results['onnx'], results['torch']) for k in a['probabilities'])
+    print(f'classifybatch round trip on {len(paths)} images: max |prob diff| {diff:.2e}, label agreement {agreement:.1f}%')
+    if diff > atol or agreement < 100:
+        raise RuntimeError(f'{onnx_path} does not match PyTorch through classifybatch.py')
+    return diff, agreement
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a gesture model to ONNX with uint8 NHWC input')
+    parser.add_argument('--backbone', default='efficientnet_v2_s', choices=sorted(BACKBONES))
+    parser.add_argument('--model', default='efficientnetv2_clapsgood.pth', help='Trained state_dict')
+    parser.add_argument('--output', help='Default: <model>_uint8.onnx')
+    parser.add_argument('--softmax', action='store_true', help='Output probabilities instead of logits')
+    parser.add_argument('--flip-vertical', action='store_true', help='Input rows bottom-up (Unity GetPixels order)')
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--no-simplify', action='store_true')
+    parser.add_argument('--images', help='Folder with sample images for validation (random frames if omitted)')
+    parser.add_argument('--num-images', type=int, default=32)
+    parser.add_argument('--atol', type=float, default=1e-3, help='Max allowed |PyTorch - ONNX| difference')
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.model)[0] + '_uint8.onnx'
+    deploy = export(args.backbone, args.model, output, args.softmax, args.flip_vertical, args.opset, not args.no_simplify)
+    input_config = INPUT_CONFIG[args.backbone]
+    frames = sample_frames(args.images, input_config['image_size'], args.num_images)
+    validate(deploy, output, frames, input_config['normalize'], args.softmax, args.flip_vertical, args.atol)
+    if args.images and not args.flip_vertical:
+        check_classifybatch(deploy, output, args.images, input_config, args.num_images, args.atol)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import hashlib
+import torch
+import torch.optim as optim
+from torch.utils.data import TensorDataset, DataLoader
+from tensorcache import file_signature
+
+# Head-only training for the transfer-learning scripts.
+# The pretrained backbone (features + avgpool) runs once over the dataset, the
+# pooled embeddings are saved to disk, and the classifier head is then trained
+# for as many epochs as we like on those cached vectors.
+# The cache key covers the files (path, mtime, size, label), the preprocessing
+# settings (image size, normalization, pretrained) and a hash of the backbone
+# weights, so changing any of them extracts the embeddings again.
+
+FEATURE_CACHE_DIR = 'feature_cache'
+
+
+# Pooled embedding for torchvision EfficientNet / MobileNetV3 (everything before .classifier)
+def pooled_features(model, images):
+    x = model.features(images)
+    x = model.avgpool(x)
+    return torch.flatten(x, 1)
+
+
+# sha1 of every backbone tensor (the classifier head is excluded, it doesn't change the embeddings)
+def weights_fingerprint(model):
+    h = hashlib.sha1()
+    for key, tensor in model.state_dict().items():
+        if not key.startswith('classifier.'):
+            h.update(key.encode())
+            h.update(tensor.detach().cpu().contiguous().view(-1).view(torch.uint8).numpy().tobytes())
+    return h.hexdigest()
+
+
+# settings: everything else the cached tensors depend on (image size, normalization, weights, ...)
+def feature_cache_path(name, file_list, labels, cache_dir=FEATURE_CACHE_DIR, settings=None):
+    h = hashlib.sha1(name.encode())
+    h.update(json.dumps(settings or {}, sort_keys=True).encode())
+    for path, label in zip(file_list, labels):
+        h.update(json.dumps([os.path.abspath(path), file_signature(path), int(label)]).encode())
+    return os.path.join(cache_dir, f'{name}_{h.hexdigest()[:12]}.pt')
+
+
+# loader must not shuffle, rows are stored in dataset order
+def extract_features(model, loader, device):
+    model.eval()
+    features = []
+    labels = []
+    with torch.no_grad():
+        for images, batch_labels in loader:
+            features.append(pooled_features(model, images.to(device)).cpu())
+            labels.append(torch.as_tensor(batch_labels))
+    if not features:  # empty split
+        return torch.empty(0), torch.empty(0, dtype=torch.long)
+    return torch.cat(features), torch.cat(labels)
+
+
+def cached_features(name, model, dataset, device, batch_size=32, cache_dir=FEATURE_CACHE_DIR, settings=None):
+    path = feature_cache_path(name, dataset.file_list, dataset.labels, cache_dir, settings)
+    if os.path.exists(path):
+        data = torch.load(path)
+        return data['features'], data['labels']
+
+    start = time.time()
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
+    features, labels = extract_features(model, loader, device)
+    print(f'Extracted {len(features)} embeddings in {time.time() - start:.1f}s -> {path}')
+
+    os.makedirs(cache_dir, exist_ok=True)
+    torch.save({'features': features, 'labels': labels}, path)
+    return features, labels
+
+
+def train_head(head, train_features, train_labels, val_features, val_labels, criterion, num_epochs,
+               learning_rate=0.001, batch_size=32, device='cpu'):
+    head = head.to(device)
+    optimizer = optim.Adam(head.parameters(), lr=learning_rate)
+    train_loader = DataLoader(TensorDataset(train_features, train_labels), batch_size=batch_size, shuffle=True)
+    val_features, val_labels = val_features.to(device), val_labels.to(device)
+
+    for epoch in range(num_epochs):
+        head.train()
+        running_loss = 0.0
+        correct = 0
+
+        for features, labels in train_loader:
+            features, labels = features.to(device), labels.to(device)
+
+            optimizer.zero_grad()
+            outputs = head(features)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item() * features.size(0)
+            correct += outputs.argmax(1).eq(labels).sum().item()
+
+        train_loss = running_loss / len(train_features)
+        train_acc = 100. * correct / len(train_features)
+
+        # an empty val split reports nan, like handtrain.train_and_validate
+        val_loss = val_acc = float('nan')
+        if len(val_labels):
+            head.eval()
+            with torch.no_grad():
+                outputs = head(val_features)
+                val_loss = criterion(outputs, val_labels).item()
+                val_acc = 100. * outputs.argmax(1).eq(val_labels).sum().item() / len(val_labels)
+
+        print(f'Head Epoch [{epoch+1}/{num_epochs}] '
+              f'Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}% '
+              f'Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%')
+
+    return head
+
+
+# Extract (or load) embeddings for both splits and train model.classifier on them.
+# The trained head stays attached to the model, so a full fine-tune can follow.
+# settings: preprocessing config of the datasets (image_size, normalize, pretrained)
+def train_head_only(name, model, train_dataset, val_dataset, criterion, num_epochs,
+                    learning_rate=0.001, batch_size=32, device='cpu', settings=None):
+    model = model.to(device)
+    settings = dict(settings or {}, weights=weights_fingerprint(model))
+    train_features, train_labels = cached_features(name, model, train_dataset, device, batch_size, settings=settings)
+    val_features, val_labels = cached_features(name, model, val_dataset, device, batch_size, settings=settings)
+
+    start = time.time()
+    train_head(model.classifier, train_features, train_labels, val_features, val_labels, criterion,
+               num_epochs, learning_rate, batch_size, device)
+    print(f'Head training took {time.time() - start:.1f}s')
+    return model
+
@@ -0,0 +1,245 @@
+import math
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from tensorcache import IMAGENET_MEAN, IMAGENET_STD
+
+# Batched NumPy preprocessing for uint8 RGB frames [N, H, W, 3]:
+# resize -> optional vertical flip -> /255 -> (x - mean) / std -> NCHW or NHWC.
+#   kernel = FramePreprocessor(image_size=224, layout='NCHW')
+#   batch = kernel(frames)          # float32 [N, 3, 224, 224], a reused buffer
+# Output is bit-for-bit the build_transforms() tensor. The resize is Pillow's
+# bilinear filter, as in torchvision's Resize: resize='pillow' runs Pillow's C
+# resampler per frame (fastest), resize='numpy' is a vectorized reimplementation
+# of the same 22-bit fixed-point arithmetic (no PIL images involved).
+# flip_vertical=True matches Unity's ProcessImageToTensor, which flips the
+# bottom-up GetPixels rows; layout='NHWC' gives its (1, 224, 224, 3) tensor layout.
+# Intermediate and output buffers are allocated once per shape and reused, so
+# copy the result if it has to outlive the next call.
+#   python framepreprocess.py --data clapsgood     (asserts parity vs torchvision, frames/sec)
+
+PRECISION_BITS = 32 - 8 - 2  # Pillow Resample.c
+
+
+def _bilinear(x):
+    x = abs(x)
+    return 1. - x if x < 1. else 0.
+
+
+# Pillow's precompute_coeffs + normalize_coeffs_8bpc for the bilinear filter.
+# Returns tap indices [out, taps] (unused taps point at xmin with weight 0) and int32 weights.
+def resample_coeffs(in_size, out_size):
+    scale = in_size / out_size
+    filterscale = max(scale, 1.)
+    support = 1. * filterscale
+    ksize = int(math.ceil(support)) * 2 + 1
+
+    indices = np.zeros((out_size, ksize), dtype=np.intp)
+    weights = np.zeros((out_size, ksize), dtype=np.int32)
+    for xx in range(out_size):
+        center = (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size) - xmin
+        k = [_bilinear((x + xmin - center + 0.5) / filterscale) for x in range(xmax)]
+        total = sum(k)
+        for x in range(xmax):
+            w = k[x] / total if total != 0 else k[x]
+            weights[xx, x] = int(w * (1 << PRECISION_BITS) + (0.5 if w >= 0 else -0.5))
+            indices[xx, x] = xmin + x
+        indices[xx, xmax:] = xmin
+    taps = int((weights != 0).sum(1).max())
+    return indices[:, :taps], weights[:, :taps]
+
+
+class FramePreprocessor:
+    def __init__(self, image_size=224, normalize=True, layout='NCHW', flip_vertical=False,
+                 mean=IMAGENET_MEAN, std=IMAGENET_STD, resize='pillow'):
+        if layout not in ('NCHW', 'NHWC'):
+            raise ValueError(f'Unknown layout: {layout}')
+        if resize not in ('pillow', 'numpy'):
+            raise ValueError(f'Unknown resize: {resize}')
+        self.resize = resize
+        self.size = (image_size, image_size) if isinstance(image_size, int) else tuple(image_size)
+        self.normalize = normalize
+        self.layout = layout
+        self.flip_vertical = flip_vertical
+        shape = (1, 3, 1, 1) if layout == 'NCHW' else (1, 1, 1, 3)
+        self.mean = np.asarray(mean, dtype=np.float32).reshape(shape)
+        self.std = np.asarray(std, dtype=np.float32).reshape(shape)
+        self._coeffs = {}
+        self._buffers = {}
+
+    def _coefficients(self, in_size, out_size):
+        key = (in_size, out_size)
+        if key not in self._coeffs:
+            self._coeffs[key] = resample_coeffs(in_size, out_size)
+        return self._coeffs[key]
+
+    def _buffer(self, name, shape, dtype):
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = self._buffers[name] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    # One separable pass along `axis` (1 = rows/vertical, 2 = columns/horizontal)
+    def _resample(self, src, axis, out_size, name):
+        indices, weights = self._coefficients(src.shape[axis], out_size)
+        shape = list(src.shape)
+        shape[axis] = out_size
+        shape = tuple(shape)
+        tap = self._buffer(name + '_tap', shape, np.uint8)
+        product = self._buffer(name + '_product', shape, np.int32)
+        acc = self._buffer(name + '_acc', shape, np.int32)
+        out = self._buffer(name, shape, np.uint8)
+
+        weight_shape = [1, 1, 1, 1]
+        weight_shape[axis] = out_size
+        acc.fill(1 << (PRECISION_BITS - 1))
+        for t in range(indices.shape[1]):
+            np.take(src, indices[:, t], axis=axis, out=tap)
+            np.multiply(tap, weights[:, t].reshape(weight_shape), out=product)
+            acc += product
+        np.right_shift(acc, PRECISION_BITS, out=acc)
+        np.clip(acc, 0, 255, out=acc)
+        np.copyto(out, acc, casting='unsafe')
+        return out
+
+    def _resize_pillow(self, frames, out_h, out_w):
+        out = self._buffer('resized', (len(frames), out_h, out_w, 3), np.uint8)
+        for i, frame in enumerate(frames):
+            image = Image.fromarray(np.ascontiguousarray(frame)).resize((out_w, out_h), Image.BILINEAR)
+            out[i] = np.asarray(image)
+        return out
+
+    # Resize (+ flip) only: uint8 [N, h, w, 3], the input of exportonnx.py graphs
+    def resize_frames(self, frames):
+        frames = np.asarray(frames)
+        if frames.ndim == 3:
+            frames = frames[None]
+        if frames.dtype != np.uint8 or frames.shape[-1] != 3:
+            raise ValueError(f'Expected uint8 RGB frames [N, H, W, 3], got {frames.dtype} {frames.shape}')
+
+        out_h, out_w = self.size
+        resized = frames
+        if frames.shape[1:3] != (out_h, out_w) and self.resize == 'pillow':
+            resized = self._resize_pillow(frames, out_h, out_w)
+        elif frames.shape[1:3] != (out_h, out_w):
+            # like Pillow: horizontal pass first, skip passes that don't change the size
+            if resized.shape[2] != out_w:
+                resized = self._resample(resized, 2, out_w, 'horizontal')
+            if resized.shape[1] != out_h:
+                resized = self._resample(resized, 1, out_h, 'vertical')
+        if self.flip_vertical:
+            resized = resized[:, ::-1]
+        return resized
+
+    # frames: uint8 [N, H, W, 3] (or [H, W, 3]); returns float32 [N, 3, h, w] / [N, h, w, 3]
+    def __call__(self, frames):
+        resized = self.resize_frames(frames)
+        if self.layout == 'NCHW':
+            resized = resized.transpose(0, 3, 1, 2)
+
+        out = self._buffer('output', resized.shape, np.float32)
+        np.copyto(out, resized, casting='unsafe')
+        out /= np.float32(255)  # torchvision ToTensor
+        if self.normalize:
+            out -= self.mean      # torchvision Normalize: sub_ then div_
+            out /= self.std
+        return out
+
+
+# Asserts the kernel is bit-identical to build_transforms() (flipped / transposed to
+# match) for both resize modes, flip on and off and both layouts, at every size.
+# frames: uint8 batches [N, H, W, 3]; returns the number of cases checked
+def check_parity(frames, normalize=True, sizes=(224,)):
+    from handdata import build_transforms
+
+    cases = 0
+    for size in sizes:
+        transform = build_transforms(size, normalize)
+        for batch in frames:
+            expected = np.stack([transform(Image.fromarray(frame)).numpy() for frame in batch])
+            for resize in ('pillow', 'numpy'):
+                for flip in (False, True):
+                    for layout in ('NCHW', 'NHWC'):
+                        kernel = FramePreprocessor(size, normalize, layout, flip, resize=resize)
+                        want = expected[:, :, ::-1] if flip else expected
+                        if layout == 'NHWC':
+                            want = want.transpose(0, 2, 3, 1)
+                        np.testing.assert_array_equal(
+                            kernel(batch), want,
+                            err_msg=f'{batch.shape[1:3]} -> {size}, resize={resize}, flip={flip}, {layout}')
+                        cases += 1
+    return cases
+
+
+def _frames_per_sec(fn, count, runs=3):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def main():
+    import torch
+    from handdata import get_image_paths_and_labels, build_transforms
+
+    parser = argparse.ArgumentParser(description='Parity and speed of the NumPy preprocessing kernel')
+    parser.add_argument('--data', default='clapsgood', help='Image folder')
+    parser.add_argument('--label-scheme', default='name', choices=['clap', 'name'])
+    parser.add_argument('--image-size', type=int, default=224)
+    parser.add_argument('--parity-sizes', type=int, nargs='*', default=[97], help='Odd output sizes also checked for parity')
+    parser.add_argument('--no-normalize', action='store_true')
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads for the PIL path')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    file_list, _ = get_image_paths_and_labels(args.data, args.label_scheme)
+    file_list = file_list[:args.images]
+    images = [Image.open(f).convert('RGB') for f in file_list]
+    normalize = not args.no_normalize
+    transform = build_transforms(args.image_size, normalize)
+    arrays = [np.asarray(image) for image in images]
+    same_size = len({a.shape for a in arrays}) == 1
+
+    def batched(kernel, frames):
+        if not same_size:
+            return lambda: [kernel(a) for a in frames]
+        stacked = np.stack(frames)
+        batches = [stacked[i:i + args.batch_size] for i in range(0, len(stacked), args.batch_size)]
+        return lambda: [kernel(batch) for batch in batches]
+
+    # parity (raises AssertionError on the first mismatch): the images plus random
+    # batches with odd sizes that get upscaled, downscaled or are already 97x97
+    rng = np.random.default_rng(0)
+    synthetic = [rng.integers(0, 256, (2, h, w, 3), dtype=np.uint8) for h, w in ((45, 61), (333, 257), (97, 97))]
+    sizes = [args.image_size] + args.parity_sizes
+    cases = check_parity([a[None] for a in arrays] + synthetic, normalize, sizes)
+    print(f'Parity: {cases} cases bit-identical to build_transforms (sizes {sizes}, pillow/numpy resize, '
+          f'flip on/off, NCHW/NHWC)')
+
+    # speed: per-image PIL + torchvision vs the kernel, both from decoded images
+    torch_fps = _frames_per_sec(lambda: torch.stack([transform(image) for image in images]), len(images))
+    print(f'{"path":>28} {"frames/s":>9} {"speedup":>8}')
+    print(f'{"PIL + torchvision":>28} {torch_fps:>9.1f} {1:>8.2f}')
+    for resize in ('pillow', 'numpy'):
+        fps = _frames_per_sec(batched(FramePreprocessor(args.image_size, normalize, resize=resize), arrays), len(images))
+        print(f'{"FramePreprocessor " + resize:>28} {fps:>9.1f} {fps / torch_fps:>8.2f}')
+
+    # frames already at the model size (e.g. after Unity's Blit): only the vectorized part runs
+    sized = [np.asarray(image.resize((args.image_size, args.image_size), Image.BILINEAR)) for image in images]
+    sized_images = [Image.fromarray(a) for a in sized]
+    torch_fps = _frames_per_sec(lambda: torch.stack([transform(image) for image in sized_images]), len(images))
+    fps = _frames_per_sec(batched(FramePreprocessor(args.image_size, normalize), sized), len(images))
+    print(f'{"already resized, torchvision":>28} {torch_fps:>9.1f} {1:>8.2f}')
+    print(f'{"already resized, kernel":>28} {fps:>9.1f} {fps / torch_fps:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import collections
+import numpy as np
+from handdata import label_names
+from handconstants import GESTURE_IDS
+
+# Temporal smoothing for streaming gesture predictions, so single-frame flickers
+# don't turn into robot commands.
+#   smoother = GestureSmoother()
+#   for probs in stream:                      # probabilities, logits or a label
+#       transition = smoother.update(probs)
+#       if transition: publish(transition.gesture)
+# Per frame (all O(1) for a fixed number of classes):
+#   - sliding-window vote over the last `window` argmaxes (ring buffer + counts)
+#   - EMA of the log-probabilities / logits
+#   - hysteresis: a new gesture must win the vote with >= vote_threshold of the
+#     window, beat the current one on the EMA by `margin`, and hold for
+#     `min_dwell` consecutive frames before it is emitted.
+# Replay on the recorded sequences to trade latency against flicker:
+#   python gesturesmooth.py --csv data.zip --flip-rate 0.2
+#   python gesturesmooth.py --csv data.zip --model landmark_mlp.pth
+
+Transition = collections.namedtuple('Transition', 'frame gesture index confidence previous')
+
+
+class GestureSmoother:
+    def __init__(self, num_classes=len(label_names), window=5, ema_alpha=0.5, vote_threshold=0.6,
+                 margin=0.0, min_dwell=2, inputs='probs'):
+        self.num_classes = num_classes
+        self.window = window
+        self.ema_alpha = ema_alpha
+        self.vote_threshold = vote_threshold
+        self.margin = margin
+        self.min_dwell = min_dwell
+        self.inputs = inputs  # 'probs' or 'logits'; labels (str / int) are always accepted
+        self.reset()
+
+    def reset(self):
+        self.votes = np.full(self.window, -1, dtype=np.int64)  # ring buffer of argmaxes
+        self.counts = np.zeros(self.num_classes, dtype=np.int64)
+        self.position = 0
+        self.filled = 0
+        self.ema = None
+        self.current = None  # stable gesture index
+        self.candidate = None
+        self.dwell = 0
+        self.frame = -1
+
+    def _scores(self, prediction):
+        if isinstance(prediction, str):
+            prediction = GESTURE_IDS[prediction]
+        if isinstance(prediction, (int, np.integer)):
+            scores = np.full(self.num_classes, -10.)  # one-hot in log space
+            scores[prediction] = 0.
+            return scores
+        scores = np.asarray(prediction, dtype=np.float64).reshape(-1)
+        if self.inputs == 'probs':
+            scores = np.log(np.clip(scores, 1e-6, 1.))
+        return scores
+
+    def update(self, prediction):
+        self.frame += 1
+        scores = self._scores(prediction)
+        vote = int(scores.argmax())
+
+        # ring buffer: drop the oldest vote, add the new one
+        oldest = self.votes[self.position]
+        if oldest >= 0:
+            self.counts[oldest] -= 1
+        self.votes[self.position] = vote
+        self.counts[vote] += 1
+        self.position = (self.position + 1) % self.window
+        self.filled = min(self.filled + 1, self.window)
+
+        if self.ema is None:
+            self.ema = scores.copy()
+        else:
+            self.ema += self.ema_alpha * (scores - self.ema)
+
+        winner = int(self.counts.argmax())
+        if winner == self.current:
+            self.candidate, self.dwell = None, 0
+            return None
+
+        qualifies = (self.counts[winner] >= self.vote_threshold * self.filled and
+                     (self.current is None or self.ema[winner] - self.ema[self.current] >= self.margin))
+        if not qualifies:
+            self.candidate, self.dwell = None, 0
+            return None
+
+        if winner == self.candidate:
+            self.dwell += 1
+        else:
+            self.candidate, self.dwell = winner, 1
+        if self.dwell < self.min_dwell:
+            return None
+
+        previous = self.current
+        self.current, self.candidate, self.dwell = winner, None, 0
+        confidence = float(np.exp(self.ema[winner] - np.logaddexp.reduce(self.ema)))
+        return Transition(self.frame, label_names[winner], winner, confidence,
+                          None if previous is None else label_names[previous])
+
+    @property
+    def gesture(self):
+        return None if self.current is None else label_names[self.current]
+
+
+# Wrap any iterable of predictions, yield only the stable transitions
+def smooth(predictions, smoother=None):
+    smoother = smoother or GestureSmoother()
+    for prediction in predictions:
+        transition = smoother.update(prediction)
+        if transition is not None:
+            yield transition
+
+
+# --- replay on recorded sequences
+
+# Frames in recording order (ClapIndex, then SampleNumber) with their true labels
+def recorded_sequence(csv_path):
+    from landmarks import read_csv
+    data = read_csv(csv_path)
+    order = np.lexsort((data['sample_number'], data['clap_index']))
+    return data['joints'][order], data['labels'][order]
+
+
+# Per-frame probabilities with random misclassifications mixed in
+def add_flicker(probabilities, flip_rate, rng):
+    probabilities = probabilities.copy()
+    flips = np.flatnonzero(rng.random(len(probabilities)) < flip_rate)
+    wrong = rng.dirichlet(np.full(probabilities.shape[1], 0.3), len(flips))
+    wrong[np.arange(len(flips)), rng.integers(0, probabilities.shape[1], len(flips))] += 1.
+    probabilities[flips] = wrong / wrong.sum(1, keepdims=True)
+    return probabilities
+
+
+def replay(probabilities, labels, smoother):
+    smoother.reset()
+    stable = np.full(len(labels), -1)
+    transitions = []
+    for t, probs in enumerate(probabilities):
+        transition = smoother.update(probs)
+        if transition is not None:
+            transitions.append(transition)
+        stable[t] = -1 if smoother.current is None else smoother.current
+
+    # latency: frames from a true change until the output shows the new gesture
+    changes = np.flatnonzero(np.diff(labels, prepend=-1))
+    ends = np.append(changes[1:], len(labels))
+    latencies = []
+    missed = 0
+    for start, end in zip(changes, ends):
+        hits = np.flatnonzero(stable[start:end] == labels[start])
+        if len(hits):
+            latencies.append(hits[0])
+        else:
+            missed += 1
+
+    spurious = sum(t.index != labels[t.frame] for t in transitions)
+    return {
+        'transitions': len(transitions),
+        'true_changes': len(changes),
+        'spurious': int(spurious),
+        'missed': missed,
+        'latency_frames': float(np.mean(latencies)) if latencies else float('nan'),
+        'accuracy': 100. * float((stable == labels).mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded sequences through the gesture smoother')
+    parser.add_argument('--csv', default='data.zip', help='hand_tracking_data.csv or data.zip')
+    parser.add_argument('--model', help='landmarks.py checkpoint to produce predictions (default: true labels)')
+    parser.add_argument('--flip-rate', type=float, default=0.2, help='Fraction of frames replaced by a wrong prediction')
+    parser.add_argument('--frame-interval', type=float, default=0.2, help='Seconds between classified frames (dddtext.cs)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    joints, labels = recorded_sequence(args.csv)
+    if args.model:
+        from landmarks import LandmarkClassifier
+        probabilities = LandmarkClassifier(args.model).predict(joints)
+    else:
+        probabilities = np.eye(len(label_names))[labels]
+    probabilities = add_flicker(probabilities, args.flip_rate, np.random.default_rng(args.seed))
+    print(f'{len(labels)} frames, {args.flip_rate:.0%} flipped predictions')
+
+    configs = [
+        ('raw argmax', dict(window=1, ema_alpha=1., vote_threshold=0., min_dwell=1)),
+        ('vote 3', dict(window=3, ema_alpha=1., vote_threshold=0.6, min_dwell=1)),
+        ('vote 5 + ema', dict(window=5, ema_alpha=0.5, vote_threshold=0.6, min_dwell=1)),
+        ('vote 5 + ema + dwell 2', dict(window=5, ema_alpha=0.5, vote_threshold=0.6, min_dwell=2)),
+        ('vote 7 + ema + dwell 3', dict(window=7, ema_alpha=0.3, vote_threshold=0.6, margin=1., min_dwell=3)),
+    ]
+    print(f'{"config":>24} {"transitions":>12} {"spurious":>9} {"missed":>7} {"latency s":>10} {"acc %":>7}')
+    for name, config in configs:
+        result = replay(probabilities, labels, GestureSmoother(**config))
+        print(f'{name:>24} {result["transitions"]:>12} {result["spurious"]:>9} {result["missed"]:>7} '
+              f'{result["latency_frames"] * args.frame_interval:>10.2f} {result["accuracy"]:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+# Names shared by the training scripts and the websocket/ clients. No third-party
+# imports, so the websocket scripts (which don't need torch) can import it too.
+
+# XRHandJointID order, same as the hand_tracking_data.csv columns and dddtext.cs
+JOINT_NAMES = [
+    'Wrist', 'Palm',
+    'ThumbMetacarpal', 'ThumbProximal', 'ThumbDistal', 'ThumbTip',
+    'IndexMetacarpal', 'IndexProximal', 'IndexIntermediate', 'IndexDistal', 'IndexTip',
+    'MiddleMetacarpal', 'MiddleProximal', 'MiddleIntermediate', 'MiddleDistal', 'MiddleTip',
+    'RingMetacarpal', 'RingProximal', 'RingIntermediate', 'RingDistal', 'RingTip',
+    'LittleMetacarpal', 'LittleProximal', 'LittleIntermediate', 'LittleDistal', 'LittleTip',
+]
+JOINT_COLUMNS = [f'{name}_{axis}' for name in JOINT_NAMES for axis in 'XYZ']
+
+# class order of the gesture models (output index -> name)
+label_names = [
+    'left', 'up', 'right', 'down',
+    'backwards', 'forward', 'turn left', 'turn right'
+]
+
+# Names as dddtext.cs GetGestureName sends them (hand.prediction, the jointData
+# "gesture" and the CSV Gesture column): 'back' where the models say 'backwards'
+UNITY_GESTURES = ['left', 'up', 'right', 'down', 'back', 'forward', 'turn left', 'turn right']
+
+# name -> class index, accepts both spellings
+GESTURE_IDS = {name: i for i, name in enumerate(label_names)}
+GESTURE_IDS.update((name, i) for i, name in enumerate(UNITY_GESTURES))
@@ -0,0 +1,156 @@
+import os
+import csv
+from torchvision import transforms
+from torch.utils.data import Dataset
+from PIL import Image
+from sklearn.model_selection import train_test_split
+from tensorcache import TensorCache, CachedHandPositionDataset, IMAGENET_MEAN, IMAGENET_STD
+from handconstants import label_names
+
+# Dataset + label handling shared by every training / evaluation script.
+
+# 'clap' scheme: files recorded as clap_<N>_... (newdata folder)
+clap_label_map = {
+    'clap_1': 0,  # left
+    'clap_2': 1,  # up
+    'clap_3': 2,  # right
+    'clap_4': 3,  # down
+    'clap_5': 4,  # backwards
+    'clap_6': 5,  # forward
+    'clap_7': 6,  # turn left
+    'clap_8': 7   # turn right
+}
+
+# 'name' scheme: gesture name in the filename (clapsgood folder).
+# Checked in order, turn_left/turn_right must come before left/right.
+name_label_order = [
+    ('turn_left', 6),
+    ('turn_right', 7),
+    ('left', 0),
+    ('right', 2),
+    ('up', 1),
+    ('down', 3),
+    ('backwards', 4),
+    ('forwards', 5),
+]
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def label_for_file(file_path, label_scheme):
+    filename = os.path.basename(file_path)
+    if label_scheme == 'clap':
+        for clap_key, label in clap_label_map.items():
+            if clap_key in filename:
+                return label
+    elif label_scheme == 'name':
+        filename = filename.lower()
+        for key, label in name_label_order:
+            if key in filename:
+                return label
+    else:
+        raise ValueError(f'Unknown label scheme: {label_scheme}')
+    return None
+
+
+# Collect image paths and labels, sorted so the split is the same on every OS
+def get_image_paths_and_labels(data_folder, label_scheme='clap'):
+    all_files = sorted(os.path.join(data_folder, f) for f in os.listdir(data_folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+    file_list = []
+    labels = []
+
+    for file_path in all_files:
+        label = label_for_file(file_path, label_scheme)
+        if label is None:
+            continue  # Skip files with no valid label
+        file_list.append(file_path)
+        labels.append(label)
+
+    return file_list, labels
+
+
+# Custom dataset
+class HandPositionDataset(Dataset):
+    def __init__(self, file_list, labels, transform=None):
+        self.file_list = file_list
+        self.labels = labels
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.file_list)
+
+    def __getitem__(self, idx):
+        img_path = self.file_list[idx]
+        image = Image.open(img_path).convert('RGB')
+
+        if self.transform:
+            image = self.transform(image)
+
+        label = self.labels[idx]
+        return image, label
+
+
+def split_dataset(file_list, labels, test_size=0.2, random_state=42):
+    return train_test_split(file_list, labels, test_size=test_size, random_state=random_state)
+
+
+# path,label,split rows written by dataindex.py; relative paths are relative to the split file
+def read_split_file(path):
+    root = os.path.dirname(os.path.abspath(path))
+    splits = {'train': ([], []), 'val': ([], [])}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            files, labels = splits[row['split']]
+            files.append(os.path.normpath(os.path.join(root, row['path'])))
+            labels.append(int(row['label']))
+    return splits['train'][0], splits['val'][0], splits['train'][1], splits['val'][1]
+
+
+def build_transforms(image_size, normalize=True, augment=False):
+    steps = [transforms.Resize((image_size, image_size))]
+    if augment:
+        steps.append(transforms.RandomHorizontalFlip())
+    steps.append(transforms.ToTensor())
+    if normalize:
+        steps.append(transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD))
+    return transforms.Compose(steps)
+
+
+# Train / val datasets for a config (keys: data_folder, label_scheme, image_size,
+# normalize, augment, use_tensor_cache, optional split_file from dataindex.py)
+def build_datasets(config):
+    if config.get('split_file'):
+        train_files, val_files, train_labels, val_labels = read_split_file(config['split_file'])
+        return datasets_from_files(config, train_files, train_labels, val_files, val_labels)
+    file_list, labels = get_image_paths_and_labels(config['data_folder'], config['label_scheme'])
+    if not file_list:
+        raise RuntimeError(f"No labelled images found in {config['data_folder']}")
+    train_files, val_files, train_labels, val_labels = split_dataset(file_list, labels)
+    return datasets_from_files(config, train_files, train_labels, val_files, val_labels)
+
+
+# Same, for an explicit train / val assignment (incremental.py)
+def datasets_from_files(config, train_files, train_labels, val_files, val_labels):
+    file_list = list(train_files) + list(val_files)
+    size = config['image_size']
+    normalize = config['normalize']
+    augment = config['augment']
+
+    if config['use_tensor_cache']:
+        if augment:
+            # keep raw pixels so the random flip still runs every epoch
+            cache = TensorCache(file_list, size=size, dtype='uint8',
+                                mean=IMAGENET_MEAN if normalize else None, std=IMAGENET_STD if normalize else None)
+            train_transform = transforms.RandomHorizontalFlip()
+        else:
+            cache = TensorCache(file_list, size=size, dtype='float16',
+                                mean=IMAGENET_MEAN if normalize else None, std=IMAGENET_STD if normalize else None)
+            train_transform = None
+        train_dataset = CachedHandPositionDataset(cache, train_files, train_labels, transform=train_transform)
+        val_dataset = CachedHandPositionDataset(cache, val_files, val_labels)
+    else:
+        train_dataset = HandPositionDataset(train_files, train_labels, transform=build_transforms(size, normalize, augment))
+        val_dataset = HandPositionDataset(val_files, val_labels, transform=build_transforms(size, normalize))
+
+    return train_dataset, val_dataset
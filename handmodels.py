@@ -0,0 +1,125 @@
+import torch
+import torch.nn as nn
+from torchvision import models
+
+# Backbones for the gesture classifier. State dicts match the ones saved by the
+# original train.py / traineffic.py / traintransfer1.py scripts.
+
+
+# CNN model (train.py)
+class SimpleCNN(nn.Module):
+    def __init__(self, num_classes, image_size=128):
+        super(SimpleCNN, self).__init__()
+        self.features = nn.Sequential(
+            nn.Conv2d(3, 32, kernel_size=3, stride=1, padding=1),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2, 2),
+
+            nn.Conv2d(32, 64, kernel_size=3, stride=1, padding=1),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2, 2),
+
+            nn.Conv2d(64, 128, kernel_size=3, stride=1, padding=1),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2, 2),
+        )
+        feature_size = image_size // 8
+        self.classifier = nn.Sequential(
+            nn.Linear(128 * feature_size * feature_size, 256),
+            nn.ReLU(inplace=True),
+            nn.Dropout(0.5),
+            nn.Linear(256, num_classes)
+        )
+
+    def forward(self, x):
+        x = self.features(x)
+        x = torch.flatten(x, 1)  # works for channels_last too, unlike view()
+        x = self.classifier(x)
+        return x
+
+
+# Small distillation student (distill.py): strided convs + BatchNorm and global
+# average pooling instead of SimpleCNN's 8M-parameter flatten -> Linear
+class SlimCNN(nn.Module):
+    def __init__(self, num_classes, image_size=128, widths=(16, 32, 64, 128)):
+        super(SlimCNN, self).__init__()
+        layers = []
+        in_channels = 3
+        for width in widths:
+            layers += [
+                nn.Conv2d(in_channels, width, kernel_size=3, stride=2, padding=1, bias=False),
+                nn.BatchNorm2d(width),
+                nn.ReLU(inplace=True),
+            ]
+            in_channels = width
+        self.features = nn.Sequential(*layers)
+        self.avgpool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Sequential(
+            nn.Dropout(0.2),
+            nn.Linear(in_channels, num_classes)
+        )
+
+    def forward(self, x):
+        x = self.avgpool(self.features(x))
+        x = torch.flatten(x, 1)
+        x = self.classifier(x)
+        return x
+
+
+def build_simplecnn(num_classes, pretrained=False, image_size=128):
+    return SimpleCNN(num_classes=num_classes, image_size=image_size)
+
+
+def build_slimcnn(num_classes, pretrained=False, image_size=128):
+    return SlimCNN(num_classes=num_classes, image_size=image_size)
+
+
+def build_efficientnet_v2_s(num_classes, pretrained=True, image_size=224):
+    model = models.efficientnet_v2_s(weights='DEFAULT' if pretrained else None)
+    num_ftrs = model.classifier[1].in_features
+    model.classifier[1] = nn.Linear(num_ftrs, num_classes)
+    return model
+
+
+def build_mobilenet_v3_large(num_classes, pretrained=True, image_size=224):
+    model = models.mobilenet_v3_large(weights='DEFAULT' if pretrained else None)
+    model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+    return model
+
+
+def build_mobilenet_v3_small(num_classes, pretrained=True, image_size=224):
+    model = models.mobilenet_v3_small(weights='DEFAULT' if pretrained else None)
+    model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+    return model
+
+
+# Input resolution / ImageNet normalization each backbone was trained with
+INPUT_CONFIG = {
+    'simplecnn': {'image_size': 128, 'normalize': False},
+    'efficientnet_v2_s': {'image_size': 224, 'normalize': True},
+    'mobilenet_v3_large': {'image_size': 224, 'normalize': True},
+    'mobilenet_v3_small': {'image_size': 224, 'normalize': True},
+    'slimcnn': {'image_size': 128, 'normalize': True},
+}
+
+BACKBONES = {
+    'simplecnn': build_simplecnn,
+    'efficientnet_v2_s': build_efficientnet_v2_s,
+    'mobilenet_v3_large': build_mobilenet_v3_large,
+    'mobilenet_v3_small': build_mobilenet_v3_small,
+    'slimcnn': build_slimcnn,
+}
+
+
+def build_model(backbone, num_classes=8, pretrained=False, image_size=224):
+    if backbone not in BACKBONES:
+        raise ValueError(f'Unknown backbone: {backbone} (choose from {", ".join(BACKBONES)})')
+    return BACKBONES[backbone](num_classes, pretrained=pretrained, image_size=image_size)
+
+
+def load_model(backbone, model_path, num_classes=8, image_size=224, device='cpu'):
+    model = build_model(backbone, num_classes, pretrained=False, image_size=image_size)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
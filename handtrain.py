@@ -0,0 +1,300 @@
+import time
+import argparse
+import yaml
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from handdata import build_datasets, label_names
+from handmodels import build_model
+from featurecache import train_head_only
+from loaderconfig import make_loader, set_threads
+
+# Config-driven trainer for every backbone.
+#   python handtrain.py --preset efficientnet
+#   python handtrain.py --preset simplecnn --precision bf16 --channels-last --epochs 5
+#   python handtrain.py --config my_run.yaml --accumulation-steps 4
+#   python handtrain.py --preset mobilenet --mode incremental   (new images only, see incremental.py)
+#   python handtrain.py --preset distill   (EfficientNetV2-S teacher -> small student, see distill.py)
+# Settings are applied in order: DEFAULT_CONFIG < preset < YAML file < command line flags.
+
+DEFAULT_CONFIG = {
+    'backbone': 'mobilenet_v3_large',  # simplecnn | efficientnet_v2_s | mobilenet_v3_large | mobilenet_v3_small | slimcnn
+    'pretrained': True,
+    'data_folder': 'newdata',
+    'label_scheme': 'clap',  # 'clap' (clap_N in filename) or 'name' (gesture name in filename)
+    'split_file': None,  # train/val list from dataindex.py instead of data_folder + random split
+    'image_size': 224,
+    'normalize': True,  # ImageNet mean/std
+    'augment': False,  # random horizontal flip
+    'num_epochs': 30,
+    'batch_size': 32,
+    'learning_rate': 0.001,
+    'accumulation_steps': 1,  # optimizer step every N batches
+    'precision': 'fp32',  # fp32 | bf16 (autocast on CPU or CUDA) | fp16 (CUDA only)
+    'channels_last': False,
+    'num_workers': None,  # None picks a default, see loaderconfig.py
+    'num_threads': None,
+    'use_tensor_cache': True,  # see tensorcache.py
+    'training_mode': 'full',  # 'head': train the classifier on cached embeddings, see featurecache.py
+    'head_epochs': 100,
+    'finetune_epochs': 0,  # optional short full fine-tune after head-only training
+    'incremental_epochs': 3,  # 'incremental': fine-tune on new images only, see incremental.py
+    'incremental_lr': None,  # None: learning_rate / 10
+    'replay_ratio': 1.0,  # old training images replayed per new one
+    'val_percent': 20,  # share of new images that go to validation (by content hash)
+    'teacher_backbone': 'efficientnet_v2_s',  # 'distill': learn from a trained teacher, see distill.py
+    'teacher_model': '1efficientnetv2_clapsgood.pth',
+    'distill_temperature': 4.0,
+    'distill_alpha': 0.7,  # weight of the teacher (soft target) loss
+    'output': 'model.pth',
+}
+
+# The three original scripts
+PRESETS = {
+    # train.py
+    'simplecnn': {
+        'backbone': 'simplecnn',
+        'pretrained': False,
+        'data_folder': 'newdata',
+        'label_scheme': 'clap',
+        'image_size': 128,
+        'normalize': False,
+        'augment': True,
+        'num_epochs': 40,
+        'output': 'hand_position_classifier.pth',
+    },
+    # traineffic.py
+    'efficientnet': {
+        'backbone': 'efficientnet_v2_s',
+        'data_folder': 'clapsgood',
+        'label_scheme': 'name',
+        'image_size': 224,
+        'num_epochs': 10,
+        'output': '1efficientnetv2_clapsgood.pth',
+    },
+    # traintransfer1.py
+    'mobilenet': {
+        'backbone': 'mobilenet_v3_large',
+        'data_folder': 'newdata',
+        'label_scheme': 'clap',
+        'image_size': 224,
+        'num_epochs': 30,
+        'output': 'mobilenetv3_hand_position.pth',
+    },
+    # distill.py: EfficientNetV2-S teacher -> MobileNetV3-Small student
+    'distill': {
+        'backbone': 'mobilenet_v3_small',
+        'training_mode': 'distill',
+        'data_folder': 'clapsgood',
+        'label_scheme': 'name',
+        'image_size': 224,
+        'num_epochs': 20,
+        'output': 'mobilenetv3_small_distilled.pth',
+    },
+}
+
+AUTOCAST_DTYPES = {'bf16': torch.bfloat16, 'fp16': torch.float16}
+
+
+def load_config(preset=None, config_path=None, overrides=None):
+    config = dict(DEFAULT_CONFIG)
+    if preset:
+        if preset not in PRESETS:
+            raise ValueError(f'Unknown preset: {preset} (choose from {", ".join(PRESETS)})')
+        config.update(PRESETS[preset])
+    if config_path:
+        with open(config_path) as f:
+            file_config = yaml.safe_load(f) or {}
+        unknown = set(file_config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f'Unknown config keys in {config_path}: {", ".join(sorted(unknown))}')
+        config.update(file_config)
+    if overrides:
+        config.update({k: v for k, v in overrides.items() if v is not None})
+    if config['precision'] not in ('fp32', 'bf16', 'fp16'):
+        raise ValueError(f"Unknown precision: {config['precision']}")
+    return config
+
+
+def autocast(device, precision):
+    return torch.autocast(device_type=device.type, dtype=AUTOCAST_DTYPES.get(precision, torch.bfloat16),
+                          enabled=precision != 'fp32')
+
+
+# Training/Validation loop
+def train_and_validate(model, train_loader, val_loader, criterion, optimizer, num_epochs, device,
+                       precision='fp32', accumulation_steps=1, channels_last=False):
+    if precision == 'fp16' and device.type != 'cuda':
+        raise ValueError('fp16 autocast needs CUDA, use bf16 on CPU')
+    scaler = torch.amp.GradScaler(device.type, enabled=precision == 'fp16')
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    history = []
+
+    for epoch in range(num_epochs):
+        epoch_start = time.perf_counter()
+
+        # Training
+        model.train()
+        running_loss = 0.0
+        correct = 0
+        total = 0
+        optimizer.zero_grad()
+
+        for step, (images, labels) in enumerate(train_loader, 1):
+            images = images.to(device, memory_format=memory_format)
+            labels = labels.to(device)
+
+            with autocast(device, precision):
+                outputs = model(images)
+                loss = criterion(outputs, labels)
+            scaler.scale(loss / accumulation_steps).backward()
+
+            if step % accumulation_steps == 0 or step == len(train_loader):
+                scaler.step(optimizer)
+                scaler.update()
+                optimizer.zero_grad()
+
+            running_loss += loss.item() * images.size(0)
+            _, predicted = outputs.max(1)
+            total += labels.size(0)
+            correct += predicted.eq(labels).sum().item()
+
+        train_time = time.perf_counter() - epoch_start
+        train_loss = running_loss / total
+        train_acc = 100. * correct / total
+
+        # Validation
+        model.eval()
+        val_loss = 0.0
+        correct = 0
+        val_total = 0
+
+        with torch.no_grad(), autocast(device, precision):
+            for images, labels in val_loader:
+                images = images.to(device, memory_format=memory_format)
+                labels = labels.to(device)
+
+                outputs = model(images)
+                loss = criterion(outputs, labels)
+
+                val_loss += loss.item() * images.size(0)
+                _, predicted = outputs.max(1)
+                val_total += labels.size(0)
+                correct += predicted.eq(labels).sum().item()
+
+        # an empty val split (e.g. an incremental session where no image hashed into val) reports nan
+        val_loss = val_loss / val_total if val_total else float('nan')
+        val_acc = 100. * correct / val_total if val_total else float('nan')
+        epoch_time = time.perf_counter() - epoch_start
+
+        print(f'Epoch [{epoch+1}/{num_epochs}] '
+              f'Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.2f}% '
+              f'Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}% '
+              f'Time: {epoch_time:.1f}s ({total / train_time:.1f} img/s train)')
+
+        history.append({
+            'epoch': epoch + 1,
+            'train_loss': train_loss,
+            'train_acc': train_acc,
+            'val_loss': val_loss,
+            'val_acc': val_acc,
+            'epoch_time': epoch_time,
+            'train_images_per_sec': total / train_time,
+        })
+
+    return history
+
+
+def run(config):
+    if config['training_mode'] == 'incremental':
+        from incremental import run_incremental
+        return run_incremental(config)
+    if config['training_mode'] == 'distill':
+        from distill import run_distill
+        return run_distill(config)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f'Using device: {device}')
+    print(f"Threads: {set_threads(config['num_threads'])}")
+
+    train_dataset, val_dataset = build_datasets(config)
+    train_loader = make_loader(train_dataset, batch_size=config['batch_size'], shuffle=True, num_workers=config['num_workers'])
+    val_loader = make_loader(val_dataset, batch_size=config['batch_size'], shuffle=False, num_workers=config['num_workers'])
+
+    model = build_model(config['backbone'], num_classes=len(label_names), pretrained=config['pretrained'],
+                        image_size=config['image_size'])
+    if config['channels_last']:
+        model = model.to(memory_format=torch.channels_last)
+    model = model.to(device)
+
+    criterion = nn.CrossEntropyLoss()
+    train_kwargs = dict(device=device, precision=config['precision'],
+                        accumulation_steps=config['accumulation_steps'], channels_last=config['channels_last'])
+
+    start = time.perf_counter()
+    if config['training_mode'] == 'head':
+        if config['backbone'] in ('simplecnn', 'slimcnn'):
+            raise ValueError('Head-only training needs a pretrained backbone (efficientnet_v2_s or mobilenet_v3_large)')
+        train_head_only(config['backbone'], model, train_dataset, val_dataset, criterion, config['head_epochs'],
+                        learning_rate=config['learning_rate'], batch_size=config['batch_size'], device=device,
+                        settings={key: config[key] for key in ('image_size', 'normalize', 'pretrained')})
+        history = []
+        if config['finetune_epochs'] > 0:
+            optimizer = optim.Adam(model.parameters(), lr=config['learning_rate'] * 0.1)
+            history = train_and_validate(model, train_loader, val_loader, criterion, optimizer,
+                                         config['finetune_epochs'], **train_kwargs)
+    elif config['training_mode'] == 'full':
+        optimizer = optim.Adam(model.parameters(), lr=config['learning_rate'])
+        history = train_and_validate(model, train_loader, val_loader, criterion, optimizer,
+                                     config['num_epochs'], **train_kwargs)
+    else:
+        raise ValueError(f"Unknown training mode: {config['training_mode']}")
+    print(f'Total training time: {time.perf_counter() - start:.1f}s')
+
+    # Save model (plain state_dict, contiguous so the export/inference scripts load it as before)
+    model = model.to(memory_format=torch.contiguous_format)
+    torch.save(model.state_dict(), config['output'])
+    print(f"Model saved to {config['output']}")
+    return model, history
+
+
+def parse_args(argv=None, preset=None):
+    parser = argparse.ArgumentParser(description='Train the hand gesture classifier')
+    parser.add_argument('--preset', default=preset, choices=sorted(PRESETS), help='Start from one of the original scripts')
+    parser.add_argument('--config', help='YAML file with any DEFAULT_CONFIG keys')
+    parser.add_argument('--backbone', dest='backbone')
+    parser.add_argument('--data', dest='data_folder')
+    parser.add_argument('--label-scheme', dest='label_scheme', choices=['clap', 'name'])
+    parser.add_argument('--split-file', dest='split_file', help='Deduplicated train/val list from dataindex.py')
+    parser.add_argument('--image-size', dest='image_size', type=int)
+    parser.add_argument('--epochs', dest='num_epochs', type=int)
+    parser.add_argument('--batch-size', dest='batch_size', type=int)
+    parser.add_argument('--lr', dest='learning_rate', type=float)
+    parser.add_argument('--accumulation-steps', dest='accumulation_steps', type=int)
+    parser.add_argument('--precision', dest='precision', choices=['fp32', 'bf16', 'fp16'])
+    parser.add_argument('--channels-last', dest='channels_last', action='store_true', default=None)
+    parser.add_argument('--workers', dest='num_workers', type=int)
+    parser.add_argument('--threads', dest='num_threads', type=int)
+    parser.add_argument('--no-cache', dest='use_tensor_cache', action='store_false', default=None)
+    parser.add_argument('--mode', dest='training_mode', choices=['full', 'head', 'incremental', 'distill'])
+    parser.add_argument('--head-epochs', dest='head_epochs', type=int)
+    parser.add_argument('--finetune-epochs', dest='finetune_epochs', type=int)
+    parser.add_argument('--incremental-epochs', dest='incremental_epochs', type=int)
+    parser.add_argument('--incremental-lr', dest='incremental_lr', type=float)
+    parser.add_argument('--replay-ratio', dest='replay_ratio', type=float)
+    parser.add_argument('--val-percent', dest='val_percent', type=int)
+    parser.add_argument('--teacher-backbone', dest='teacher_backbone')
+    parser.add_argument('--teacher-model', dest='teacher_model')
+    parser.add_argument('--temperature', dest='distill_temperature', type=float)
+    parser.add_argument('--alpha', dest='distill_alpha', type=float)
+    parser.add_argument('--output', dest='output')
+    args = vars(parser.parse_args(argv))
+    return load_config(args.pop('preset'), args.pop('config'), args)
+
+
+def main(argv=None, preset=None):
+    return run(parse_args(argv, preset))
+
+
+if __name__ == '__main__':
+    main()
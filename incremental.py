@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import random
+import hashlib
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from handdata import get_image_paths_and_labels, split_dataset, datasets_from_files, label_names
+from handmodels import build_model
+from handtrain import train_and_validate, autocast
+from loaderconfig import make_loader, set_threads
+from tensorcache import file_signature
+
+# Incremental training: fine-tune the last checkpoint on newly captured images
+# instead of retraining from scratch.
+#   python handtrain.py --preset mobilenet --mode incremental
+#   python handtrain.py --preset mobilenet --mode incremental --replay-ratio 2 --incremental-epochs 5
+# Next to the model (<output>) two files are kept:
+#   <name>.manifest.json  every image already trained on, by content hash (sha1),
+#                         with its label, split and the session that added it
+#   <name>.ckpt           model + optimizer state to resume from
+# Each run hashes the data folder (only files whose mtime/size changed are read
+# again), takes the unseen images as a new session and fine-tunes on them plus a
+# replay buffer of replay_ratio x as many old training images, balanced per class.
+# New images go to validation by their hash (val_percent), so the assignment never
+# depends on which other files exist; validation always covers old and new images.
+# Without a manifest, an existing <output> from handtrain.py becomes session 0:
+# the images that are not newer than <output> (what handtrain.py saw), with
+# handtrain's train/val split of them; images captured later are the first new
+# session. Without any checkpoint every image is new.
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def state_paths(output):
+    stem = os.path.splitext(output)[0]
+    return stem + '.manifest.json', stem + '.ckpt'
+
+
+def new_manifest(config):
+    return {'version': MANIFEST_VERSION, 'backbone': config['backbone'], 'label_scheme': config['label_scheme'],
+            'sessions': [], 'samples': {}, 'signatures': {}}
+
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f'Unsupported manifest version in {path}: {manifest.get("version")}')
+    return manifest
+
+
+def save_manifest(manifest, path):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+# Content hash per file; signatures caches [mtime_ns, size, hash] by absolute path
+def hash_files(file_list, signatures):
+    hashes = []
+    rehashed = 0
+    for path in file_list:
+        key = os.path.abspath(path)
+        signature = file_signature(path)
+        cached = signatures.get(key)
+        if cached is None or cached[:2] != signature:
+            cached = signatures[key] = signature + [content_hash(path)]
+            rehashed += 1
+        hashes.append(cached[2])
+    present = {os.path.abspath(p) for p in file_list}
+    for key in [k for k in signatures if k not in present]:
+        del signatures[key]  # deleted images
+    return hashes, rehashed
+
+
+def is_validation(digest, val_percent):
+    return int(digest[:8], 16) % 100 < val_percent
+
+
+# Old training images that still exist, interleaved class by class so every
+# gesture is replayed about equally often
+def replay_buffer(samples, current, count, seed):
+    rng = random.Random(seed)
+    by_label = {}
+    for digest, entry in samples.items():
+        if entry['split'] == 'train' and digest in current:
+            by_label.setdefault(entry['label'], []).append(digest)
+    for digests in by_label.values():
+        rng.shuffle(digests)
+    replay = []
+    while len(replay) < count and any(by_label.values()):
+        for label in sorted(by_label):
+            if by_label[label] and len(replay) < count:
+                replay.append(by_label[label].pop())
+    return replay
+
+
+def evaluate(model, loader, device, precision='fp32'):
+    model.eval()
+    correct = 0
+    total = 0
+    with torch.no_grad(), autocast(device, precision):
+        for images, labels in loader:
+            outputs = model(images.to(device))
+            correct += outputs.argmax(1).eq(labels.to(device)).sum().item()
+            total += labels.size(0)
+    return 100. * correct / total if total else float('nan')
+
+
+def run_incremental(config):
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f'Using device: {device}')
+    print(f"Threads: {set_threads(config['num_threads'])}")
+    start = time.perf_counter()
+
+    output = config['output']
+    manifest_path, checkpoint_path = state_paths(output)
+    file_list, labels = get_image_paths_and_labels(config['data_folder'], config['label_scheme'])
+    if not file_list:
+        raise RuntimeError(f"No labelled images found in {config['data_folder']}")
+
+    manifest = load_manifest(manifest_path)
+    checkpoint = torch.load(checkpoint_path, map_location='cpu') if os.path.exists(checkpoint_path) else None
+    warm_start = checkpoint is not None or os.path.exists(output)
+    model = build_model(config['backbone'], num_classes=len(label_names),
+                        pretrained=config['pretrained'] and not warm_start, image_size=config['image_size'])
+
+    bootstrap = None  # path -> split of handtrain.py's run, for session 0
+    if checkpoint is not None:
+        if checkpoint['backbone'] != config['backbone']:
+            raise ValueError(f"{checkpoint_path} is a {checkpoint['backbone']} checkpoint, not {config['backbone']}")
+        model.load_state_dict(checkpoint['model'])
+        print(f"Resuming from {checkpoint_path} (session {checkpoint['session']})")
+    elif warm_start:
+        model.load_state_dict(torch.load(output, map_location='cpu'))
+        print(f'Warm start from {output} (no optimizer state)')
+        if manifest is None:
+            # handtrain.py trained on the images that existed when it saved <output>
+            trained_at = os.stat(output).st_mtime_ns
+            seen = [(path, label) for path, label in zip(file_list, labels) if os.stat(path).st_mtime_ns <= trained_at]
+            bootstrap = {path: 'train' for path, _ in seen}
+            if len(seen) >= 2:
+                _, seen_val, _, _ = split_dataset([p for p, _ in seen], [l for _, l in seen])
+                bootstrap.update((path, 'val') for path in seen_val)
+    if manifest is None:
+        manifest = new_manifest(config)
+
+    hashes, rehashed = hash_files(file_list, manifest['signatures'])
+    samples = manifest['samples']
+    current = {}
+    for path, label, digest in zip(file_list, labels, hashes):
+        current.setdefault(digest, (path, label))  # identical copies count once
+    for digest, (path, _) in current.items():
+        if digest in samples:
+            samples[digest]['path'] = path  # renamed / moved
+
+    if bootstrap is not None:
+        registered = 0
+        for digest, (path, label) in current.items():
+            if path in bootstrap:
+                samples[digest] = {'path': path, 'label': label, 'split': bootstrap[path], 'session': 0}
+                registered += 1
+        manifest['sessions'].append({'session': 0, 'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'source': output,
+                                     'images': registered})
+        print(f'Registered {registered} images from {config["data_folder"]} not newer than {output} as session 0')
+
+    new = {d: v for d, v in current.items() if d not in samples}
+    print(f'{len(current)} images, {len(new)} new ({rehashed} hashed)')
+    if not new:
+        save_manifest(manifest, manifest_path)
+        print('Nothing new to train on')
+        return model, []
+
+    session = manifest['sessions'][-1]['session'] + 1 if manifest['sessions'] else 1
+    new_val = sorted(d for d in new if is_validation(d, config['val_percent']))
+    new_train = sorted(set(new) - set(new_val))
+    replay = replay_buffer(samples, current, int(round(config['replay_ratio'] * len(new_train))), seed=session)
+    val = [d for d in current if d in new_val or samples.get(d, {}).get('split') == 'val']
+    print(f'Session {session}: {len(new_train)} new train + {len(replay)} replay, '
+          f'{len(new_val)} new val ({len(val)} val total)')
+    if not val:
+        print(f'No validation images yet (none hashed into the {config["val_percent"]}% val share), '
+              f'training without validation')
+
+    def files(digests):
+        return [current[d][0] for d in digests], [current[d][1] for d in digests]
+
+    train_dataset, val_dataset = datasets_from_files(config, *files(new_train + replay), *files(val))
+    _, new_val_dataset = datasets_from_files(config, [], [], *files(new_val))
+    batch_size = config['batch_size']
+    val_loader = make_loader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=config['num_workers'])
+
+    if config['channels_last']:
+        model = model.to(memory_format=torch.channels_last)
+    model = model.to(device)
+    learning_rate = config['incremental_lr'] or config['learning_rate'] * 0.1
+    optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    if checkpoint is not None and checkpoint.get('optimizer'):
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        for group in optimizer.param_groups:
+            group['lr'] = learning_rate
+
+    history = []
+    if new_train:
+        train_loader = make_loader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=config['num_workers'])
+        history = train_and_validate(model, train_loader, val_loader, nn.CrossEntropyLoss(), optimizer,
+                                     config['incremental_epochs'], device=device, precision=config['precision'],
+                                     accumulation_steps=config['accumulation_steps'],
+                                     channels_last=config['channels_last'])
+    new_val_acc = evaluate(model, make_loader(new_val_dataset, batch_size=batch_size, shuffle=False, num_workers=0),
+                           device, config['precision'])
+    val_acc = history[-1]['val_acc'] if history else evaluate(model, val_loader, device, config['precision'])
+    elapsed = time.perf_counter() - start
+    print(f'Val Acc: {val_acc:.2f}% (new images: {new_val_acc:.2f}%), session took {elapsed:.1f}s')
+
+    # weights first, the manifest only marks images as seen once they are saved
+    model = model.to(memory_format=torch.contiguous_format)
+    torch.save({'model': model.state_dict(), 'optimizer': optimizer.state_dict(), 'backbone': config['backbone'],
+                'image_size': config['image_size'], 'session': session, 'history': history}, checkpoint_path + '.tmp')
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+    torch.save(model.state_dict(), output)
+    for digest in new:
+        path, label = current[digest]
+        samples[digest] = {'path': path, 'label': label, 'split': 'val' if digest in new_val else 'train',
+                           'session': session}
+    manifest['sessions'].append({'session': session, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                                 'new_train': len(new_train), 'new_val': len(new_val), 'replay': len(replay),
+                                 'epochs': len(history), 'val_acc': val_acc if val else None,
+                                 'new_val_acc': new_val_acc if new_val else None,
+                                 'seconds': elapsed})
+    save_manifest(manifest, manifest_path)
+    print(f'Model saved to {output}, resume state to {checkpoint_path}')
+    return model, history
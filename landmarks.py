@@ -0,0 +1,226 @@
+import io
+import os
+import csv
+import time
+import zipfile
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from sklearn.model_selection import train_test_split
+from handdata import label_names
+from handconstants import JOINT_NAMES, JOINT_COLUMNS, GESTURE_IDS
+
+# Gesture classifier on XR hand joint positions instead of rendered screenshots.
+#   python landmarks.py --csv data.zip --output landmark_mlp.pth --onnx landmark_mlp.onnx
+# Input is the 26 joints x XYZ that dddtext.cs already reads from XRHandSubsystem
+# (columns Wrist_X ... LittleTip_Z of hand_tracking_data.csv).
+
+WRIST = JOINT_NAMES.index('Wrist')
+INDEX_PROXIMAL = JOINT_NAMES.index('IndexProximal')
+MIDDLE_PROXIMAL = JOINT_NAMES.index('MiddleProximal')
+LITTLE_PROXIMAL = JOINT_NAMES.index('LittleProximal')
+
+NUM_FEATURES = len(JOINT_NAMES) * 3 + 9
+
+CSV_NAME = 'hand_tracking_data.csv'
+
+
+def open_csv(path):
+    # data.zip ships the CSV as data/hand_tracking_data.csv, read it without unzipping
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            member = next(n for n in archive.namelist() if n.endswith(CSV_NAME))
+            return io.StringIO(archive.read(member).decode('utf-8'))
+    return open(path, newline='')
+
+
+# Returns joints [N, 26, 3] float32 plus the per-row metadata columns
+def read_csv(path):
+    with open_csv(path) as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+
+    joints = np.array([[row[c] for c in JOINT_COLUMNS] for row in rows], dtype=np.float32)
+    return {
+        'joints': joints.reshape(len(rows), len(JOINT_NAMES), 3),
+        'labels': np.array([GESTURE_IDS[row['Gesture']] for row in rows], dtype=np.int64),
+        'clap_index': np.array([int(row['ClapIndex']) for row in rows], dtype=np.int64),
+        'sample_number': np.array([int(row['SampleNumber']) for row in rows], dtype=np.int64),
+        'timestamp': [row['TimeStamp'] for row in rows],
+    }
+
+
+def _cross(a, b):
+    # written with indexing only so it runs on numpy arrays and torch tensors (and exports to ONNX)
+    return a[..., [1, 2, 0]] * b[..., [2, 0, 1]] - a[..., [2, 0, 1]] * b[..., [1, 2, 0]]
+
+
+def _unit(v, eps=1e-8):
+    return v / ((v * v).sum(-1, keepdims=True) ** 0.5 + eps)
+
+
+# Wrist-relative, scale-normalized joint positions in a hand-local frame, plus the
+# hand frame itself (so global orientation, e.g. turn left/right, is still available).
+# joints: [N, 26, 3] numpy array or torch tensor -> [N, 87] of the same type
+def joint_features(joints):
+    xp = torch if isinstance(joints, torch.Tensor) else np
+
+    rel = joints - joints[:, WRIST:WRIST + 1]
+    y_axis = rel[:, MIDDLE_PROXIMAL]
+    across = rel[:, INDEX_PROXIMAL] - rel[:, LITTLE_PROXIMAL]
+    z_axis = _unit(_cross(across, y_axis))
+    y_axis = _unit(y_axis)
+    x_axis = _cross(y_axis, z_axis)
+
+    scale = (rel[:, MIDDLE_PROXIMAL] ** 2).sum(-1, keepdims=True) ** 0.5 + 1e-8
+    local = xp.stack([(rel * axis[:, None]).sum(-1) for axis in (x_axis, y_axis, z_axis)], -1)
+    local = local / scale[:, None]
+
+    frame = xp.concatenate([x_axis, y_axis, z_axis], -1)
+    return xp.concatenate([local.reshape(local.shape[0], -1), frame], -1)
+
+
+class LandmarkMLP(nn.Module):
+    def __init__(self, num_classes=8, hidden=64, feature_mean=None, feature_std=None):
+        super(LandmarkMLP, self).__init__()
+        self.register_buffer('feature_mean', torch.zeros(NUM_FEATURES) if feature_mean is None else feature_mean)
+        self.register_buffer('feature_std', torch.ones(NUM_FEATURES) if feature_std is None else feature_std)
+        self.classifier = nn.Sequential(
+            nn.Linear(NUM_FEATURES, hidden),
+            nn.ReLU(inplace=True),
+            nn.Dropout(0.2),
+            nn.Linear(hidden, hidden // 2),
+            nn.ReLU(inplace=True),
+            nn.Linear(hidden // 2, num_classes)
+        )
+
+    # raw joints [N, 26, 3] in, logits out; feature extraction is part of the graph
+    def forward(self, joints):
+        features = joint_features(joints)
+        return self.classifier((features - self.feature_mean) / self.feature_std)
+
+
+# Inference wrapper: numpy joints in, probabilities out
+class LandmarkClassifier:
+    def __init__(self, model_path):
+        checkpoint = torch.load(model_path, map_location='cpu')
+        self.model = LandmarkMLP(num_classes=len(label_names), hidden=checkpoint['hidden'])
+        self.model.load_state_dict(checkpoint['state_dict'])
+        self.model.eval()
+
+    def predict(self, joints):
+        joints = np.asarray(joints, dtype=np.float32).reshape(-1, len(JOINT_NAMES), 3)
+        with torch.no_grad():
+            logits = self.model(torch.from_numpy(joints))
+        return torch.softmax(logits, dim=1).numpy()
+
+
+def train(joints, labels, hidden=64, num_epochs=300, learning_rate=0.01, weight_decay=1e-4):
+    train_idx, val_idx = train_test_split(np.arange(len(labels)), test_size=0.2, random_state=42, stratify=labels)
+
+    features = torch.from_numpy(joint_features(joints).astype(np.float32))
+    targets = torch.from_numpy(labels)
+    mean = features[train_idx].mean(0)
+    # features that are constant by construction (the middle proximal joint defines the
+    # y axis and the scale) only vary by float rounding; dividing that by ~1e-6 made
+    # torch and ONNX Runtime disagree by 1e-2 on the logits, so std is floored
+    std = features[train_idx].std(0).clamp(min=1e-3)
+
+    model = LandmarkMLP(num_classes=len(label_names), hidden=hidden, feature_mean=mean, feature_std=std)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=learning_rate, weight_decay=weight_decay)
+
+    # 800 samples: full-batch training is faster than any DataLoader
+    x_train = (features[train_idx] - mean) / std
+    x_val = (features[val_idx] - mean) / std
+    for epoch in range(num_epochs):
+        model.train()
+        optimizer.zero_grad()
+        loss = criterion(model.classifier(x_train), targets[train_idx])
+        loss.backward()
+        optimizer.step()
+
+        if (epoch + 1) % 50 == 0 or epoch + 1 == num_epochs:
+            model.eval()
+            with torch.no_grad():
+                val_outputs = model.classifier(x_val)
+                val_loss = criterion(val_outputs, targets[val_idx]).item()
+                val_acc = 100. * val_outputs.argmax(1).eq(targets[val_idx]).float().mean().item()
+            print(f'Epoch [{epoch+1}/{num_epochs}] Train Loss: {loss.item():.4f} '
+                  f'Val Loss: {val_loss:.4f}, Val Acc: {val_acc:.2f}%')
+
+    model.eval()
+    return model, val_idx
+
+
+def export_onnx(model, onnx_path, sample):
+    torch.onnx.export(
+        model,
+        torch.from_numpy(sample),
+        onnx_path,
+        export_params=True,
+        opset_version=13,
+        do_constant_folding=True,
+        input_names=['joints'],
+        output_names=['output'],
+        dynamic_axes={'joints': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
+        dynamo=False,
+    )
+
+
+def time_per_frame(fn, frame, runs=1000):
+    fn(frame)
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(frame)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the joint-coordinate gesture classifier')
+    parser.add_argument('--csv', default='data.zip', help='hand_tracking_data.csv, data.zip or a sessionstore.py folder')
+    parser.add_argument('--hidden', type=int, default=64)
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--lr', type=float, default=0.01)
+    parser.add_argument('--output', default='landmark_mlp.pth')
+    parser.add_argument('--onnx', help='Also export an ONNX model taking raw joints [N, 26, 3]')
+    args = parser.parse_args()
+
+    if os.path.isdir(args.csv):
+        from sessionstore import SessionStore
+        store = SessionStore(args.csv)
+        data = store.take(store.indices(gesture=range(len(label_names))))
+        data['labels'] = data['labels'].astype(np.int64)
+    else:
+        data = read_csv(args.csv)
+    joints, labels = data['joints'], data['labels']
+    print(f'{len(labels)} samples, {joints.shape[1]} joints')
+
+    start = time.perf_counter()
+    model, val_idx = train(joints, labels, args.hidden, args.epochs, args.lr)
+    print(f'Training took {time.perf_counter() - start:.2f}s')
+
+    torch.save({'state_dict': model.state_dict(), 'hidden': args.hidden}, args.output)
+    print(f'Model saved to {args.output}')
+
+    classifier = LandmarkClassifier(args.output)
+    frame = joints[val_idx[:1]]
+    print(f'Features (numpy): {time_per_frame(joint_features, frame):.1f} us/frame, '
+          f'full predict (torch): {time_per_frame(classifier.predict, frame):.1f} us/frame')
+
+    if args.onnx:
+        import onnxruntime as ort
+        export_onnx(model, args.onnx, joints[:1])
+        session = ort.InferenceSession(args.onnx, providers=['CPUExecutionProvider'])
+        onnx_logits = session.run(None, {'joints': joints[val_idx]})[0]
+        with torch.no_grad():
+            torch_logits = model(torch.from_numpy(joints[val_idx])).numpy()
+        print(f'ONNX exported to {args.onnx}, max |diff| vs torch {np.abs(onnx_logits - torch_logits).max():.2e}, '
+              f'{time_per_frame(lambda f: session.run(None, {"joints": f}), frame):.1f} us/frame')
+        np.testing.assert_allclose(onnx_logits, torch_logits, atol=1e-4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import os
+import torch
+from torch.utils.data import DataLoader
+
+# DataLoader / CPU thread settings shared by the training scripts.
+# Size these with benchloader.py instead of guessing.
+
+
+def default_num_workers():
+    return max(0, min(4, (os.cpu_count() or 1) - 1))
+
+
+def set_threads(num_threads=None, interop_threads=None):
+    # torch.set_num_threads controls intra-op parallelism (conv/matmul kernels)
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # can only be set once, before any parallel work has started
+            print('Warning: interop threads already initialised, ignoring interop_threads')
+    return torch.get_num_threads()
+
+
+def make_loader(dataset, batch_size, shuffle, num_workers=None, persistent_workers=True,
+                prefetch_factor=2, pin_memory=None):
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if pin_memory is None:
+        pin_memory = torch.cuda.is_available()
+
+    kwargs = {}
+    if num_workers > 0:
+        # persistent workers keep their decoded state / memmaps between epochs
+        kwargs['persistent_workers'] = persistent_workers
+        kwargs['prefetch_factor'] = prefetch_factor
+
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                      pin_memory=pin_memory, **kwargs)
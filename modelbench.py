@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from handdata import get_image_paths_and_labels, split_dataset, label_names
+from handmodels import load_model, INPUT_CONFIG
+from handtrain import PRESETS
+from classifybatch import Preprocessor
+from onnxinfer import time_batches
+
+# Cost / accuracy comparison of the gesture models, to pick one for the headset.
+#   python modelbench.py --models simplecnn mobilenet efficientnet \
+#       --onnx efficientnet=efficientnetv2_clapsgood.onnx --output modelbench.json
+# Checkpoints, data folder and label scheme default to the handtrain.py presets
+# (train.py / traintransfer1.py / traineffic.py); the ONNX export defaults to the
+# checkpoint name with .onnx if that file exists. Every model x backend runs in a
+# fresh process, so cold start and peak RSS are not skewed by the previous one.
+# Reports: load + first inference time, single-frame latency and batched throughput
+# per thread count, peak RSS, parameters, GFLOPs, file size and val accuracy.
+# --profile DIR also writes a torch.profiler Chrome trace per model.
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.  # KB on Linux
+
+
+def count_flops(model, image_size):
+    from torch.utils.flop_counter import FlopCounterMode
+    counter = FlopCounterMode(display=False)
+    with counter, torch.no_grad():
+        model(torch.zeros(1, 3, image_size, image_size))
+    return counter.get_total_flops()
+
+
+def validation_images(data_folder, label_scheme, preprocess, limit):
+    file_list, labels = get_image_paths_and_labels(data_folder, label_scheme) if os.path.isdir(data_folder) else ([], [])
+    if not file_list:
+        return None, None
+    _, val_files, _, val_labels = split_dataset(file_list, labels)
+    val_files, val_labels = val_files[:limit], val_labels[:limit]
+    return torch.stack([preprocess(f) for f in val_files]), torch.tensor(val_labels)
+
+
+# Runs in a child process: one model, one backend
+def benchmark(spec):
+    torch.set_num_threads(max(spec['threads']))
+    input_config = INPUT_CONFIG[spec['backbone']]
+    image_size = input_config['image_size']
+    result = {'model': spec['name'], 'backend': spec['backend'], 'backbone': spec['backbone'],
+              'path': spec['path'], 'size_mb': os.path.getsize(spec['path']) / 1e6,
+              'baseline_rss_mb': peak_rss_mb()}
+
+    start = time.perf_counter()
+    if spec['backend'] == 'onnx':
+        from onnxinfer import OnnxClassifier
+        model = OnnxClassifier(spec['path'], intra_op_threads=max(spec['threads']))
+        run = lambda batch: model.run(batch.numpy())
+    else:
+        model = load_model(spec['backbone'], spec['path'], num_classes=len(label_names), image_size=image_size)
+
+        def run(batch):
+            with torch.no_grad():
+                return model(batch).numpy()
+    result['load_s'] = time.perf_counter() - start
+
+    # exportonnx.py graphs take resized uint8 NHWC frames instead of normalized tensors
+    takes_frames = spec['backend'] == 'onnx' and model.takes_frames
+    images, labels = validation_images(spec['data_folder'], spec['label_scheme'],
+                                       Preprocessor(**input_config, raw=takes_frames), spec['val_images'])
+    if images is None and takes_frames:
+        images = torch.randint(0, 256, (max(spec['batch_sizes']), image_size, image_size, 3), dtype=torch.uint8)
+    elif images is None:
+        images = torch.rand(max(spec['batch_sizes']), 3, image_size, image_size)
+
+    start = time.perf_counter()
+    run(images[:1])
+    result['cold_start_s'] = result['load_s'] + time.perf_counter() - start
+
+    if spec['backend'] == 'torch':
+        result['params'] = sum(p.numel() for p in model.parameters())
+        result['gflops'] = count_flops(model, image_size) / 1e9
+
+    if labels is not None:
+        predictions = np.concatenate([run(images[i:i + 32]).argmax(1) for i in range(0, len(images), 32)])
+        result['val_accuracy'] = 100. * float((predictions == labels.numpy()).mean())
+        result['val_images'] = len(labels)
+
+    result['timings'] = []
+    for threads in spec['threads']:
+        if spec['backend'] == 'onnx':
+            session = OnnxClassifier(spec['path'], intra_op_threads=threads)
+            fn = lambda batch: session.run(batch.numpy())
+        else:
+            torch.set_num_threads(threads)
+            fn = run
+        for batch_size in spec['batch_sizes']:
+            p50, p95, throughput = time_batches(fn, images, batch_size, spec['runs'])
+            result['timings'].append({'threads': threads, 'batch_size': batch_size, 'p50_ms': p50,
+                                      'p95_ms': p95, 'images_per_sec': throughput})
+
+    if spec['profile_dir'] and spec['backend'] == 'torch':
+        from torch.profiler import profile, ProfilerActivity
+        os.makedirs(spec['profile_dir'], exist_ok=True)
+        trace_path = os.path.join(spec['profile_dir'], f"{spec['name']}_trace.json")
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            for _ in range(5):
+                run(images[:max(spec['batch_sizes'])])
+        prof.export_chrome_trace(trace_path)
+        result['profile_trace'] = trace_path
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def parse_paths(items):
+    return dict(item.split('=', 1) for item in items or [])
+
+
+def build_specs(args):
+    checkpoints = parse_paths(args.checkpoint)
+    onnx_paths = parse_paths(args.onnx)
+    specs = []
+    for name in args.models:
+        preset = PRESETS[name]
+        checkpoint = checkpoints.get(name, preset['output'])
+        onnx_path = onnx_paths.get(name, os.path.splitext(checkpoint)[0] + '.onnx')
+        common = {
+            'name': name,
+            'backbone': preset['backbone'],
+            'data_folder': args.data or preset['data_folder'],
+            'label_scheme': args.label_scheme or preset['label_scheme'],
+            'val_images': args.val_images,
+            'batch_sizes': args.batch_sizes,
+            'threads': args.threads,
+            'runs': args.runs,
+            'profile_dir': args.profile,
+        }
+        specs.append(dict(common, backend='torch', path=checkpoint))
+        if os.path.exists(onnx_path) or name in onnx_paths:
+            specs.append(dict(common, backend='onnx', path=onnx_path))
+    return specs
+
+
+def print_report(results):
+    print(f'{"model":>12} {"backend":>7} {"params M":>9} {"GFLOPs":>7} {"MB":>6} {"cold s":>7} '
+          f'{"1-frame ms":>10} {"best img/s":>10} {"rss MB":>7} {"val acc":>8}')
+    for r in results:
+        if 'error' in r:
+            print(f'{r["model"]:>12} {r["backend"]:>7}  error: {r["error"]}')
+            continue
+        single = min((t for t in r['timings'] if t['batch_size'] == min(x['batch_size'] for x in r['timings'])),
+                     key=lambda t: t['p50_ms'])
+        best = max(r['timings'], key=lambda t: t['images_per_sec'])
+        params = f'{r["params"] / 1e6:.2f}' if 'params' in r else '-'
+        gflops = f'{r["gflops"]:.2f}' if 'gflops' in r else '-'
+        accuracy = f'{r["val_accuracy"]:.1f}' if 'val_accuracy' in r else '-'
+        rss = f'{r["peak_rss_mb"]:.0f}' if r['peak_rss_mb'] is not None else '-'
+        print(f'{r["model"]:>12} {r["backend"]:>7} {params:>9} {gflops:>7} {r["size_mb"]:>6.1f} '
+              f'{r["cold_start_s"]:>7.2f} {single["p50_ms"]:>10.2f} {best["images_per_sec"]:>10.1f} '
+              f'{rss:>7} {accuracy:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and profile the gesture models')
+    parser.add_argument('--models', nargs='+', default=list(PRESETS), choices=list(PRESETS))
+    parser.add_argument('--checkpoint', action='append', help='Override a checkpoint, e.g. mobilenet=m.pth')
+    parser.add_argument('--onnx', action='append', help='ONNX export of a model, e.g. efficientnet=efficientnetv2_clapsgood.onnx')
+    parser.add_argument('--data', help='Validation image folder (default: the preset folder)')
+    parser.add_argument('--label-scheme', choices=['clap', 'name'])
+    parser.add_argument('--val-images', type=int, default=200)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--profile', help='Write a torch.profiler trace per model into this folder')
+    parser.add_argument('--no-isolate', action='store_true', help='Run everything in this process (RSS is then cumulative)')
+    parser.add_argument('--output', default='modelbench.json')
+    args = parser.parse_args()
+
+    results = []
+    for spec in build_specs(args):
+        print(f'Benchmarking {spec["name"]} ({spec["backend"]}) from {spec["path"]}')
+        try:
+            if args.no_isolate:
+                result = benchmark(spec)
+            else:
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+                    result = pool.submit(benchmark, spec).result()
+        except (OSError, RuntimeError, KeyError) as e:
+            result = {'model': spec['name'], 'backend': spec['backend'], 'path': spec['path'], 'error': str(e)}
+        results.append(result)
+
+    print_report(results)
+    with open(args.output, 'w') as f:
+        json.dump({'torch_version': torch.__version__, 'cpu_count': os.cpu_count(), 'results': results}, f, indent=2)
+    print(f'Report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import os
+import time
+import argparse
+import numpy as np
+import torch
+import onnxruntime as ort
+from handdata import label_names, IMAGE_EXTENSIONS
+from handmodels import load_model, INPUT_CONFIG, BACKBONES
+from classifybatch import Preprocessor
+from framepreprocess import FramePreprocessor
+from loaderconfig import set_threads
+
+# ONNX Runtime backend for the exported gesture models (converteffic.py output).
+# One persistent CPU session with full graph optimizations, so we run exactly
+# the artifact that ships in Unity.
+#   python onnxinfer.py --onnx efficientnetv2_clapsgood.onnx --model efficientnetv2_clapsgood.pth \
+#       --backbone efficientnet_v2_s --images clapsgood --threads 4
+# prints a PyTorch vs ONNX parity check and a latency/throughput table.
+# exportonnx.py graphs (uint8 NHWC input, optionally softmax output) are detected
+# from the graph: OnnxClassifier.takes_frames says whether to feed resized uint8
+# frames (Preprocessor(raw=True)) instead of normalized NCHW tensors.
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def session_options(intra_op_threads=None, inter_op_threads=None, optimization='all', optimized_model_path=None):
+    options = ort.SessionOptions()
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[optimization]
+    # a single conv net has no independent branches worth running in parallel
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        options.inter_op_num_threads = inter_op_threads
+    if optimized_model_path:
+        # ORT writes the optimized graph here, load it later with optimization='disable'
+        options.optimized_model_filepath = optimized_model_path
+    return options
+
+
+class OnnxClassifier:
+    def __init__(self, model_path, intra_op_threads=None, inter_op_threads=None, optimization='all',
+                 optimized_model_path=None, providers=None):
+        options = session_options(intra_op_threads, inter_op_threads, optimization, optimized_model_path)
+        self.session = ort.InferenceSession(model_path, options, providers=providers or ['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = self.session.get_outputs()[0].name
+        # exportonnx.py graphs take raw uint8 NHWC frames and may end in a softmax
+        self.takes_frames = self.session.get_inputs()[0].type == 'tensor(uint8)'
+        self.input_dtype = np.uint8 if self.takes_frames else np.float32
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.outputs_probabilities = metadata.get('output', self.output_name) == 'probabilities'
+
+    def eval(self):
+        return self  # lets classifybatch treat it like a torch model
+
+    def run(self, images):
+        images = np.ascontiguousarray(images, dtype=self.input_dtype)
+        return self.session.run([self.output_name], {self.input_name: images})[0]
+
+    # Logits, or log-probabilities for softmax graphs (same softmax / argmax downstream)
+    def logits(self, images):
+        outputs = self.run(images)
+        if self.outputs_probabilities:
+            return np.log(np.maximum(outputs, np.finfo(np.float32).tiny))
+        return outputs
+
+    # torch batch in (NCHW, or uint8 NHWC if takes_frames), torch logits out (drop-in for the PyTorch model)
+    def __call__(self, images):
+        return torch.from_numpy(self.logits(images.cpu().numpy()))
+
+    def predict(self, images):
+        if self.outputs_probabilities:
+            return self.run(images)
+        logits = self.run(images)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+
+def load_images(folder, preprocess, limit=64):
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    return torch.stack([preprocess(f) for f in files])
+
+
+# images: NCHW tensors for PyTorch; onnx_images: what the graph takes (default: the same)
+def parity_check(torch_model, onnx_model, images, onnx_images=None):
+    onnx_images = images if onnx_images is None else onnx_images
+    with torch.no_grad():
+        expected = torch_model(images)
+    if onnx_model.outputs_probabilities:
+        expected = torch.softmax(expected, 1)
+    expected = expected.numpy()
+    actual = onnx_model.run(onnx_images.numpy())
+    diff = np.abs(expected - actual)
+    agreement = (expected.argmax(1) == actual.argmax(1)).mean() * 100
+    print(f'Parity on {len(images)} images: max |diff| {diff.max():.2e}, mean |diff| {diff.mean():.2e}, '
+          f'top-1 agreement {agreement:.1f}%')
+    return diff.max(), agreement
+
+
+def time_batches(fn, images, batch_size, runs):
+    batch = images[:batch_size]
+    if len(batch) < batch_size:
+        batch = batch.repeat((batch_size + len(batch) - 1) // len(batch), 1, 1, 1)[:batch_size]
+    fn(batch)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(batch)
+        timings.append(time.perf_counter() - start)
+    timings = np.array(timings)
+    return np.median(timings) * 1000, np.percentile(timings, 95) * 1000, batch_size / np.median(timings)
+
+
+def compare(torch_model, onnx_model, images, batch_sizes, runs, onnx_images=None):
+    onnx_images = images if onnx_images is None else onnx_images
+
+    def torch_fn(batch):
+        with torch.no_grad():
+            torch_model(batch)
+
+    def onnx_fn(batch):
+        onnx_model.run(batch.numpy())
+
+    print(f'{"backend":>8} {"batch":>6} {"p50 ms":>9} {"p95 ms":>9} {"img/s":>9}')
+    results = []
+    for batch_size in batch_sizes:
+        for name, fn, inputs in (('torch', torch_fn, images), ('onnx', onnx_fn, onnx_images)):
+            p50, p95, throughput = time_batches(fn, inputs, batch_size, runs)
+            print(f'{name:>8} {batch_size:>6} {p50:>9.2f} {p95:>9.2f} {throughput:>9.1f}')
+            results.append({'backend': name, 'batch_size': batch_size, 'p50_ms': p50, 'p95_ms': p95,
+                            'images_per_sec': throughput})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ONNX Runtime parity check and latency comparison')
+    parser.add_argument('--onnx', default='efficientnetv2_clapsgood.onnx')
+    parser.add_argument('--model', default='efficientnetv2_clapsgood.pth', help='PyTorch state_dict the ONNX was exported from')
+    parser.add_argument('--backbone', default='efficientnet_v2_s', choices=sorted(BACKBONES))
+    parser.add_argument('--images', help='Folder with sample images (random input if omitted)')
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--threads', type=int, default=None, help='intra-op threads for both backends')
+    parser.add_argument('--interop-threads', type=int, default=None)
+    parser.add_argument('--optimization', default='all', choices=sorted(GRAPH_OPTIMIZATION_LEVELS))
+    parser.add_argument('--save-optimized', help='Write the ORT-optimized graph to this path')
+    args = parser.parse_args()
+
+    set_threads(args.threads)
+    input_config = INPUT_CONFIG[args.backbone]
+    torch_model = load_model(args.backbone, args.model, num_classes=len(label_names),
+                             image_size=input_config['image_size'])
+    onnx_model = OnnxClassifier(args.onnx, args.threads, args.interop_threads, args.optimization, args.save_optimized)
+
+    if args.images:
+        images = load_images(args.images, Preprocessor(**input_config))
+        frames = load_images(args.images, Preprocessor(**input_config, raw=True))
+    else:
+        size = input_config['image_size']
+        frames = np.random.default_rng(0).integers(0, 256, (32, size, size, 3), dtype=np.uint8)
+        images = torch.from_numpy(FramePreprocessor(**input_config)(frames).copy())
+        frames = torch.from_numpy(frames)
+    onnx_images = frames if onnx_model.takes_frames else images
+
+    parity_check(torch_model, onnx_model, images, onnx_images)
+    compare(torch_model, onnx_model, images, [int(b) for b in args.batch_sizes.split(',')], args.runs, onnx_images)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import os
+import time
+import random
+import argparse
+import numpy as np
+import onnx
+from onnx import version_converter
+from onnxruntime.quantization import (quantize_static, quantize_dynamic, CalibrationDataReader,
+                                      CalibrationMethod, QuantFormat, QuantType)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from handdata import get_image_paths_and_labels, split_dataset
+from handmodels import INPUT_CONFIG, BACKBONES
+from classifybatch import Preprocessor
+from onnxinfer import OnnxClassifier
+
+# Post-training INT8 quantization for the exported gesture models.
+#   python quantizeonnx.py --onnx efficientnetv2_clapsgood.onnx --data clapsgood --label-scheme name
+# Static quantization calibrates activations on images from the training split
+# of the same folder; --mode dynamic quantizes weights only (no calibration) and
+# is only a fallback, ConvInteger kernels are often slower than FP32 convs on CPU.
+# Prints size, CPU latency and validation top-1 of the FP32 and INT8 models.
+
+# per-channel QDQ needs the axis attribute of DequantizeLinear (opset 13+),
+# converteffic.py exports opset 11 so older graphs get converted first
+MIN_QUANT_OPSET = 13
+
+CALIBRATION_METHODS = {
+    'minmax': CalibrationMethod.MinMax,
+    'entropy': CalibrationMethod.Entropy,
+    'percentile': CalibrationMethod.Percentile,
+}
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    def __init__(self, file_list, preprocess, input_name, batch_size=8):
+        self.file_list = file_list
+        self.preprocess = preprocess
+        self.input_name = input_name
+        self.batch_size = batch_size
+        self.position = 0
+
+    def get_next(self):
+        if self.position >= len(self.file_list):
+            return None
+        files = self.file_list[self.position:self.position + self.batch_size]
+        self.position += self.batch_size
+        batch = np.stack([self.preprocess(f).numpy() for f in files])
+        return {self.input_name: batch}
+
+    def rewind(self):
+        self.position = 0
+
+
+def quantize(fp32_path, int8_path, mode='static', calibration_files=None, preprocess=None,
+             calibration_method='minmax', per_channel=True):
+    # shape inference + graph cleanup first, as recommended by onnxruntime
+    prepared_path = int8_path + '.prep.onnx'
+    quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+
+    try:
+        model = onnx.load(prepared_path)
+        opset = next(o.version for o in model.opset_import if o.domain in ('', 'ai.onnx'))
+        if opset < MIN_QUANT_OPSET:
+            onnx.save(version_converter.convert_version(model, MIN_QUANT_OPSET), prepared_path)
+
+        if mode == 'static':
+            input_name = OnnxClassifier(prepared_path).input_name
+            reader = ImageCalibrationReader(calibration_files, preprocess, input_name)
+            quantize_static(prepared_path, int8_path, reader,
+                            quant_format=QuantFormat.QDQ,
+                            activation_type=QuantType.QUInt8,
+                            weight_type=QuantType.QInt8,
+                            per_channel=per_channel,
+                            calibrate_method=CALIBRATION_METHODS[calibration_method])
+        elif mode == 'dynamic':
+            quantize_dynamic(prepared_path, int8_path, weight_type=QuantType.QInt8, per_channel=per_channel)
+        else:
+            raise ValueError(f'Unknown quantization mode: {mode}')
+    finally:
+        os.remove(prepared_path)
+
+
+def evaluate(model_path, images, labels, threads=None, runs=20):
+    model = OnnxClassifier(model_path, intra_op_threads=threads)
+
+    predictions = []
+    for start in range(0, len(images), 32):
+        predictions.append(model.run(images[start:start + 32]).argmax(1))
+    accuracy = 100. * (np.concatenate(predictions) == np.array(labels)).mean()
+
+    single = images[:1]
+    model.run(single)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.run(single)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'size_mb': os.path.getsize(model_path) / 1e6,
+        'latency_ms': np.median(timings) * 1000,
+        'top1': accuracy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='INT8 quantization of an exported gesture model')
+    parser.add_argument('--onnx', default='efficientnetv2_clapsgood.onnx', help='FP32 model')
+    parser.add_argument('--output', help='INT8 model path (default: <onnx>_int8_<mode>.onnx)')
+    parser.add_argument('--backbone', default='efficientnet_v2_s', choices=sorted(BACKBONES), help='Selects input size/normalization')
+    parser.add_argument('--data', default='clapsgood')
+    parser.add_argument('--label-scheme', default='name', choices=['clap', 'name'])
+    parser.add_argument('--mode', default='static', choices=['static', 'dynamic'])
+    parser.add_argument('--calibration-images', type=int, default=200)
+    parser.add_argument('--calibration-method', default='minmax', choices=sorted(CALIBRATION_METHODS))
+    parser.add_argument('--per-tensor', action='store_true', help='Per-tensor instead of per-channel weights')
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.onnx)[0] + f'_int8_{args.mode}.onnx'
+    # exportonnx.py graphs calibrate and score on resized uint8 frames
+    preprocess = Preprocessor(**INPUT_CONFIG[args.backbone], raw=OnnxClassifier(args.onnx).takes_frames)
+
+    # same split as handtrain.py: calibrate on train images, score on val images
+    file_list, labels = get_image_paths_and_labels(args.data, args.label_scheme)
+    train_files, val_files, _, val_labels = split_dataset(file_list, labels)
+    calibration_files = random.Random(0).sample(train_files, min(args.calibration_images, len(train_files)))
+
+    start = time.perf_counter()
+    quantize(args.onnx, output, args.mode, calibration_files, preprocess,
+             args.calibration_method, per_channel=not args.per_tensor)
+    print(f'Quantized ({args.mode}) in {time.perf_counter() - start:.1f}s -> {output}')
+
+    val_images = np.stack([preprocess(f).numpy() for f in val_files])
+    baseline = evaluate(args.onnx, val_images, val_labels, args.threads)
+    quantized = evaluate(output, val_images, val_labels, args.threads)
+
+    print(f'{"model":>6} {"size MB":>9} {"ms/frame":>9} {"top-1 %":>8}')
+    for name, result in (('fp32', baseline), ('int8', quantized)):
+        print(f'{name:>6} {result["size_mb"]:>9.1f} {result["latency_ms"]:>9.2f} {result["top1"]:>8.2f}')
+    print(f'size x{baseline["size_mb"] / quantized["size_mb"]:.2f} smaller, '
+          f'latency x{baseline["latency_ms"] / quantized["latency_ms"]:.2f} faster, '
+          f'top-1 {quantized["top1"] - baseline["top1"]:+.2f} points on {len(val_files)} val images')
+
+
+if __name__ == '__main__':
+    main()
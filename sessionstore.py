@@ -0,0 +1,274 @@
+import os
+import sys
+import shutil
+import csv
+import json
+import calendar
+import datetime
+import argparse
+import numpy as np
+from handdata import label_names
+from handconstants import GESTURE_IDS
+from landmarks import JOINT_NAMES, JOINT_COLUMNS, read_csv
+
+# Columnar store for recorded hand-tracking sessions.
+#   python sessionstore.py ingest data.zip websocket/capture.bin
+#   python sessionstore.py info
+#   python sessionstore.py export left.csv --gesture left
+# Every session is a folder of .npy columns under sessions/ (joints [frames, 26, 3]
+# float32, labels, clap_index, sample_number, timestamp_us), opened memory-mapped,
+# so slicing or gathering frames only reads those rows. index.json lists the
+# sessions; frames are addressed globally in session order. CSV export writes the
+# hand_tracking_data.csv layout back out.
+
+STORE_DIR = 'sessions'
+INDEX_NAME = 'index.json'
+CSV_HEADER = ['ClapIndex', 'TimeStamp', 'Gesture', 'SampleNumber'] + JOINT_COLUMNS
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+COLUMNS = {
+    'joints': np.float32,
+    'labels': np.int8,         # index into label_names, -1 unknown
+    'clap_index': np.int16,    # -1 when the source has none (NATS captures)
+    'sample_number': np.int32,
+    'timestamp_us': np.int64,  # Unity wall clock as UTC-naive epoch us, or the sender's monotonic us
+}
+
+
+def parse_timestamp(text):
+    return calendar.timegm(datetime.datetime.strptime(text, TIMESTAMP_FORMAT).timetuple()) * 1000000
+
+
+def format_timestamp(timestamp_us):
+    return (datetime.datetime(1970, 1, 1) + datetime.timedelta(microseconds=int(timestamp_us))).strftime(TIMESTAMP_FORMAT)
+
+
+def columns_from_csv(path):
+    data = read_csv(path)
+    return {
+        'joints': data['joints'],
+        'labels': data['labels'],
+        'clap_index': data['clap_index'],
+        'sample_number': data['sample_number'],
+        'timestamp_us': np.array([parse_timestamp(t) for t in data['timestamp']], dtype=np.int64),
+    }
+
+
+# Joint frames from a websock_recv.py capture (JSON from Unity or jointcodec binary)
+def columns_from_capture(path):
+    # the capture format and the NATS parser live with the websocket tools
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'websocket'))
+    from natsclient import MsgParser
+    from websock_recv import read_capture, JointFrame
+    from jointcodec import decode
+
+    frames = []
+    parser = MsgParser()
+    for raw in read_capture(path):
+        for op, subject, sid, reply, payload in parser.feed(raw):
+            if op != 'MSG':
+                continue
+            try:
+                record = decode(payload)
+            except ValueError:
+                continue
+            for frame in (record if isinstance(record, list) else [record]):
+                if isinstance(frame, JointFrame):
+                    frames.append(frame)
+
+    def timestamp(value):
+        if isinstance(value, str):
+            return parse_timestamp(value)
+        return int(value or 0)
+
+    return {
+        'joints': np.array([f.joints for f in frames], dtype=np.float32).reshape(-1, len(JOINT_NAMES), 3),
+        'labels': np.array([GESTURE_IDS.get(f.gesture, -1) for f in frames]),
+        'clap_index': np.full(len(frames), -1),
+        'sample_number': np.array([f.sample_number or 0 for f in frames]),
+        'timestamp_us': np.array([timestamp(f.timestamp) for f in frames], dtype=np.int64),
+    }
+
+
+class SessionStore:
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        index_path = os.path.join(root, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {'label_names': label_names, 'sessions': {}}
+        self._open = {}
+        self._reset()
+
+    def _reset(self):
+        self._labels = None
+        frames = [info['frames'] for info in self.index['sessions'].values()]
+        self.offsets = np.concatenate([[0], np.cumsum(frames, dtype=np.int64)])
+
+    @property
+    def sessions(self):
+        return list(self.index['sessions'])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def add_session(self, name, columns, source=None):
+        folder = os.path.join(self.root, name)
+        os.makedirs(folder, exist_ok=True)
+        frames = len(columns['joints'])
+        for column, dtype in COLUMNS.items():
+            array = np.ascontiguousarray(columns[column], dtype=dtype)
+            if len(array) != frames:
+                raise ValueError(f'Column {column} has {len(array)} rows, expected {frames}')
+            tmp_path = os.path.join(folder, column + '.tmp.npy')
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(folder, column + '.npy'))
+
+        labels = np.asarray(columns['labels'])
+        self.index['sessions'][name] = {
+            'frames': frames,
+            'source': source,
+            'gesture_counts': {g: int((labels == i).sum()) for i, g in enumerate(label_names) if (labels == i).any()},
+        }
+        self._open.pop(name, None)
+        self._write_index()
+        self._reset()
+
+    def remove_session(self, name):
+        info = self.index['sessions'].pop(name)
+        self._open.pop(name, None)
+        shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        self._write_index()
+        self._reset()
+        return info
+
+    def _write_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, INDEX_NAME + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, INDEX_NAME))
+
+    # Memory-mapped columns of one session
+    def session(self, name):
+        if name not in self._open:
+            if name not in self.index['sessions']:
+                raise KeyError(f'Unknown session: {name}')
+            folder = os.path.join(self.root, name)
+            self._open[name] = {c: np.load(os.path.join(folder, c + '.npy'), mmap_mode='r') for c in COLUMNS}
+        return self._open[name]
+
+    @property
+    def labels(self):
+        # one byte per frame, small enough to keep in memory for the gesture index
+        if self._labels is None:
+            self._labels = np.concatenate([np.asarray(self.session(n)['labels']) for n in self.sessions] or
+                                          [np.zeros(0, dtype=np.int8)])
+        return self._labels
+
+    # Global frame indices, optionally restricted to gestures (names or ids) and sessions
+    def indices(self, gesture=None, session=None):
+        mask = np.ones(len(self), dtype=bool)
+        if gesture is not None:
+            gestures = [gesture] if isinstance(gesture, (str, int, np.integer)) else gesture
+            ids = [GESTURE_IDS[g] if isinstance(g, str) else int(g) for g in gestures]
+            mask &= np.isin(self.labels, ids)
+        if session is not None:
+            names = [session] if isinstance(session, str) else session
+            selected = np.zeros(len(self), dtype=bool)
+            for name in names:
+                position = self.sessions.index(name)
+                selected[self.offsets[position]:self.offsets[position + 1]] = True
+            mask &= selected
+        return np.flatnonzero(mask)
+
+    # Gather frames by global index -> dict of columns (plus 'session', the session position)
+    def take(self, indices=None, columns=COLUMNS):
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size and (indices.min() < 0 or indices.max() >= len(self)):
+            raise IndexError('frame index out of range')
+
+        session_ids = np.searchsorted(self.offsets, indices, side='right') - 1
+        result = {c: np.empty((len(indices),) + ((len(JOINT_NAMES), 3) if c == 'joints' else ()), dtype=COLUMNS[c])
+                  for c in columns}
+        for position in np.unique(session_ids):
+            selected = session_ids == position
+            rows = indices[selected] - self.offsets[position]
+            data = self.session(self.sessions[position])
+            for c in columns:
+                result[c][selected] = data[c][rows]
+        result['session'] = session_ids
+        return result
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self.take(np.arange(len(self))[item])
+        return self.take([item])
+
+    def export_csv(self, path, indices=None):
+        data = self.take(indices)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            for i in range(len(data['labels'])):
+                label = int(data['labels'][i])
+                writer.writerow([int(data['clap_index'][i]), format_timestamp(data['timestamp_us'][i]),
+                                 label_names[label] if label >= 0 else '', int(data['sample_number'][i])]
+                                + [f'{v:.4f}' for v in data['joints'][i].reshape(-1)])
+        return len(data['labels'])
+
+
+def ingest(store, paths, names=None):
+    for i, path in enumerate(paths):
+        name = names[i] if names else os.path.splitext(os.path.basename(path))[0]
+        if path.lower().endswith(('.csv', '.zip')):
+            columns = columns_from_csv(path)
+        else:
+            columns = columns_from_capture(path)
+        store.add_session(name, columns, source=os.path.abspath(path))
+        print(f'{path}: {len(columns["joints"])} frames -> session {name}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar storage for recorded hand-tracking sessions')
+    parser.add_argument('--store', default=STORE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', help='Add CSV / data.zip / NATS capture files as sessions')
+    ingest_parser.add_argument('paths', nargs='+')
+    ingest_parser.add_argument('--name', action='append', help='Session name per path (default: file name)')
+
+    commands.add_parser('info', help='List sessions and gesture counts')
+
+    export_parser = commands.add_parser('export', help='Write frames back out as hand_tracking_data.csv')
+    export_parser.add_argument('output')
+    export_parser.add_argument('--gesture', action='append')
+    export_parser.add_argument('--session', action='append')
+
+    remove_parser = commands.add_parser('remove', help='Delete a session')
+    remove_parser.add_argument('name')
+    args = parser.parse_args()
+
+    store = SessionStore(args.store)
+    if args.command == 'ingest':
+        if args.name and len(args.name) != len(args.paths):
+            parser.error('give one --name per path')
+        ingest(store, args.paths, args.name)
+    elif args.command == 'info':
+        for name, info in store.index['sessions'].items():
+            print(f'{name}: {info["frames"]} frames {info["gesture_counts"]}')
+        print(f'{len(store)} frames in {len(store.sessions)} sessions')
+    elif args.command == 'export':
+        count = store.export_csv(args.output, store.indices(args.gesture, args.session))
+        print(f'Wrote {count} frames to {args.output}')
+    elif args.command == 'remove':
+        store.remove_session(args.name)
+        print(f'Removed session {args.name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import os
+import csv
+import math
+import time
+import random
+import argparse
+import itertools
+import contextlib
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import yaml
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from handdata import build_datasets, label_names
+from handmodels import build_model
+from handtrain import DEFAULT_CONFIG, load_config, train_and_validate
+from loaderconfig import make_loader, set_threads
+
+# Hyperparameter sweep over handtrain.py configs, trials run in parallel.
+#   python sweep.py --preset mobilenet --param learning_rate=0.0003,0.001,0.003 --param batch_size=16,32
+#   python sweep.py --preset simplecnn --search random --trials 20 \
+#       --param learning_rate=log:1e-4:1e-2 --param batch_size=16,32,64 --param augment=true,false
+# --param values are comma separated (grid, or sampled uniformly in random search);
+# log:a:b / range:a:b are continuous ranges for random search.
+# The CPU cores are split into one slot per worker (--threads cores each, pinned
+# with sched_setaffinity where available), so trials don't oversubscribe. The
+# tensor cache (tensorcache.py) is built once up front and every trial maps the
+# same file. A trial is pruned when its validation accuracy falls below the median
+# of the other trials at the same epoch (after --prune-warmup epochs), or when it
+# stops improving for --patience epochs. Every trial logs to <output>/trial_NNN.log,
+# the summary goes to <output>/results.csv. Trials always train the whole model
+# (training_mode full), the head / incremental / distill modes are not swept.
+
+RESULT_FIELDS = ['trial', 'status', 'epochs', 'best_val_acc', 'best_epoch', 'final_val_acc', 'wall_time']
+
+
+def parse_param(item):
+    key, _, values = item.partition('=')
+    if key not in DEFAULT_CONFIG:
+        raise ValueError(f'Unknown config key: {key}')
+    kind, _, bounds = values.partition(':')
+    if kind in ('log', 'range'):
+        low, high = (float(v) for v in bounds.split(':'))
+        return key, (kind, low, high)
+    return key, [yaml.safe_load(v) for v in values.split(',')]
+
+
+def grid_trials(space):
+    for key, values in space.items():
+        if isinstance(values, tuple):
+            raise ValueError(f'{key}: ranges need --search random')
+    keys = list(space)
+    return [dict(zip(keys, combo)) for combo in itertools.product(*space.values())]
+
+
+def random_trials(space, count, seed=0):
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(count):
+        params = {}
+        for key, values in space.items():
+            if isinstance(values, list):
+                params[key] = rng.choice(values)
+            else:
+                if values[0] == 'log':
+                    params[key] = math.exp(rng.uniform(math.log(values[1]), math.log(values[2])))
+                else:
+                    params[key] = rng.uniform(values[1], values[2])
+                # integer settings (batch_size, epochs, ...) stay integers for both range kinds
+                if isinstance(DEFAULT_CONFIG[key], int) and not isinstance(DEFAULT_CONFIG[key], bool):
+                    params[key] = int(round(params[key]))
+        trials.append(params)
+    return trials
+
+
+# Disjoint core sets, one per worker
+def core_slots(workers, threads):
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    return [sorted({cores[(i * threads + j) % len(cores)] for j in range(threads)}) for i in range(workers)]
+
+
+def init_worker(slots):
+    cores = slots.get()
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    set_threads(len(cores), 1)
+
+
+# Median pruning against the curves of all other trials so far
+def should_prune(curves, trial_id, epoch, val_acc, warmup, min_trials):
+    if epoch < warmup:
+        return False
+    others = [curve[epoch - 1] for tid, curve in curves.items() if tid != trial_id and len(curve) >= epoch]
+    return len(others) >= min_trials and val_acc < statistics.median(others)
+
+
+def run_trial(trial_id, config, curves, options):
+    log_path = os.path.join(options['output'], f'trial_{trial_id:03d}.log')
+    start = time.perf_counter()
+    history = []
+    status = 'complete'
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+        print(f'Trial {trial_id}: {config}')
+        print(f'Threads: {torch.get_num_threads()}, cores: '
+              f'{sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else "all"}')
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        try:
+            train_dataset, val_dataset = build_datasets(config)
+            train_loader = make_loader(train_dataset, batch_size=config['batch_size'], shuffle=True, num_workers=0)
+            val_loader = make_loader(val_dataset, batch_size=config['batch_size'], shuffle=False, num_workers=0)
+            model = build_model(config['backbone'], num_classes=len(label_names), pretrained=config['pretrained'],
+                                image_size=config['image_size'])
+            if config['channels_last']:
+                model = model.to(memory_format=torch.channels_last)
+            model = model.to(device)
+            criterion = nn.CrossEntropyLoss()
+            optimizer = optim.Adam(model.parameters(), lr=config['learning_rate'])
+
+            curves[trial_id] = []
+            for epoch in range(1, config['num_epochs'] + 1):
+                row = train_and_validate(model, train_loader, val_loader, criterion, optimizer, 1, device,
+                                         precision=config['precision'], accumulation_steps=config['accumulation_steps'],
+                                         channels_last=config['channels_last'])[0]
+                row['epoch'] = epoch
+                history.append(row)
+                curves[trial_id] = curves[trial_id] + [row['val_acc']]  # manager dicts need reassignment
+
+                best_epoch = max(history, key=lambda r: r['val_acc'])['epoch']
+                if options['patience'] and epoch - best_epoch >= options['patience']:
+                    status = 'stopped'
+                    break
+                if should_prune(dict(curves), trial_id, epoch, row['val_acc'], options['prune_warmup'],
+                                options['prune_min_trials']):
+                    status = 'pruned'
+                    break
+        except Exception as e:
+            print(f'Trial failed: {e!r}')
+            status = 'failed'
+
+    best = max(history, key=lambda r: r['val_acc']) if history else None
+    return {
+        'trial': trial_id,
+        'status': status,
+        'epochs': len(history),
+        'best_val_acc': best['val_acc'] if best else float('nan'),
+        'best_epoch': best['epoch'] if best else 0,
+        'final_val_acc': history[-1]['val_acc'] if history else float('nan'),
+        'wall_time': time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep for handtrain.py')
+    parser.add_argument('--preset', help='handtrain.py preset for the fixed settings')
+    parser.add_argument('--config', help='YAML file with fixed DEFAULT_CONFIG keys')
+    parser.add_argument('--param', action='append', required=True, help='key=v1,v2,... or key=log:a:b / key=range:a:b')
+    parser.add_argument('--search', default='grid', choices=['grid', 'random'])
+    parser.add_argument('--trials', type=int, default=10, help='Number of random search trials')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--epochs', type=int, help='Epoch budget per trial (default: the config num_epochs)')
+    parser.add_argument('--workers', type=int, default=None, help='Concurrent trials (default: cores / threads)')
+    parser.add_argument('--threads', type=int, default=None, help='Cores per trial (default: cores / workers)')
+    parser.add_argument('--prune-warmup', type=int, default=2, help='Epochs before median pruning starts')
+    parser.add_argument('--prune-min-trials', type=int, default=3, help='Other trials needed for a median')
+    parser.add_argument('--patience', type=int, default=0, help='Stop a trial after N epochs without improvement (0: off)')
+    parser.add_argument('--output', default='sweep', help='Folder for trial logs and results.csv')
+    args = parser.parse_args()
+
+    base = load_config(args.preset, args.config, {'num_epochs': args.epochs})
+    space = dict(parse_param(item) for item in args.param)
+    trials = grid_trials(space) if args.search == 'grid' else random_trials(space, args.trials, args.seed)
+    configs = [dict(base, **params) for params in trials]
+    modes = sorted({config['training_mode'] for config in configs} - {'full'})
+    if modes:
+        raise ValueError(f'sweep.py only runs training_mode full, not {", ".join(modes)}')
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    if args.workers:
+        workers = args.workers
+        threads = args.threads or max(1, cores // workers)
+    else:
+        threads = args.threads or max(1, cores // len(configs))
+        workers = max(1, min(len(configs), cores // threads))
+    os.makedirs(args.output, exist_ok=True)
+    print(f'{len(configs)} trials, {workers} at a time with {threads} threads each ({cores} cores)')
+
+    # build every tensor cache once, so trials only map it
+    cached = set()
+    for config in configs:
+        key = (config['data_folder'], config['label_scheme'], config.get('split_file'), config['image_size'],
+               config['normalize'], config['augment'])
+        if config['use_tensor_cache'] and key not in cached:
+            build_datasets(config)
+            cached.add(key)
+
+    context = multiprocessing.get_context('spawn')
+    slots = context.Queue()
+    for slot in core_slots(workers, threads):
+        slots.put(slot)
+    options = {'output': args.output, 'patience': args.patience, 'prune_warmup': args.prune_warmup,
+               'prune_min_trials': args.prune_min_trials}
+
+    start = time.perf_counter()
+    results = []
+    with context.Manager() as manager, \
+            ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker, initargs=(slots,)) as pool:
+        curves = manager.dict()
+        futures = {pool.submit(run_trial, i, config, curves, options): i for i, config in enumerate(configs)}
+        for future in as_completed(futures):
+            result = future.result()
+            result.update(trials[result['trial']])
+            results.append(result)
+            print(f"trial {result['trial']:3d} {result['status']:>8} after {result['epochs']} epochs: "
+                  f"best val acc {result['best_val_acc']:.2f}% ({result['wall_time']:.0f}s) {trials[result['trial']]}")
+    elapsed = time.perf_counter() - start
+
+    results.sort(key=lambda r: -r['best_val_acc'] if not math.isnan(r['best_val_acc']) else math.inf)
+    with open(os.path.join(args.output, 'results.csv'), 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS + list(space))
+        writer.writeheader()
+        writer.writerows(results)
+
+    print(f'\n{"trial":>5} {"status":>8} {"epochs":>6} {"best acc":>8} {"wall s":>7}  params')
+    for r in results:
+        print(f"{r['trial']:>5} {r['status']:>8} {r['epochs']:>6} {r['best_val_acc']:>8.2f} {r['wall_time']:>7.1f}  "
+              f"{', '.join(f'{k}={r[k]}' for k in space)}")
+    trial_time = sum(r['wall_time'] for r in results)
+    print(f'Sweep took {elapsed:.0f}s for {trial_time:.0f}s of trials ({trial_time / elapsed:.1f}x parallel)')
+    if results:
+        print(f'Best: {yaml.safe_dump({k: results[0][k] for k in space}, default_flow_style=True).strip()} '
+              f'-> results in {args.output}/results.csv')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from torchvision import transforms
+from PIL import Image
+
+# One-time preprocessing cache for the training scripts.
+# Decoded + resized images are written once into a memory-mapped .npy file and
+# every epoch afterwards reads rows straight out of the mapping.
+#
+#   dtype='uint8'   -> stores the resized RGB pixels (CHW), ToTensor/Normalize run on the fly
+#   dtype='float16' -> stores the fully normalized tensor (CHW)
+#
+# The index file is named after the transform config (size, dtype, mean/std) and
+# the data folder, and remembers path + mtime + size of every image, so editing an
+# image, switching folders or changing the resolution (128 vs 224) never serves
+# stale data. A rebuild writes a new array file (<key>.<pid>-<time>.npy) and then
+# swaps in the index that names it, so the index never points at rows it didn't write.
+
+CACHE_DIR = 'tensor_cache'
+CACHE_VERSION = 2
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def config_key(size, dtype, mean=None, std=None, folder=None):
+    config = {'version': CACHE_VERSION, 'size': size, 'dtype': dtype, 'mean': mean, 'std': std, 'folder': folder}
+    digest = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+    return f'{size}x{size}_{dtype}_{digest}'
+
+
+class TensorCache:
+    def __init__(self, file_list, size, dtype='float16', mean=None, std=None, cache_dir=CACHE_DIR):
+        if dtype not in ('uint8', 'float16'):
+            raise ValueError(f'Unsupported cache dtype: {dtype}')
+
+        self.size = size
+        self.dtype = dtype
+        self.mean = mean
+        self.std = std
+
+        paths = [os.path.abspath(p) for p in file_list]
+        # one cache per data folder, other folders' images never end up in (or evict) its rows
+        folder = os.path.commonpath([os.path.dirname(p) for p in paths]) if paths else None
+        self.key = config_key(size, dtype, mean, std, folder)
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, self.key + '.json')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.array_path, self.rows = self._build(paths)
+        self._array = None
+
+    # Resize (+ ToTensor/Normalize) exactly like the torchvision pipeline in the scripts
+    def _preprocess(self, path):
+        image = Image.open(path).convert('RGB')
+        image = transforms.Resize((self.size, self.size))(image)
+        if self.dtype == 'uint8':
+            return np.asarray(image, dtype=np.uint8).transpose(2, 0, 1)
+
+        tensor = transforms.ToTensor()(image)
+        if self.mean is not None:
+            tensor = transforms.Normalize(mean=self.mean, std=self.std)(tensor)
+        return tensor.numpy().astype(np.float16)
+
+    # (array path, {path: {'row', 'signature'}}) of the current cache, or (None, {})
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return None, {}
+        with open(self.index_path) as f:
+            index = json.load(f)
+        array_path = os.path.join(self.cache_dir, index['array'])
+        if not os.path.exists(array_path):
+            return None, {}
+        return array_path, index['images']
+
+    def _build(self, paths):
+        old_path, index = self._load_index()
+
+        # Keep every entry whose source image still exists unchanged, plus the requested files
+        signatures = {}
+        for path in set(index) | set(paths):
+            if os.path.exists(path):
+                signatures[path] = file_signature(path)
+
+        missing = [p for p in paths if p not in signatures]
+        if missing:
+            raise FileNotFoundError(f'Image not found: {missing[0]}')
+
+        valid = {p: entry for p, entry in index.items()
+                 if p in signatures and entry['signature'] == signatures[p]}
+        if len(valid) == len(signatures):
+            return old_path, {p: entry['row'] for p, entry in valid.items()}
+
+        all_paths = sorted(signatures)
+        stale = len(all_paths) - len(valid)
+        array_name = f'{self.key}.{os.getpid()}-{time.time_ns()}.npy'
+        array_path = os.path.join(self.cache_dir, array_name)
+        print(f'Building tensor cache {array_path}: {stale} of {len(all_paths)} images to preprocess')
+
+        shape = (len(all_paths), 3, self.size, self.size)
+        old = np.load(old_path, mmap_mode='r') if valid else None
+        out = np.lib.format.open_memmap(array_path, mode='w+', dtype=self.dtype, shape=shape)
+
+        new_index = {}
+        for row, path in enumerate(all_paths):
+            if path in valid:
+                out[row] = old[valid[path]['row']]
+            else:
+                out[row] = self._preprocess(path)
+            new_index[path] = {'row': row, 'signature': signatures[path]}
+
+        out.flush()
+        del out, old
+        # the new array is complete before any index names it
+        tmp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'array': array_name, 'images': new_index}, f)
+        os.replace(tmp_path, self.index_path)
+        if old_path is not None:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass  # still mapped by another process (Windows), or already replaced
+
+        return array_path, {p: entry['row'] for p, entry in new_index.items()}
+
+    @property
+    def array(self):
+        # Opened lazily so DataLoader workers each map the file themselves
+        if self._array is None:
+            self._array = np.load(self.array_path, mmap_mode='c')
+        return self._array
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_array'] = None  # never pickle the mapping into spawned workers
+        return state
+
+    def get(self, path):
+        # torch.from_numpy shares memory with the mapping, no copy until the dtype conversion
+        tensor = torch.from_numpy(self.array[self.rows[os.path.abspath(path)]])
+        if self.dtype == 'float16':
+            return tensor.float()
+
+        tensor = tensor.float().div_(255)
+        if self.mean is not None:
+            tensor = transforms.Normalize(mean=self.mean, std=self.std)(tensor)
+        return tensor
+
+
+# Drop-in replacement for HandPositionDataset backed by a TensorCache.
+# transform (optional) runs on the cached tensor, e.g. RandomHorizontalFlip.
+class CachedHandPositionDataset(Dataset):
+    def __init__(self, cache, file_list, labels, transform=None):
+        self.cache = cache
+        self.file_list = file_list
+        self.labels = labels
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.file_list)
+
+    def __getitem__(self, idx):
+        image = self.cache.get(self.file_list[idx])
+
+        if self.transform:
+            image = self.transform(image)
+
+        label = self.labels[idx]
+        return image, label
@@ -0,0 +1,209 @@
+import json
+import time
+import uuid
+import argparse
+import numpy as np
+from websock_recv import JOINT_NAMES, JOINT_KEYS, JointFrame, Pose, decode_payload
+from handconstants import label_names, GESTURE_IDS, UNITY_GESTURES  # on sys.path through websock_recv
+
+# Compact binary payloads for the NATS link, instead of indented JSON.
+# Joint frame (version 1), little endian, fixed size per frame:
+#   magic "HJ" | version u1 | flags u1 | gesture id u1 | reserved u1 | sample number u4
+#   | timestamp u8 (monotonic, microseconds) | joints 26 x XYZ float16 (flags & 1) or float32
+# = 174 bytes with float16, 330 with float32, vs ~2 KB of Formatting.Indented JSON.
+# Joints are in XRHandJointID order (JOINT_NAMES), missing joints are NaN.
+# Several frames can be sent in one payload, they are simply concatenated.
+# Pose (webs_to_ext.py) is "HP" | version | flags | channel UUID 16 bytes | position xyz | quat xyzw (float32).
+#   python jointcodec.py --frames 1000          (size / speed vs JSON)
+
+VERSION = 1
+JOINT_MAGIC = b"HJ"
+POSE_MAGIC = b"HP"
+FLAG_FLOAT16 = 1
+HEADER_SIZE = 4  # magic, version, flags: enough to pick the record layout
+
+# class order of the gesture models
+GESTURES = label_names
+UNKNOWN_GESTURE = 255
+
+
+def joint_dtype(float16=True):
+  return np.dtype([
+    ("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("gesture", "u1"), ("reserved", "u1"),
+    ("sample_number", "<u4"), ("timestamp_us", "<u8"),
+    ("joints", "<f2" if float16 else "<f4", (len(JOINT_NAMES), 3)),
+  ])
+
+
+JOINT_DTYPES = {True: joint_dtype(True), False: joint_dtype(False)}
+
+POSE_DTYPE = np.dtype([
+  ("magic", "S2"), ("version", "u1"), ("flags", "u1"), ("channel", "S16"),
+  ("position", "<f4", (3,)), ("orientation", "<f4", (4,)),
+])
+
+
+def gesture_id(gesture):
+  if gesture is None:
+    return UNKNOWN_GESTURE
+  if isinstance(gesture, str):
+    return GESTURE_IDS.get(gesture, UNKNOWN_GESTURE)
+  return int(gesture)
+
+
+def gesture_name(gesture_id):
+  return GESTURES[gesture_id] if gesture_id < len(GESTURES) else None
+
+
+def monotonic_us():
+  return time.monotonic_ns() // 1000
+
+
+# joints [N, 26, 3]; gestures, sample_numbers, timestamps_us: length N (or scalars)
+def encode_batch(joints, gestures=UNKNOWN_GESTURE, sample_numbers=0, timestamps_us=None, float16=True):
+  joints = np.asarray(joints, dtype=np.float32).reshape(-1, len(JOINT_NAMES), 3)
+  if not isinstance(gestures, np.ndarray) and isinstance(gestures, (list, tuple)):
+    gestures = [gesture_id(g) for g in gestures]
+  elif isinstance(gestures, str) or gestures is None:
+    gestures = gesture_id(gestures)
+
+  records = np.empty(len(joints), dtype=JOINT_DTYPES[float16])
+  records["magic"] = JOINT_MAGIC
+  records["version"] = VERSION
+  records["flags"] = FLAG_FLOAT16 if float16 else 0
+  records["gesture"] = gestures
+  records["reserved"] = 0
+  records["sample_number"] = sample_numbers
+  records["timestamp_us"] = monotonic_us() if timestamps_us is None else timestamps_us
+  records["joints"] = joints
+  return records.tobytes()
+
+
+def encode(frame, float16=True):
+  return encode_batch(frame.joints, frame.gesture, frame.sample_number or 0,
+                      frame.timestamp if isinstance(frame.timestamp, int) else None, float16)
+
+
+# -> dict of arrays: joints [N, 26, 3] float32, gesture [N], sample_number [N], timestamp_us [N]
+def decode_batch(payload):
+  payload = memoryview(payload).cast("B")
+  if len(payload) < HEADER_SIZE:
+    raise ValueError(f"truncated joint frame: {len(payload)} bytes")
+  if bytes(payload[:2]) != JOINT_MAGIC:
+    raise ValueError("not a binary joint frame")
+  version, flags = payload[2], payload[3]
+  if version != VERSION:
+    raise ValueError(f"unsupported joint frame version {version}")
+  dtype = JOINT_DTYPES[bool(flags & FLAG_FLOAT16)]
+  if len(payload) % dtype.itemsize:
+    raise ValueError(f"payload of {len(payload)} bytes is not a whole number of frames")
+
+  records = np.frombuffer(payload, dtype=dtype)
+  return {
+    "joints": records["joints"].astype(np.float32),
+    "gesture": records["gesture"].copy(),
+    "sample_number": records["sample_number"].copy(),
+    "timestamp_us": records["timestamp_us"].copy(),
+  }
+
+
+def frames_from_batch(batch):
+  return [JointFrame(joints, gesture_name(g), int(n), int(t))
+          for joints, g, n, t in zip(batch["joints"], batch["gesture"], batch["sample_number"], batch["timestamp_us"])]
+
+
+def encode_pose(position, orientation, channel):
+  record = np.zeros(1, dtype=POSE_DTYPE)
+  record["magic"] = POSE_MAGIC
+  record["version"] = VERSION
+  record["channel"] = uuid.UUID(channel).bytes
+  record["position"] = position
+  record["orientation"] = orientation
+  return record.tobytes()
+
+
+def decode_pose(payload):
+  if len(payload) != POSE_DTYPE.itemsize:
+    raise ValueError(f"pose payload of {len(payload)} bytes, expected {POSE_DTYPE.itemsize}")
+  record = np.frombuffer(payload, dtype=POSE_DTYPE)[0]
+  channel = str(uuid.UUID(bytes=bytes(record["channel"]).ljust(16, b"\0"))).upper()
+  return Pose(tuple(record["position"].tolist()), tuple(record["orientation"].tolist()), channel)
+
+
+# Binary or JSON in, records out: a JointFrame (or list of them when batched),
+# a Pose, or whatever decode_payload makes of JSON. Usable as NatsSubscriber(decode=decode).
+def decode(payload):
+  magic = bytes(memoryview(payload)[:2])
+  if magic == JOINT_MAGIC:
+    frames = frames_from_batch(decode_batch(payload))
+    return frames[0] if len(frames) == 1 else frames
+  if magic == POSE_MAGIC:
+    return decode_pose(payload)
+  return decode_payload(payload)
+
+
+# JSON fallback for consumers that only speak the Unity format
+def encode_json(frame, indent=None):
+  obj = {"timestamp": frame.timestamp, "gesture": frame.gesture, "sampleNumber": frame.sample_number}
+  values = np.asarray(frame.joints, dtype=np.float32).reshape(-1)
+  obj.update({key: round(float(v), 4) for key, v in zip(JOINT_KEYS, values) if v == v})
+  return json.dumps(obj, indent=indent)
+
+
+def _per_frame_us(fn, count, runs=3):
+  best = float("inf")
+  for _ in range(runs):
+    start = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - start)
+  return best / count * 1e6
+
+
+def bench(joints, gestures, sample_numbers):
+  n = len(joints)
+  frames = [JointFrame(joints[i], GESTURES[gestures[i]], int(sample_numbers[i]), "2025-01-01 12:00:00")
+            for i in range(n)]
+  # what dddtext.cs sends today: indented, rounded to 2 decimals
+  unity_json = [encode_json(f._replace(joints=np.round(f.joints, 2)), indent=2).encode() for f in frames]
+
+  rows = []
+  json_encode = _per_frame_us(lambda: [encode_json(f, indent=2) for f in frames], n)
+  json_decode = _per_frame_us(lambda: [decode_payload(p) for p in unity_json], n)
+  rows.append(("json (Unity)", sum(map(len, unity_json)) / n, json_encode, json_decode, np.nan))
+
+  timestamps = np.arange(n, dtype=np.uint64) * 33333
+  for float16 in (True, False):
+    single = [encode(f._replace(timestamp=int(t)), float16) for f, t in zip(frames, timestamps)]
+    batch = encode_batch(joints, gestures, sample_numbers, timestamps, float16)
+    error = np.abs(decode_batch(batch)["joints"] - joints).max()
+    name = "float16" if float16 else "float32"
+    rows.append((f"{name} single", len(single[0]),
+                 _per_frame_us(lambda: [encode(f, float16) for f in frames], n),
+                 _per_frame_us(lambda: [decode(p) for p in single], n), error))
+    rows.append((f"{name} batch", len(batch) / n,
+                 _per_frame_us(lambda: encode_batch(joints, gestures, sample_numbers, timestamps, float16), n),
+                 _per_frame_us(lambda: decode_batch(batch), n), error))
+
+  print(f"{'format':>15} {'bytes/frame':>12} {'encode us':>10} {'decode us':>10} {'max |err|':>10}")
+  for name, size, enc, dec, error in rows:
+    print(f"{name:>15} {size:>12.1f} {enc:>10.2f} {dec:>10.2f} {error:>10.2e}")
+
+  pose_json = json.dumps({"position": {"z": 0.1, "y": 0.2, "x": 0.3},
+                          "orientation": {"x": 0.258819, "w": 0.9659258, "y": 0., "z": 0.},
+                          "channel": "B11772DB-2A8B-4647-A9D3-3B6CD439350C"})
+  pose_binary = encode_pose((0.3, 0.2, 0.1), (0.258819, 0., 0., 0.9659258), "B11772DB-2A8B-4647-A9D3-3B6CD439350C")
+  print(f"pose: {len(pose_json)} bytes JSON, {len(pose_binary)} bytes binary")
+  return rows
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="binary joint frame codec, size/speed vs JSON")
+  parser.add_argument("--frames", type=int, default=1000, help="Number of random hand frames")
+  args = parser.parse_args()
+
+  unknown = [g for g in UNITY_GESTURES if gesture_id(g) == UNKNOWN_GESTURE]
+  if unknown:
+    raise SystemExit(f"gesture names sent by dddtext.cs not recognised: {unknown}")
+  rng = np.random.default_rng(0)
+  bench(rng.uniform(-0.5, 0.5, (args.frames, len(JOINT_NAMES), 3)).astype(np.float32),
+        rng.integers(0, len(GESTURES), args.frames), np.arange(args.frames))
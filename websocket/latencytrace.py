@@ -0,0 +1,242 @@
+import csv
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import collections
+import numpy as np
+from natsclient import NatsPublisher, CoalescingPublisher
+from natsstandin import NatsStandIn
+from websock_recv import NatsSubscriber
+
+# End-to-end latency tracing for the hand pipeline.
+# The sender gives every frame a sequence number and monotonic timestamps (us)
+# at the end of each stage; they travel in a "trace" field of the JSON payload:
+#   trace = tracer.begin()            # capture
+#   ... trace.mark("preprocess") ... trace.mark("infer")
+#   payload = trace.serialize(obj)    # times json.dumps, adds the trace
+#   await nc.publish(subject, payload)
+# A LatencyCollector on the receiving side turns the marks into per-stage and
+# end-to-end latency percentiles and counts drops / reordering per source.
+# time.monotonic_ns is only comparable within one machine, so run sender and
+# receiver on the same host (e.g. against natsstandin.py):
+#   python latencytrace.py --count 2000 --rate 200 --stage-ms preprocess=2 --stage-ms infer=8
+#   python latencytrace.py --coalesce-ms 10 --json report.json --csv report.csv
+
+TRACE_KEY = "trace"
+
+
+def now_us():
+  return time.monotonic_ns() // 1000
+
+
+class Trace:
+  def __init__(self, source, seq):
+    self.source = source
+    self.seq = seq
+    self.marks = [("capture", now_us())]
+
+  def mark(self, stage):
+    self.marks.append((stage, now_us()))
+
+  # JSON-encode obj (a dict), then splice the trace in front so the payload keeps
+  # its shape for other readers. Serialization time is its own stage.
+  def serialize(self, obj, indent=None):
+    body = json.dumps(obj, indent=indent)
+    self.mark("serialize")
+    trace = json.dumps({"src": self.source, "seq": self.seq, "marks": self.marks})
+    if body == "{}":
+      return '{"%s":%s}' % (TRACE_KEY, trace)
+    return '{"%s":%s,%s' % (TRACE_KEY, trace, body[1:])
+
+
+class Tracer:
+  def __init__(self, source=None):
+    self.source = source or uuid.uuid4().hex[:8]
+    self.seq = 0
+
+  def begin(self):
+    self.seq += 1
+    return Trace(self.source, self.seq)
+
+
+# Per source sequence tracking: gaps count as drops until the missing frame shows
+# up late, then it counts as reordered instead
+class SequenceTracker:
+  def __init__(self, max_missing=100000):
+    self.highest = 0
+    self.missing = set()
+    self.max_missing = max_missing
+    self.received = 0
+    self.dropped = 0
+    self.reordered = 0
+    self.duplicates = 0
+
+  def observe(self, seq):
+    self.received += 1
+    if seq > self.highest:
+      gap = seq - self.highest - 1
+      if gap and len(self.missing) < self.max_missing:
+        self.missing.update(range(self.highest + 1, min(seq, self.highest + 1 + self.max_missing)))
+      self.dropped += gap
+      self.highest = seq
+    elif seq in self.missing:
+      self.missing.discard(seq)
+      self.dropped -= 1
+      self.reordered += 1
+    else:
+      self.duplicates += 1
+
+
+# Keeps at most max_samples latencies per stage (uniform reservoir sample), so
+# percentiles of long soak runs don't cost unbounded memory
+class LatencyCollector:
+  def __init__(self, max_samples=200000, seed=0):
+    self.samples = {}  # stage -> latencies in us
+    self.seen = collections.Counter()
+    self.max_samples = max_samples
+    self.sequences = collections.defaultdict(SequenceTracker)
+    self.untraced = 0
+    self._random = random.Random(seed)
+
+  def _add(self, stage, value):
+    self.seen[stage] += 1
+    values = self.samples.setdefault(stage, [])
+    if len(values) < self.max_samples:
+      values.append(value)
+    else:
+      slot = self._random.randrange(self.seen[stage])
+      if slot < self.max_samples:
+        values[slot] = value
+
+  # payload: raw bytes / memoryview or an already decoded dict
+  def observe(self, payload, received_us=None):
+    received_us = received_us or now_us()
+    obj = payload if isinstance(payload, dict) else json.loads(bytes(payload))
+    trace = obj.get(TRACE_KEY) if isinstance(obj, dict) else None
+    if trace is None:
+      self.untraced += 1
+      return None
+
+    marks = trace["marks"] + [["deliver", received_us]]
+    for (_, start), (stage, end) in zip(marks, marks[1:]):
+      self._add(stage, end - start)
+    self._add("end_to_end", received_us - marks[0][1])
+    self.sequences[trace["src"]].observe(trace["seq"])
+    return trace
+
+  def report(self):
+    latency = {}
+    for stage in self.samples:  # pipeline order, as first seen
+      values = np.asarray(self.samples[stage], dtype=np.float64) / 1000.
+      p50, p95, p99 = np.percentile(values, [50, 95, 99])
+      latency[stage] = {"count": self.seen[stage], "mean_ms": float(values.mean()), "p50_ms": float(p50),
+                        "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(values.max())}
+    sequences = {src: {"received": t.received, "dropped": t.dropped, "reordered": t.reordered,
+                       "duplicates": t.duplicates, "highest_seq": t.highest}
+                 for src, t in self.sequences.items()}
+    return {"latency": latency, "sequences": sequences, "untraced": self.untraced}
+
+  def to_json(self, path):
+    with open(path, "w") as f:
+      json.dump(self.report(), f, indent=2)
+
+  def to_csv(self, path):
+    latency = self.report()["latency"]
+    with open(path, "w", newline="") as f:
+      writer = csv.writer(f)
+      writer.writerow(["stage", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+      for stage, row in latency.items():
+        writer.writerow([stage] + [round(v, 4) if isinstance(v, float) else v for v in row.values()])
+
+  def print_report(self):
+    report = self.report()
+    print(f"{'stage':>12} {'count':>7} {'mean ms':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for stage, row in report["latency"].items():
+      print(f"{stage:>12} {row['count']:>7} {row['mean_ms']:>8.2f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+    for src, row in report["sequences"].items():
+      print(f"source {src}: received {row['received']}, dropped {row['dropped']}, "
+            f"reordered {row['reordered']}, duplicates {row['duplicates']}")
+
+
+# Simulated sender: each frame goes through the stages with the given costs (ms),
+# then gets published at `rate` frames per second
+async def traced_sender(publish, count, rate, stage_ms, tracer=None):
+  tracer = tracer or Tracer()
+  interval = 1. / rate
+  next_time = time.perf_counter()
+  for i in range(count):
+    trace = tracer.begin()
+    for stage, ms in stage_ms.items():
+      await asyncio.sleep(ms / 1000.)
+      trace.mark(stage)
+    payload = trace.serialize({"gesture": "left", "sampleNumber": trace.seq})
+    await publish(payload)
+
+    next_time += interval
+    delay = next_time - time.perf_counter()
+    if delay > 0:
+      await asyncio.sleep(delay)
+  return tracer
+
+
+async def run(uri=None, subject="hand.trace", count=1000, rate=100., stage_ms=None, coalesce_ms=0.):
+  collector = LatencyCollector()
+  standin = None
+  if uri is None:
+    standin = await NatsStandIn(record=False).start()
+    uri = standin.uri
+
+  def on_message(message):
+    collector.observe(message.payload)
+
+  try:
+    async with NatsSubscriber(uri, [subject], callback=on_message, decode=False) as sub:
+      await sub.flush()  # SUB is active before the first frame goes out
+      nc = NatsPublisher(uri)
+      if coalesce_ms > 0:
+        async with CoalescingPublisher(nc, flush_interval=coalesce_ms / 1000.) as cp:
+          await traced_sender(lambda p: cp.publish(subject, p), count, rate, stage_ms or {})
+          await cp.flush()
+          await nc.flush()
+      else:
+        async with nc:
+          await traced_sender(lambda p: nc.publish(subject, p), count, rate, stage_ms or {})
+          await nc.flush()
+      await sub.flush()
+  finally:
+    if standin is not None:
+      await standin.stop()
+  return collector
+
+
+def parse_stages(items):
+  stages = {}
+  for item in items or []:
+    name, _, ms = item.partition("=")
+    stages[name] = float(ms)
+  return stages
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="trace capture-to-delivery latency over NATS")
+  parser.add_argument("--uri", help="NATS WebSocket endpoint (default: start a local natsstandin)")
+  parser.add_argument("--subject", default="hand.trace")
+  parser.add_argument("--count", type=int, default=1000)
+  parser.add_argument("--rate", type=float, default=100., help="Frames per second")
+  parser.add_argument("--stage-ms", action="append", help="Simulated stage cost, e.g. infer=8 (repeatable, in order)")
+  parser.add_argument("--coalesce-ms", type=float, default=0., help="Publish through CoalescingPublisher")
+  parser.add_argument("--json", help="Write the report as JSON")
+  parser.add_argument("--csv", help="Write the per-stage table as CSV")
+  args = parser.parse_args()
+
+  collector = asyncio.run(run(args.uri, args.subject, args.count, args.rate, parse_stages(args.stage_ms),
+                              args.coalesce_ms))
+  collector.print_report()
+  if args.json:
+    collector.to_json(args.json)
+  if args.csv:
+    collector.to_csv(args.csv)
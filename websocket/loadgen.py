@@ -0,0 +1,218 @@
+import io
+import csv
+import json
+import time
+import random
+import asyncio
+import zipfile
+import argparse
+import numpy as np
+from natsclient import NatsPublisher
+from natsstandin import NatsStandIn
+from websock_recv import NatsSubscriber, JOINT_NAMES, JOINT_KEYS
+from latencytrace import Tracer, LatencyCollector
+from jointcodec import JOINT_MAGIC, encode_batch, decode_batch
+
+# Load generator / soak test for the NATS hand pipeline.
+# N simulated headsets, each on its own connection, publish joint frames and
+# predictions at --rate Hz, replayed from hand_tracking_data.csv. One subscriber
+# receives hand.> and measures throughput, latency percentiles (latencytrace.py),
+# drops and reconnects; memory and rates are printed every --report-every seconds.
+#   python loadgen.py --headsets 50 --rate 5 --duration 60
+#   python loadgen.py --headsets 200 --rate 30 --duration 3600 --uri ws://127.0.0.1:8081 --json soak.json
+#   python loadgen.py --headsets 20 --chaos-every 10       (drop all connections every 10 s)
+# Without --uri a NatsStandIn runs in this process and shares the event loop with
+# the headsets; run natsstandin.py separately to load only the broker.
+
+CSV_NAME = "hand_tracking_data.csv"
+
+
+# Rows of the CSV as the joint frame dicts dddtext.cs publishes
+def load_frames(path):
+  if path.lower().endswith(".zip"):
+    with zipfile.ZipFile(path) as archive:
+      member = next(n for n in archive.namelist() if n.endswith(CSV_NAME))
+      text = archive.read(member).decode("utf-8")
+  else:
+    with open(path, newline="") as f:
+      text = f.read()
+
+  frames = []
+  for row in csv.DictReader(io.StringIO(text)):
+    frame = {"timestamp": row["TimeStamp"], "gesture": row["Gesture"], "sampleNumber": int(row["SampleNumber"])}
+    frame.update({key: float(row[key]) for key in JOINT_KEYS})
+    frames.append(frame)
+  return frames
+
+
+def rss_mb():
+  try:
+    with open("/proc/self/statm") as f:
+      import resource
+      return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+  except (OSError, ImportError):
+    return float("nan")
+
+
+class LoadGenerator:
+  def __init__(self, uri, frames, headsets=10, rate=30., payload_format="json", indent=None):
+    self.uri = uri
+    self.frames = frames
+    self.headsets = headsets
+    self.rate = rate
+    self.payload_format = payload_format
+    self.indent = indent
+    self.joints = np.array([[f[k] for k in JOINT_KEYS] for f in frames], dtype=np.float32).reshape(-1, len(JOINT_NAMES), 3)
+
+    self.collector = LatencyCollector()
+    self.publishers = []
+    self.sent = 0
+    self.sent_bytes = 0
+    self.received = 0
+    self.received_bytes = 0
+    self.late = 0  # frames that went out behind schedule
+    self.stop = asyncio.Event()
+
+  def on_message(self, message):
+    self.received += 1
+    self.received_bytes += len(message.payload)
+    if bytes(message.payload[:2]) == JOINT_MAGIC:
+      # binary frames carry sample number + capture time instead of a JSON trace
+      batch = decode_batch(message.payload)
+      for seq, timestamp in zip(batch["sample_number"], batch["timestamp_us"]):
+        self.collector.observe({"trace": {"src": message.subject, "seq": int(seq),
+                                          "marks": [["capture", int(timestamp)]]}})
+    else:
+      self.collector.observe(message.payload)
+
+  async def headset(self, index):
+    name = f"headset{index:04d}"
+    joints_tracer = Tracer(f"{name}.jointData")
+    prediction_tracer = Tracer(f"{name}.prediction")
+    interval = 1. / self.rate
+    position = random.Random(index).randrange(len(self.frames))
+
+    nc = NatsPublisher(self.uri, name=name)
+    self.publishers.append(nc)
+    async with nc:
+      await asyncio.sleep(random.Random(-index).uniform(0, interval))  # spread the headsets out
+      next_time = time.perf_counter()
+      while not self.stop.is_set():
+        frame = self.frames[position]
+        trace = joints_tracer.begin()
+        if self.payload_format == "binary":
+          payload = encode_batch(self.joints[position], frame["gesture"], trace.seq, trace.marks[0][1])
+        else:
+          payload = trace.serialize(frame, self.indent)
+        prediction = prediction_tracer.begin().serialize({"gesture": frame["gesture"]})
+
+        await nc.publish(f"hand.{name}.jointData", payload)
+        await nc.publish(f"hand.{name}.prediction", prediction)
+        self.sent += 2
+        self.sent_bytes += len(payload) + len(prediction)
+        position = (position + 1) % len(self.frames)
+
+        next_time += interval
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+          await asyncio.sleep(delay)
+        else:
+          self.late += 1
+          if -delay > interval:
+            next_time = time.perf_counter()  # give up on catching up, keep the rate from here
+          await asyncio.sleep(0)
+
+  def reconnects(self):
+    return sum(nc.stats["reconnects"] for nc in self.publishers)
+
+  async def run(self, duration, report_every=5., chaos_every=0., standin=None):
+    subscriber = NatsSubscriber(self.uri, ["hand.>"], callback=self.on_message, decode=False,
+                                name="loadgen-subscriber")
+    async with subscriber:
+      await subscriber.flush()
+      tasks = [asyncio.create_task(self.headset(i)) for i in range(self.headsets)]
+
+      start = time.perf_counter()
+      last_time, last_sent, last_received = start, 0, 0
+      next_chaos = start + chaos_every if chaos_every else None
+      peak_rss = rss_mb()
+      while time.perf_counter() - start < duration:
+        await asyncio.sleep(min(report_every, max(0., duration - (time.perf_counter() - start))))
+        now = time.perf_counter()
+        peak_rss = max(peak_rss, rss_mb())
+        print(f"{now - start:7.1f}s sent {(self.sent - last_sent) / (now - last_time):9.0f} msg/s "
+              f"received {(self.received - last_received) / (now - last_time):9.0f} msg/s "
+              f"rss {rss_mb():7.1f} MB reconnects {self.reconnects()} late {self.late}", flush=True)
+        last_time, last_sent, last_received = now, self.sent, self.received
+        if next_chaos is not None and now >= next_chaos and standin is not None:
+          await standin.drop_clients()
+          next_chaos = now + chaos_every
+
+      elapsed = time.perf_counter() - start
+      self.stop.set()
+      await asyncio.gather(*tasks, return_exceptions=True)
+      await asyncio.sleep(0.5)  # let in-flight messages arrive
+      subscriber_reconnects = subscriber.stats["reconnects"]
+
+    report = self.collector.report()
+    drops = sum(s["dropped"] for s in report["sequences"].values())
+    report["summary"] = {
+      "headsets": self.headsets,
+      "rate_hz": self.rate,
+      "format": self.payload_format,
+      "duration_s": elapsed,
+      "sent": self.sent,
+      "received": self.received,
+      "sent_msgs_per_s": self.sent / elapsed,
+      "received_msgs_per_s": self.received / elapsed,
+      "received_mb_per_s": self.received_bytes / elapsed / 1e6,
+      "dropped": drops,
+      "late_frames": self.late,
+      "publisher_reconnects": self.reconnects(),
+      "subscriber_reconnects": subscriber_reconnects,
+      "peak_rss_mb": peak_rss,
+    }
+    return report
+
+
+async def main(args):
+  frames = load_frames(args.csv)
+  standin = None
+  uri = args.uri
+  if uri is None:
+    standin = await NatsStandIn(record=False).start()
+    uri = standin.uri
+  try:
+    generator = LoadGenerator(uri, frames, args.headsets, args.rate, args.format, args.indent)
+    report = await generator.run(args.duration, args.report_every, args.chaos_every, standin)
+  finally:
+    if standin is not None:
+      await standin.stop()
+
+  summary = report["summary"]
+  print(f"{summary['headsets']} headsets x {summary['rate_hz']} Hz ({summary['format']}) for {summary['duration_s']:.0f}s: "
+        f"sent {summary['sent_msgs_per_s']:.0f} msg/s, received {summary['received_msgs_per_s']:.0f} msg/s "
+        f"({summary['received_mb_per_s']:.2f} MB/s), dropped {summary['dropped']}, late {summary['late_frames']}, "
+        f"reconnects {summary['publisher_reconnects']}+{summary['subscriber_reconnects']}, peak rss {summary['peak_rss_mb']:.1f} MB")
+  for stage in ("deliver", "end_to_end"):
+    row = report["latency"].get(stage)
+    if row:
+      print(f"{stage:>10}: p50 {row['p50_ms']:.2f} ms, p95 {row['p95_ms']:.2f} ms, p99 {row['p99_ms']:.2f} ms, max {row['max_ms']:.2f} ms")
+  if args.json:
+    with open(args.json, "w") as f:
+      json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="simulate many headsets publishing hand data over NATS")
+  parser.add_argument("--uri", help="NATS WebSocket endpoint (default: start a local natsstandin)")
+  parser.add_argument("--csv", default="../data.zip", help="hand_tracking_data.csv or data.zip to replay")
+  parser.add_argument("--headsets", type=int, default=10)
+  parser.add_argument("--rate", type=float, default=30., help="Frames per second per headset")
+  parser.add_argument("--duration", type=float, default=30., help="Seconds")
+  parser.add_argument("--format", default="json", choices=["json", "binary"], help="Joint frame payload (jointcodec.py)")
+  parser.add_argument("--indent", type=int, default=None, help="Indent JSON like Formatting.Indented (e.g. 2)")
+  parser.add_argument("--report-every", type=float, default=5.)
+  parser.add_argument("--chaos-every", type=float, default=0., help="Drop all connections every N s (local stand-in only)")
+  parser.add_argument("--json", help="Write the full report as JSON")
+  asyncio.run(main(parser.parse_args()))
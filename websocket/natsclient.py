@@ -0,0 +1,390 @@
+import json
+import random
+import asyncio
+import collections
+import websockets
+
+# Long-lived NATS-over-WebSocket publisher.
+# One connection for the whole session instead of one TLS handshake per message:
+#   async with NatsPublisher(uri) as nc:
+#     await nc.publish("subject.pose", payload)
+# Handles the INFO/CONNECT handshake, answers server PINGs, sends its own PINGs
+# to detect dead links and reconnects with exponential backoff. publish() waits
+# while the link is down, so nothing has to be re-queued by the caller.
+
+DEFAULT_URI = "wss://service.zenimotion.com/nats"
+CRLF = b"\r\n"
+
+
+class NatsError(Exception):
+  pass
+
+
+def pub_command(subject, payload):
+  if isinstance(payload, str):
+    payload = payload.encode()
+  return b"PUB %s %d\r\n%s\r\n" % (subject.encode(), len(payload), payload)
+
+
+# Incremental parser for what the server sends. feed() takes one WebSocket frame
+# (any number of commands, possibly split across frames) and returns
+# (op, subject, sid, reply, payload) tuples; for MSG/HMSG payload is a memoryview
+# into the frame, for control lines (PING, PONG, INFO, +OK, -ERR) it is the rest
+# of the line. Only a trailing partial command is copied, into self.pending.
+class MsgParser:
+  def __init__(self):
+    self.pending = b""
+    self._subjects = {}
+
+  def _subject(self, raw):
+    subject = self._subjects.get(raw)
+    if subject is None:
+      if len(self._subjects) > 4096:
+        self._subjects.clear()
+      subject = self._subjects[raw] = raw.decode()
+    return subject
+
+  def feed(self, data):
+    if isinstance(data, str):
+      data = data.encode()
+    if self.pending:
+      data = self.pending + data
+      self.pending = b""
+
+    view = memoryview(data)
+    size = len(data)
+    parsed = []
+    pos = 0
+    while pos < size:
+      end = data.find(CRLF, pos)
+      if end < 0:
+        break
+
+      if data.startswith(b"MSG ", pos) or data.startswith(b"HMSG ", pos):
+        headers = data[pos] == 0x48  # 'H'
+        args = data[pos + (5 if headers else 4):end].split()
+        total = int(args[-1])
+        start = end + 2
+        stop = start + total
+        if stop + 2 > size:
+          break  # payload not complete yet
+        if headers:
+          # HMSG <subject> <sid> [reply] <header len> <total len>, skip the headers
+          start += int(args[-2])
+          reply = args[2].decode() if len(args) == 5 else None
+        else:
+          reply = args[2].decode() if len(args) == 4 else None
+        parsed.append(("MSG", self._subject(args[0]), args[1].decode(), reply, view[start:stop]))
+        pos = stop + 2
+        continue
+
+      op, _, rest = data[pos:end].partition(b" ")
+      op = op.upper()
+      if op in (b"PING", b"PONG", b"INFO", b"+OK", b"-ERR"):
+        parsed.append((op.decode().strip("+-"), None, None, None, rest))
+      pos = end + 2
+
+    if pos < size:
+      self.pending = data[pos:]
+    return parsed
+
+
+class NatsPublisher:
+  def __init__(self, uri=DEFAULT_URI, name="handtracker", ping_interval=20., max_outstanding_pings=2,
+               connect_timeout=5., min_backoff=0.1, max_backoff=10., verbose=False):
+    self.uri = uri
+    self.name = name
+    self.ping_interval = ping_interval
+    self.max_outstanding_pings = max_outstanding_pings
+    self.connect_timeout = connect_timeout
+    self.min_backoff = min_backoff
+    self.max_backoff = max_backoff
+    self.verbose = verbose
+
+    self.ws = None
+    self.server_info = {}
+    self.connected = asyncio.Event()
+    self.stats = {"published": 0, "bytes": 0, "reconnects": 0, "errors": 0, "handler_errors": 0}
+    self._pongs = collections.deque()
+    self._runner = None
+    self._closing = False
+
+  async def __aenter__(self):
+    await self.start()
+    return self
+
+  async def __aexit__(self, *exc):
+    await self.close()
+
+  async def start(self, timeout=None):
+    if self._runner is None:
+      self._runner = asyncio.create_task(self._run())
+    await asyncio.wait_for(self.connected.wait(), timeout or self.connect_timeout * 2)
+
+  async def close(self):
+    self._closing = True
+    if self.ws is not None:
+      await self.ws.close()
+    if self._runner is not None:
+      self._runner.cancel()
+      try:
+        await self._runner
+      except asyncio.CancelledError:
+        pass
+    self._fail_pongs(NatsError("connection closed"))
+
+  # --- connection handling
+
+  async def _handshake(self):
+    ws = await websockets.connect(self.uri, open_timeout=self.connect_timeout, ping_interval=None,
+                                  max_size=None)
+    try:
+      frame = await asyncio.wait_for(ws.recv(), self.connect_timeout)
+      line = frame.encode() if isinstance(frame, str) else frame
+      if not line.startswith(b"INFO"):
+        raise NatsError(f"expected INFO, got {line[:40]!r}")
+      self.server_info = json.loads(line[4:line.index(CRLF)].strip() or b"{}")
+
+      options = {"verbose": self.verbose, "pedantic": False, "name": self.name, "lang": "python",
+                 "version": "1.0", "protocol": 1}
+      await ws.send(b"CONNECT " + json.dumps(options).encode() + CRLF + b"PING" + CRLF)
+
+      # the server answers the first PING only once CONNECT was accepted
+      while True:
+        frame = await asyncio.wait_for(ws.recv(), self.connect_timeout)
+        data = frame.encode() if isinstance(frame, str) else frame
+        if data.startswith(b"-ERR"):
+          raise NatsError(data.decode(errors="replace").strip())
+        if b"PONG" in data:
+          return ws
+    except BaseException:
+      await ws.close()
+      raise
+
+  async def _run(self):
+    backoff = self.min_backoff
+    first = True
+    while not self._closing:
+      if not first:
+        self.stats["reconnects"] += 1
+      first = False
+      try:
+        self.ws = await self._handshake()
+        backoff = self.min_backoff
+        self.connected.set()
+        await self._serve(self.ws)
+      except (OSError, asyncio.TimeoutError, NatsError, websockets.exceptions.WebSocketException) as e:
+        self.stats["errors"] += 1
+        if not self._closing:
+          print(f"NATS connection lost ({e!r}), reconnecting in {backoff:.1f}s")
+      finally:
+        self.connected.clear()
+        self.ws = None
+        self._fail_pongs(NatsError("connection lost"))
+
+      if self._closing:
+        break
+      await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+      backoff = min(backoff * 2, self.max_backoff)
+
+  # Read from the server until the socket closes, PING the server periodically
+  async def _serve(self, ws):
+    parser = MsgParser()
+    pinger = asyncio.create_task(self._ping_loop(ws))
+    try:
+      async for frame in ws:
+        self._on_frame(frame)
+        for op, subject, sid, reply, payload in parser.feed(frame):
+          if op == "MSG":
+            try:
+              await self._on_message(subject, sid, reply, payload)
+            except Exception as e:
+              # a failing handler loses this message, not the connection
+              self.stats["handler_errors"] += 1
+              print(f"NATS message handler failed on {subject} ({e!r})")
+          elif op == "PING":
+            await ws.send(b"PONG" + CRLF)
+          elif op == "PONG":
+            if self._pongs:
+              future = self._pongs.popleft()
+              if future is not None and not future.done():
+                future.set_result(True)
+          elif op == "ERR":
+            print(f"NATS server error: {payload.decode(errors='replace')}")
+          elif op == "INFO":
+            self.server_info.update(json.loads(payload.strip() or b"{}"))
+    finally:
+      pinger.cancel()
+
+  # hooks for subscribers (websock_recv.py), a publisher ignores incoming messages
+  def _on_frame(self, frame):
+    pass
+
+  async def _on_message(self, subject, sid, reply, payload):
+    pass
+
+  async def _ping_loop(self, ws):
+    while True:
+      await asyncio.sleep(self.ping_interval)
+      if len(self._pongs) >= self.max_outstanding_pings:
+        # server stopped answering, drop the link and let _run reconnect
+        await ws.close()
+        return
+      self._pongs.append(None)  # keep-alive ping, nobody waits for it
+      await ws.send(b"PING" + CRLF)
+
+  def _fail_pongs(self, error):
+    while self._pongs:
+      future = self._pongs.popleft()
+      if future is not None and not future.done():
+        future.set_exception(error)
+
+  # --- publishing
+
+  async def send_raw(self, data):
+    while True:
+      await self.connected.wait()
+      ws = self.ws
+      if ws is None:
+        await asyncio.sleep(0)
+        continue
+      try:
+        await ws.send(data)
+        self.stats["bytes"] += len(data)
+        return
+      except websockets.exceptions.ConnectionClosed:
+        # _run notices the closed socket and reconnects, retry on the new one
+        if self.ws is ws:
+          self.connected.clear()
+
+  async def publish(self, subject, payload):
+    await self.send_raw(pub_command(subject, payload))
+    self.stats["published"] += 1
+
+  # Round trip to the server: everything published before has been processed
+  async def flush(self, timeout=5.):
+    future = asyncio.get_running_loop().create_future()
+    self._pongs.append(future)
+    await self.send_raw(b"PING" + CRLF)
+    await asyncio.wait_for(future, timeout)
+
+  async def publish_from(self, subject, messages):
+    # messages: async iterator of payloads (str/bytes)
+    async for payload in messages:
+      await self.publish(subject, payload)
+
+  async def publish_queue(self, subject, queue):
+    # runs until a None is put on the queue
+    while True:
+      payload = await queue.get()
+      if payload is None:
+        return
+      await self.publish(subject, payload)
+
+
+# Write coalescing on top of NatsPublisher.
+# submit() only queues: every flush_interval all pending PUB commands are packed
+# into as few WebSocket frames as possible (max_frame_bytes each). The queue is
+# bounded and keyed - a new message with the same (subject, key), e.g. the pose of
+# one channel, replaces the one still waiting (latest wins). When it is full the
+# oldest message is dropped, so a slow link costs freshness, never a growing backlog.
+class CoalescingPublisher:
+  def __init__(self, publisher, flush_interval=0.01, max_pending=1000, max_frame_bytes=64 * 1024):
+    self.publisher = publisher
+    self.flush_interval = flush_interval
+    self.max_pending = max_pending
+    self.max_frame_bytes = max_frame_bytes
+
+    self.pending = collections.OrderedDict()
+    self.pending_bytes = 0
+    self.stats = {"submitted": 0, "merged": 0, "dropped": 0, "frames": 0, "sent": 0}
+    self._unkeyed = 0
+    self._wake = asyncio.Event()
+    self._flusher = None
+
+  async def __aenter__(self):
+    await self.start()
+    return self
+
+  async def __aexit__(self, *exc):
+    await self.close()
+
+  async def start(self):
+    await self.publisher.start()
+    if self._flusher is None:
+      self._flusher = asyncio.create_task(self._flush_loop())
+
+  async def close(self, flush=True):
+    if self._flusher is not None:
+      self._flusher.cancel()
+      try:
+        await self._flusher
+      except asyncio.CancelledError:
+        pass
+      self._flusher = None
+    if flush:
+      await self.flush()
+    await self.publisher.close()
+
+  def submit(self, subject, payload, key=None):
+    command = pub_command(subject, payload)
+    self.stats["submitted"] += 1
+
+    if key is None:
+      self._unkeyed += 1
+      key = self._unkeyed
+    else:
+      key = (subject, key)
+
+    if key in self.pending:
+      # latest wins, the message keeps its place in the queue
+      self.pending_bytes += len(command) - len(self.pending[key])
+      self.pending[key] = command
+      self.stats["merged"] += 1
+    else:
+      if len(self.pending) >= self.max_pending:
+        _, oldest = self.pending.popitem(last=False)
+        self.pending_bytes -= len(oldest)
+        self.stats["dropped"] += 1
+      self.pending[key] = command
+      self.pending_bytes += len(command)
+
+    if self.pending_bytes >= self.max_frame_bytes:
+      self._wake.set()
+
+  async def publish(self, subject, payload, key=None):
+    self.submit(subject, payload, key)
+
+  # Send everything pending now, packed into frames of up to max_frame_bytes
+  async def flush(self):
+    while self.pending:
+      commands = list(self.pending.values())
+      self.pending.clear()
+      self.pending_bytes = 0
+
+      frame = []
+      size = 0
+      for command in commands:
+        if frame and size + len(command) > self.max_frame_bytes:
+          await self._send(frame)
+          frame, size = [], 0
+        frame.append(command)
+        size += len(command)
+      if frame:
+        await self._send(frame)
+
+  async def _send(self, commands):
+    # while this awaits a slow link, new submits merge/drop in self.pending
+    await self.publisher.send_raw(b"".join(commands))
+    self.stats["frames"] += 1
+    self.stats["sent"] += len(commands)
+    self.publisher.stats["published"] += len(commands)
+
+  async def _flush_loop(self):
+    while True:
+      try:
+        await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+      except asyncio.TimeoutError:
+        pass
+      self._wake.clear()
+      await self.flush()
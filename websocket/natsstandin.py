@@ -0,0 +1,160 @@
+import json
+import asyncio
+import argparse
+import websockets
+
+# Minimal local NATS WebSocket server for tests and benchmarks.
+# Speaks enough of the protocol for our clients: INFO on connect, CONNECT,
+# PING/PONG, PUB, SUB/UNSUB with * and > wildcards, MSG delivery.
+#   python natsstandin.py --port 8081      (then use ws://127.0.0.1:8081)
+# or from asyncio code:
+#   server = NatsStandIn(); await server.start(); ... server.uri ...
+
+CRLF = b"\r\n"
+
+
+def subject_matches(pattern, subject):
+  pattern_tokens = pattern.split(".")
+  subject_tokens = subject.split(".")
+  for i, token in enumerate(pattern_tokens):
+    if token == ">":
+      return len(subject_tokens) > i
+    if i >= len(subject_tokens) or (token != "*" and token != subject_tokens[i]):
+      return False
+  return len(pattern_tokens) == len(subject_tokens)
+
+
+class Client:
+  def __init__(self, ws):
+    self.ws = ws
+    self.subs = {}  # sid -> subject pattern
+    self.connect_options = None
+
+
+class NatsStandIn:
+  def __init__(self, host="127.0.0.1", port=0, record=True, max_recorded=100000):
+    self.host = host
+    self.port = port
+    self.record = record
+    self.max_recorded = max_recorded
+    self.clients = set()
+    self.messages = []  # (subject, payload bytes) of every PUB, for assertions
+    self.stats = {"connections": 0, "pub": 0, "msg_out": 0, "pings": 0}
+    self.server = None
+    self._published = asyncio.Condition()
+
+  @property
+  def uri(self):
+    return f"ws://{self.host}:{self.port}"
+
+  async def start(self):
+    self.server = await websockets.serve(self._handle, self.host, self.port, max_size=None)
+    self.port = self.server.sockets[0].getsockname()[1]
+    return self
+
+  async def stop(self):
+    self.server.close()
+    await self.server.wait_closed()
+
+  async def __aenter__(self):
+    return await self.start()
+
+  async def __aexit__(self, *exc):
+    await self.stop()
+
+  # Close every client connection (simulates a broker restart / network drop)
+  async def drop_clients(self):
+    for client in list(self.clients):
+      await client.ws.close()
+
+  async def wait_for_messages(self, count, timeout=5.):
+    async with self._published:
+      await asyncio.wait_for(self._published.wait_for(lambda: self.stats["pub"] >= count), timeout)
+
+  async def _handle(self, ws):
+    client = Client(ws)
+    self.clients.add(client)
+    self.stats["connections"] += 1
+    info = {"server_id": "standin", "version": "2.10.0", "proto": 1, "headers": False, "max_payload": 1048576}
+    await ws.send(b"INFO " + json.dumps(info).encode() + CRLF)
+
+    buffer = bytearray()
+    try:
+      async for frame in ws:
+        buffer += frame.encode() if isinstance(frame, str) else frame
+        await self._process(client, buffer)
+    except websockets.exceptions.ConnectionClosed:
+      pass
+    finally:
+      self.clients.discard(client)
+
+  # Consume every complete command in buffer, leave partial ones for the next frame
+  async def _process(self, client, buffer):
+    published = False
+    while True:
+      end = buffer.find(CRLF)
+      if end < 0:
+        break
+      line = bytes(buffer[:end])
+      op, _, args = line.partition(b" ")
+      op = op.upper()
+
+      if op == b"PUB":
+        parts = args.split()
+        size = int(parts[-1])
+        if len(buffer) < end + 2 + size + 2:
+          break  # payload not complete yet
+        payload = bytes(buffer[end + 2:end + 2 + size])
+        del buffer[:end + 2 + size + 2]
+        await self._route(parts[0].decode(), payload)
+        published = True
+        continue
+
+      del buffer[:end + 2]
+      if op == b"PING":
+        self.stats["pings"] += 1
+        await client.ws.send(b"PONG" + CRLF)
+      elif op == b"CONNECT":
+        client.connect_options = json.loads(args or b"{}")
+      elif op == b"SUB":
+        parts = args.split()
+        client.subs[parts[-1].decode()] = parts[0].decode()
+      elif op == b"UNSUB":
+        client.subs.pop(args.split()[0].decode(), None)
+      elif op in (b"PONG", b""):
+        pass
+      else:
+        await client.ws.send(b"-ERR 'Unknown Protocol Operation'" + CRLF)
+
+    if published:
+      async with self._published:
+        self._published.notify_all()
+
+  async def _route(self, subject, payload):
+    self.stats["pub"] += 1
+    if self.record and len(self.messages) < self.max_recorded:
+      self.messages.append((subject, payload))
+
+    for client in list(self.clients):
+      for sid, pattern in list(client.subs.items()):
+        if subject_matches(pattern, subject):
+          message = b"MSG %s %s %d\r\n%s\r\n" % (subject.encode(), sid.encode(), len(payload), payload)
+          try:
+            await client.ws.send(message)
+            self.stats["msg_out"] += 1
+          except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+async def serve_forever(host, port):
+  async with NatsStandIn(host, port, record=False) as server:
+    print(f"NATS stand-in listening on {server.uri}")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="local NATS WebSocket stand-in")
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=8081)
+  args = parser.parse_args()
+  asyncio.run(serve_forever(args.host, args.port))
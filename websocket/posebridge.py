@@ -0,0 +1,340 @@
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import collections
+import numpy as np
+from natsclient import NatsPublisher, CoalescingPublisher, pub_command, DEFAULT_URI
+from natsstandin import NatsStandIn
+from websock_recv import NatsSubscriber
+from jointcodec import GESTURES, GESTURE_IDS, UNITY_GESTURES, POSE_DTYPE, POSE_MAGIC, VERSION
+from webs_to_ext import CHANNEL, q0, pose_message, load_map_config
+
+# Gesture -> target pose bridge for many headsets at once.
+# Subscribes to hand.prediction (dddtext.cs, one default channel) and
+# hand.<channel>.prediction, keeps a pose per channel and, at a fixed control
+# rate, moves every channel that got a new prediction one step:
+#   left/right/up/down/forward/backwards  translate by --step m in the pose's own frame
+#   turn left/turn right                   rotate by +-turn-deg about --turn-axis
+#                                          (30 deg about x is q30 / q30inv in webs_to_ext.py)
+# Updates for all channels are one vectorized numpy pass (quaternion products +
+# rotated steps), then every pose goes out on subject.pose over the same
+# connection the predictions come in on, latest pose per channel (CoalescingPublisher).
+#   python posebridge.py --uri ws://127.0.0.1:8081 --rate 10
+#   python posebridge.py --bench --channels 500 --prediction-rate 5 --duration 20   (local natsstandin)
+
+PREDICTION_SUBJECTS = ["hand.prediction", "hand.*.prediction"]
+POSE_SUBJECT = "subject.pose"
+AXES = {"x": (1., 0., 0.), "y": (0., 1., 0.), "z": (0., 0., 1.)}
+
+# Unity axes: +x right, +y up, +z forward
+TRANSLATIONS = {
+  "left": (-1., 0., 0.), "right": (1., 0., 0.),
+  "up": (0., 1., 0.), "down": (0., -1., 0.),
+  "forward": (0., 0., 1.), "backwards": (0., 0., -1.),
+}
+TURNS = {"turn left": 1., "turn right": -1.}
+
+
+# quaternions are xyzw like the pose messages, arrays of shape [..., 4]
+def quat_multiply(a, b):
+  ax, ay, az, aw = np.moveaxis(a, -1, 0)
+  bx, by, bz, bw = np.moveaxis(b, -1, 0)
+  return np.stack([aw * bx + ax * bw + ay * bz - az * by,
+                   aw * by - ax * bz + ay * bw + az * bx,
+                   aw * bz + ax * by - ay * bx + az * bw,
+                   aw * bw - ax * bx - ay * by - az * bz], -1)
+
+
+def quat_rotate(q, v):
+  u, w = q[..., :3], q[..., 3:]
+  t = 2. * np.cross(u, v)
+  return v + w * t + np.cross(u, t)
+
+
+def axis_angle(axis, degrees):
+  half = np.radians(degrees) / 2.
+  return np.array(list(np.asarray(axis, dtype=np.float64) * np.sin(half)) + [np.cos(half)])
+
+
+# per gesture index: translation step [G, 3] and rotation [G, 4]
+def gesture_tables(step=0.01, turn_deg=30., turn_axis="x"):
+  translations = np.zeros((len(GESTURES), 3))
+  rotations = np.tile(np.array(q0), (len(GESTURES), 1))
+  for i, gesture in enumerate(GESTURES):
+    if gesture in TRANSLATIONS:
+      translations[i] = np.array(TRANSLATIONS[gesture]) * step
+    if gesture in TURNS:
+      rotations[i] = axis_angle(AXES[turn_axis], TURNS[gesture] * turn_deg)
+  return translations, rotations
+
+
+def channel_uuid(channel):
+  try:
+    return uuid.UUID(channel).bytes
+  except ValueError:
+    return uuid.uuid5(uuid.NAMESPACE_URL, channel).bytes
+
+
+class PoseState:
+  def __init__(self, initial_position=(0., 0., 0.), initial_orientation=q0, capacity=64):
+    self.initial_position = np.asarray(initial_position, dtype=np.float64)
+    self.initial_orientation = np.asarray(initial_orientation, dtype=np.float64)
+    self.channels = []
+    self.rows = {}
+    self._allocate(capacity)
+
+  def _allocate(self, capacity):
+    position = np.tile(self.initial_position, (capacity, 1))
+    orientation = np.tile(self.initial_orientation, (capacity, 1))
+    pending = np.full(capacity, -1, dtype=np.int16)
+    if hasattr(self, "pending"):
+      n = len(self.pending)
+      position[:n], orientation[:n], pending[:n] = self.position, self.orientation, self.pending
+    self.position, self.orientation, self.pending = position, orientation, pending
+
+  def __len__(self):
+    return len(self.channels)
+
+  def row(self, channel):
+    row = self.rows.get(channel)
+    if row is None:
+      row = self.rows[channel] = len(self.channels)
+      self.channels.append(channel)
+      if row >= len(self.pending):
+        self._allocate(2 * len(self.pending))
+    return row
+
+  # one step for every channel with a pending gesture; returns the updated rows
+  def apply(self, translations, rotations):
+    rows = np.flatnonzero(self.pending[:len(self.channels)] >= 0)
+    if len(rows):
+      gestures = self.pending[rows]
+      orientation = self.orientation[rows]
+      self.position[rows] += quat_rotate(orientation, translations[gestures])
+      orientation = quat_multiply(orientation, rotations[gestures])
+      self.orientation[rows] = orientation / np.linalg.norm(orientation, axis=1, keepdims=True)
+      self.pending[rows] = -1
+    return rows
+
+
+class PoseBridge:
+  def __init__(self, uri=DEFAULT_URI, subjects=PREDICTION_SUBJECTS, rate=10., step=0.01, turn_deg=30.,
+               turn_axis="x", publish="all", payload_format="json", initial_pose=None, name="posebridge"):
+    if publish not in ("all", "changed"):
+      raise ValueError(f"Unknown publish mode: {publish}")
+    self.rate = rate
+    self.publish = publish
+    self.payload_format = payload_format
+    self.translations, self.rotations = gesture_tables(step, turn_deg, turn_axis)
+    position, orientation = (initial_pose or ((0., 0., 0.), q0))
+    self.state = PoseState(position, orientation)
+    self.gesture_ids = GESTURE_IDS  # also dddtext.cs's "back"
+    self._uuids = []
+
+    self.subscriber = NatsSubscriber(uri, subjects, callback=self.on_message, decode=False, name=name)
+    # poses go out on the subscriber's connection, latest pose per channel
+    self.publisher = CoalescingPublisher(self.subscriber, flush_interval=1. / rate, max_pending=1 << 20)
+    self.stats = {"predictions": 0, "unknown": 0, "ticks": 0, "late_ticks": 0, "updates": 0, "poses": 0}
+    self.tick_ms = collections.deque(maxlen=10000)
+    self.stop = asyncio.Event()
+
+  @staticmethod
+  def channel_for(subject):
+    tokens = subject.split(".")
+    return tokens[1] if len(tokens) == 3 else CHANNEL
+
+  # payload: "left" (dddtext.cs) or {"gesture": "left", ...} (loadgen.py)
+  def on_message(self, message):
+    payload = bytes(message.payload)
+    try:
+      if payload[:1] == b'"' and payload[-1:] == b'"':
+        gesture = payload[1:-1].decode()
+      else:
+        obj = json.loads(payload)
+        gesture = obj.get("gesture") if isinstance(obj, dict) else obj
+    except ValueError:  # includes UnicodeDecodeError
+      gesture = None
+    gesture = self.gesture_ids.get(gesture) if isinstance(gesture, str) else None
+    self.stats["predictions"] += 1
+    if gesture is None:
+      self.stats["unknown"] += 1
+      return
+    row = self.state.row(self.channel_for(message.subject))  # may reallocate pending
+    self.state.pending[row] = gesture  # latest wins within a tick
+
+  def payloads(self, rows):
+    channels = self.state.channels
+    if self.payload_format == "binary":
+      while len(self._uuids) < len(channels):
+        self._uuids.append(channel_uuid(channels[len(self._uuids)]))
+      records = np.zeros(len(rows), dtype=POSE_DTYPE)
+      records["magic"] = POSE_MAGIC
+      records["version"] = VERSION
+      records["channel"] = [self._uuids[row] for row in rows]
+      records["position"] = self.state.position[rows]
+      records["orientation"] = self.state.orientation[rows]
+      size = POSE_DTYPE.itemsize
+      data = records.tobytes()
+      return [(channels[row], data[i * size:(i + 1) * size]) for i, row in enumerate(rows)]
+    positions = self.state.position[rows].tolist()
+    orientations = self.state.orientation[rows].tolist()
+    return [(channels[row], pose_message(x, y, z, q, channels[row]))
+            for row, (x, y, z), q in zip(rows.tolist(), positions, orientations)]
+
+  async def tick(self):
+    start = time.perf_counter()
+    updated = self.state.apply(self.translations, self.rotations)
+    rows = updated if self.publish == "changed" else np.arange(len(self.state))
+    for channel, payload in self.payloads(rows):
+      self.publisher.submit(POSE_SUBJECT, payload, key=channel)
+    self.stats["ticks"] += 1
+    self.stats["updates"] += len(updated)
+    self.stats["poses"] += len(rows)
+    self.tick_ms.append((time.perf_counter() - start) * 1000)
+    await self.publisher.flush()
+
+  async def start(self):
+    await self.publisher.start()
+    await self.subscriber.flush()  # SUBs are active once this returns
+
+  async def close(self):
+    await self.publisher.close()
+
+  async def run(self, duration=None, report_every=0.):
+    interval = 1. / self.rate
+    start = next_time = time.perf_counter()
+    next_report = start + report_every if report_every else None
+    while not self.stop.is_set() and (duration is None or time.perf_counter() - start < duration):
+      await self.tick()
+      next_time += interval
+      delay = next_time - time.perf_counter()
+      if delay > 0:
+        await asyncio.sleep(delay)
+      else:
+        self.stats["late_ticks"] += 1
+        if -delay > interval:
+          next_time = time.perf_counter()  # skip missed ticks instead of bursting
+        await asyncio.sleep(0)
+      if next_report is not None and time.perf_counter() >= next_report:
+        print(self.summary(time.perf_counter() - start), flush=True)
+        next_report += report_every
+
+  def summary(self, elapsed):
+    tick_ms = np.asarray(self.tick_ms) if self.tick_ms else np.zeros(1)
+    return (f"{elapsed:7.1f}s {len(self.state)} channels, {self.stats['predictions'] / elapsed:8.0f} predictions/s, "
+            f"{self.stats['poses'] / elapsed:8.0f} poses/s, tick p50 {np.percentile(tick_ms, 50):.2f} ms "
+            f"p99 {np.percentile(tick_ms, 99):.2f} ms, late ticks {self.stats['late_ticks']}/{self.stats['ticks']}, "
+            f"reconnects {self.subscriber.stats['reconnects']}")
+
+
+# --- throughput test: simulated headsets on a local stand-in
+
+# `channels` headsets spread over `connections` publishers, each sends a random
+# gesture on hand.<channel>.prediction at prediction_rate, spelled like dddtext.cs
+async def simulate_headsets(uri, channels, prediction_rate, stop, connections=4, seed=0):
+  rng = random.Random(seed)
+  sent = [0]
+
+  async def publisher(names):
+    async with NatsPublisher(uri, name="headsets") as nc:
+      await asyncio.sleep(rng.uniform(0, 1. / prediction_rate))
+      next_time = time.perf_counter()
+      while not stop.is_set():
+        frame = b"".join(pub_command(f"hand.{name}.prediction", json.dumps(rng.choice(UNITY_GESTURES))) for name in names)
+        await nc.send_raw(frame)
+        sent[0] += len(names)
+        next_time += 1. / prediction_rate
+        await asyncio.sleep(max(0., next_time - time.perf_counter()))
+
+  names = [f"headset{i:04d}" for i in range(channels)]
+  tasks = [asyncio.create_task(publisher(names[i::connections])) for i in range(connections)]
+  return tasks, sent
+
+
+async def bench(channels=300, prediction_rate=5., duration=10., rate=10., connections=4, payload_format="json",
+                publish="all", report_every=5.):
+  async with NatsStandIn(record=False) as standin:
+    received = [0]
+
+    def on_pose(message):
+      received[0] += 1
+
+    async with NatsSubscriber(standin.uri, [POSE_SUBJECT], callback=on_pose, decode=False, name="pose-sink") as sink:
+      await sink.flush()
+      bridge = PoseBridge(standin.uri, rate=rate, payload_format=payload_format, publish=publish)
+      await bridge.start()
+      stop = asyncio.Event()
+      tasks, sent = await simulate_headsets(standin.uri, channels, prediction_rate, stop, connections)
+      try:
+        await bridge.run(duration, report_every)
+      finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await bridge.close()
+      await asyncio.sleep(0.5)  # in-flight poses
+
+  tick_ms = np.asarray(bridge.tick_ms)
+  return {
+    "channels": len(bridge.state),
+    "duration_s": duration,
+    "predictions_sent_per_s": sent[0] / duration,
+    "predictions_received_per_s": bridge.stats["predictions"] / duration,
+    "unknown_predictions": bridge.stats["unknown"],
+    "pose_updates_per_s": bridge.stats["updates"] / duration,
+    "poses_published_per_s": bridge.stats["poses"] / duration,
+    "poses_received_per_s": received[0] / duration,
+    "ticks": bridge.stats["ticks"],
+    "late_ticks": bridge.stats["late_ticks"],
+    "tick_p50_ms": float(np.percentile(tick_ms, 50)),
+    "tick_p99_ms": float(np.percentile(tick_ms, 99)),
+  }
+
+
+async def serve(args):
+  initial_pose = None
+  if args.initial:
+    x, y, z, qx, qy, qz, qw = load_map_config(args.initial)
+    initial_pose = ((x, y, z), (qx, qy, qz, qw))
+  bridge = PoseBridge(args.uri, args.subject or PREDICTION_SUBJECTS, args.rate, args.step, args.turn_deg,
+                      args.turn_axis, args.publish, args.format, initial_pose)
+  await bridge.start()
+  try:
+    await bridge.run(args.duration, args.report_every)
+  finally:
+    await bridge.close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="turn gesture predictions from many headsets into target poses")
+  parser.add_argument("--uri", default=DEFAULT_URI, help="NATS WebSocket endpoint (ws://127.0.0.1:8081 for natsstandin.py)")
+  parser.add_argument("--subject", action="append", help="Prediction subject(s) (default: hand.prediction, hand.*.prediction)")
+  parser.add_argument("--rate", type=float, default=10., help="Control rate: pose updates + publishes per second")
+  parser.add_argument("--step", type=float, default=0.01, help="Translation per gesture step (m)")
+  parser.add_argument("--turn-deg", type=float, default=30., help="Rotation per turn step (degrees)")
+  parser.add_argument("--turn-axis", default="x", choices=sorted(AXES))
+  parser.add_argument("--publish", default="all", choices=["all", "changed"], help="Every channel each tick, or only updated ones")
+  parser.add_argument("--format", default="json", choices=["json", "binary"], help="Pose payload (binary: jointcodec POSE_DTYPE)")
+  parser.add_argument("--initial", help="Start pose YAML like pose_target.yaml (default: origin, identity)")
+  parser.add_argument("--duration", type=float, default=None, help="Seconds (default: run until interrupted)")
+  parser.add_argument("--report-every", type=float, default=10.)
+  parser.add_argument("--bench", action="store_true", help="Throughput test against a local natsstandin")
+  parser.add_argument("--channels", type=int, default=300, help="Simulated headsets with --bench")
+  parser.add_argument("--prediction-rate", type=float, default=5., help="Predictions per second per headset with --bench")
+  parser.add_argument("--connections", type=int, default=4, help="Publisher connections for the simulated headsets")
+  parser.add_argument("--json", help="Write the --bench result as JSON")
+  args = parser.parse_args()
+
+  if args.bench:
+    result = asyncio.run(bench(args.channels, args.prediction_rate, args.duration or 10., args.rate, args.connections,
+                               args.format, args.publish, args.report_every))
+    print(json.dumps(result, indent=2))
+    if args.json:
+      with open(args.json, "w") as f:
+        json.dump(result, f, indent=2)
+    if result["unknown_predictions"]:
+      raise SystemExit(f"{result['unknown_predictions']} predictions with an unrecognised gesture name")
+  else:
+    asyncio.run(serve(args))
@@ -1,8 +1,8 @@
 import yaml
 import asyncio
 import json
-import websockets
 import argparse
+from natsclient import NatsPublisher, CoalescingPublisher, DEFAULT_URI
 #Extension server: b'MSG subject.pose 1 245\r\n{"position":{"z":-0.062335304915905,"y":-0.026992065832018852,"x":0.044517479836940765},"orientation":{"x":0.58768230676651,"w":-0.3598931133747101,"y":0.3324637711048126,"z":-0.3720678985118866},"channel":"B11772DB-2A8B-4647-A9D3-3B6CD439358C"}\r\n'
 
 #xyzw: x 30deg 
@@ -10,22 +10,39 @@ q30 = [ 0.258819, 0, 0, 0.9659258 ]
 q0 = [ 0., 0., 0., 1. ]
 #xyzw: x -30deg   
 q30inv = [ -0.258819, 0, 0, 0.9659258 ]
-async def send_nats_message(x=0.,y=0.,z=0., quat_target=None):
-  uri = "wss://service.zenimotion.com/nats"
-  # uri = "ws://134.209.218.187:8081/nats"
+CHANNEL = "B11772DB-2A8B-4647-A9D3-3B6CD439350C"
+
+def pose_message(x=0., y=0., z=0., quat_target=None, channel=CHANNEL):
   if not quat_target is None: 
     quat0= quat_target
   else:
     quat0=q0
-  msg_json = json.dumps({"position":{"z": z, "y": y, "x": x}, "orientation":{"x": quat0[0], "w": quat0[3], "y": quat0[1], "z": quat0[2]}, "channel":"B11772DB-2A8B-4647-A9D3-3B6CD439350C"})
-  msglen=len(msg_json)
+  return json.dumps({"position":{"z": z, "y": y, "x": x}, "orientation":{"x": quat0[0], "w": quat0[3], "y": quat0[1], "z": quat0[2]}, "channel": channel})
+
+async def repeat_pose(msg_json, count, rate):
+  for i in range(count):
+    yield msg_json
+    if i + 1 < count:
+      await asyncio.sleep(1. / rate)
+
+# One persistent connection for the whole run, see natsclient.py
+async def send_nats_message(x=0.,y=0.,z=0., quat_target=None, uri=DEFAULT_URI, count=1, rate=10., flush_ms=0.):
+  # uri = "ws://134.209.218.187:8081/nats"
+  msg_json = pose_message(x, y, z, quat_target)
   print(msg_json)
-  async with websockets.connect(uri) as websocket:
-    #message = "PUB subject.pose 5\r\nHello\r\n"
-    #message = 'PUB subject.pose 245\r\n{"position":{"z":-0.062335304915905,"y":-0.026992065832018852,"x":0.144517479836940765},"orientation":{"x":0.58768230676651,"w":-0.3598931133747101,"y":0.3324637711048126,"z":-0.3720678985118866},"channel":"B11772DB-2A8B-4647-A9D3-3B6CD439350C"}\r\n'
-    message = f"PUB subject.pose {msglen}\r\n{msg_json}\r\n"
-    await websocket.send(message)
-    print("Sent message to NATS WebSocket")
+  nc = NatsPublisher(uri)
+  if flush_ms > 0:
+    # coalesced frames, only the latest pose per channel is kept while waiting
+    async with CoalescingPublisher(nc, flush_interval=flush_ms / 1000.) as cp:
+      async for msg in repeat_pose(msg_json, count, rate):
+        cp.submit("subject.pose", msg, key=CHANNEL)
+      await cp.flush()
+      print(f"Sent {cp.stats['sent']} of {cp.stats['submitted']} message(s) in {cp.stats['frames']} frame(s) to NATS WebSocket")
+    return
+  async with nc:
+    await nc.publish_from("subject.pose", repeat_pose(msg_json, count, rate))
+    await nc.flush()
+    print(f"Sent {nc.stats['published']} message(s) to NATS WebSocket")
 
 def load_map_config(yaml_path):
     with open(yaml_path) as f:
@@ -34,12 +51,17 @@ def load_map_config(yaml_path):
     qx, qy, qz, qw = cfg["quat"][:4]
     return x, y, z, qx, qy, qz, qw 
 
-parser = argparse.ArgumentParser(
-        description="send a websocket msg contain target pose")
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(
+          description="send a websocket msg contain target pose")
 
-parser.add_argument("--input", required=False, default="pose_target.yaml", help="Path to raw CSV file")
-args = parser.parse_args()
-x,y,z,qx,qy,qz,qw = load_map_config(args.input)
+  parser.add_argument("--input", required=False, default="pose_target.yaml", help="Path to raw CSV file")
+  parser.add_argument("--uri", default=DEFAULT_URI, help="NATS WebSocket endpoint (ws://127.0.0.1:8081 for natsstandin.py)")
+  parser.add_argument("--count", type=int, default=1, help="How many times to publish the pose")
+  parser.add_argument("--rate", type=float, default=10., help="Messages per second when --count > 1")
+  parser.add_argument("--flush-ms", type=float, default=0., help="Coalesce writes, flushing every N ms (0: one frame per message)")
+  args = parser.parse_args()
+  x,y,z,qx,qy,qz,qw = load_map_config(args.input)
 
-asyncio.run(send_nats_message(x=x, y=y, z=z, quat_target = [qx,qy,qz,qw])) 
+  asyncio.run(send_nats_message(x=x, y=y, z=z, quat_target = [qx,qy,qz,qw], uri=args.uri, count=args.count, rate=args.rate, flush_ms=args.flush_ms)) 
 
@@ -1,20 +1,227 @@
+import os
+import sys
+import json
+import time
+import struct
+import random
 import asyncio
-import websockets
+import inspect
+import argparse
+import collections
+import numpy as np
+from natsclient import NatsPublisher, MsgParser, DEFAULT_URI
 
-async def receive_nats_messages():
-  uri = "wss://service.zenimotion.com/nats"
-  async with websockets.connect(uri) as websocket:
-    #  Correct NATS WebSocket subscription command
-    subscribe_command = "SUB subject.pose 1\r\n"
-    await websocket.send(subscribe_command)
-    print("Subscribed to 'test.subject' on NATS")
+# handconstants.py lives next to the training scripts, one level up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from handconstants import JOINT_NAMES, JOINT_COLUMNS, UNITY_GESTURES  # noqa: E402
 
-    while True:
+# NATS WebSocket subscriber for the pose / hand data subjects.
+#   python websock_recv.py --subject subject.pose --subject hand.>
+#   async with NatsSubscriber(uri, ["subject.pose"]) as sub:
+#     async for message in sub:
+#       print(message.subject, message.data)
+# Builds on NatsPublisher (handshake, PING/PONG, reconnect; SUBs are re-sent on
+# every reconnect). Frames go through MsgParser, payloads stay memoryviews until
+# they are decoded into Pose / JointFrame records (or a plain str / dict / list).
+# Messages go to a callback, or into a bounded queue read with `async for`
+# (oldest dropped when the reader falls behind).
+#
+# Benchmark the parser on a recorded capture:
+#   python websock_recv.py --record capture.bin --count 10000
+#   python websock_recv.py --make-capture capture.bin     (synthetic, no server needed)
+#   python websock_recv.py --bench capture.bin
+
+JOINT_KEYS = JOINT_COLUMNS  # dddtext.cs sends the joints as <Name>_X/_Y/_Z keys
+
+# position (x, y, z), orientation (x, y, z, w), as sent by webs_to_ext.py
+Pose = collections.namedtuple("Pose", "position orientation channel")
+# joints [26, 3] float32 (NaN where Unity had no pose), as sent by dddtext.cs SendHandJointData
+JointFrame = collections.namedtuple("JointFrame", "joints gesture sample_number timestamp")
+# payload is a memoryview, data the decoded record (None with decode=False or on bad JSON)
+# decode may also be a function, e.g. jointcodec.decode for binary payloads
+Message = collections.namedtuple("Message", "subject sid reply payload data")
+
+
+def decode_payload(payload):
+  obj = json.loads(bytes(payload))
+  if isinstance(obj, dict):
+    if "position" in obj and "orientation" in obj:
+      p, q = obj["position"], obj["orientation"]
+      return Pose((p["x"], p["y"], p["z"]), (q["x"], q["y"], q["z"], q["w"]), obj.get("channel"))
+    if "Wrist_X" in obj or "sampleNumber" in obj:
+      nan = float("nan")
+      joints = np.array([obj.get(key, nan) for key in JOINT_KEYS], dtype=np.float32).reshape(len(JOINT_NAMES), 3)
+      return JointFrame(joints, obj.get("gesture"), obj.get("sampleNumber"), obj.get("timestamp"))
+  return obj  # e.g. the "left" string on hand.prediction
+
+
+class NatsSubscriber(NatsPublisher):
+  def __init__(self, uri=DEFAULT_URI, subjects=("subject.pose",), callback=None, decode=True,
+               max_queued=10000, capture=None, **kwargs):
+    super().__init__(uri, **kwargs)
+    self.subjects = list(subjects)
+    self.callback = callback
+    self.decode = decode
+    self.capture = capture  # binary file, every raw frame is appended (see write_capture)
+    self.queue = collections.deque(maxlen=max_queued)
+    self._ready = asyncio.Event()
+    self.stats.update({"received": 0, "decode_errors": 0, "callback_errors": 0, "dropped": 0})
+
+  async def _handshake(self):
+    ws = await super()._handshake()
+    await ws.send(b"".join(b"SUB %s %d\r\n" % (subject.encode(), sid)
+                           for sid, subject in enumerate(self.subjects, 1)))
+    return ws
+
+  def _on_frame(self, frame):
+    if self.capture is not None:
+      data = frame.encode() if isinstance(frame, str) else frame
+      self.capture.write(struct.pack("<I", len(data)) + data)
+
+  async def _on_message(self, subject, sid, reply, payload):
+    self.stats["received"] += 1
+    data = None
+    if self.decode:
+      try:
+        data = self.decode(payload) if callable(self.decode) else decode_payload(payload)
+      except (ValueError, KeyError, TypeError):
+        self.stats["decode_errors"] += 1
+    message = Message(subject, sid, reply, payload, data)
+
+    if self.callback is not None:
       try:
-        message = await websocket.recv()
-        print(f" Received: {message}")
-      except websockets.exceptions.ConnectionClosed:
-        print(" Connection closed by server")
-        break
+        result = self.callback(message)
+        if inspect.isawaitable(result):
+          await result
+      except Exception as e:
+        self.stats["callback_errors"] += 1
+        print(f"Subscriber callback failed on {subject} ({e!r})")
+      return
+
+    if len(self.queue) == self.queue.maxlen:
+      self.stats["dropped"] += 1
+    self.queue.append(message)
+    self._ready.set()
+
+  def __aiter__(self):
+    return self
+
+  async def __anext__(self):
+    while not self.queue:
+      if self._closing:
+        raise StopAsyncIteration
+      self._ready.clear()
+      await self._ready.wait()
+    return self.queue.popleft()
+
+  async def close(self):
+    await super().close()
+    self._ready.set()
+
+
+# --- captures: raw server frames, each prefixed with its length (uint32 LE)
+
+def write_capture(path, frames):
+  with open(path, "wb") as f:
+    for frame in frames:
+      f.write(struct.pack("<I", len(frame)) + frame)
+
+
+def read_capture(path):
+  with open(path, "rb") as f:
+    data = f.read()
+  frames = []
+  pos = 0
+  while pos + 4 <= len(data):
+    (size,) = struct.unpack_from("<I", data, pos)
+    frames.append(data[pos + 4:pos + 4 + size])
+    pos += 4 + size
+  return frames
+
+
+# Synthetic capture: pose messages plus Unity-style indented joint frames and
+# predictions, several MSGs per frame and some split across frame boundaries
+def make_capture(num_messages=20000, per_frame=8, seed=0):
+  rng = random.Random(seed)
+  messages = []
+  for i in range(num_messages):
+    kind = i % 4
+    if kind == 3:
+      joint_frame = {"timestamp": "2025-01-01 12:00:00", "gesture": rng.choice(UNITY_GESTURES), "sampleNumber": i}
+      joint_frame.update({key: round(rng.uniform(-0.2, 0.2), 2) for key in JOINT_KEYS})
+      subject, payload = "hand.jointData", json.dumps(joint_frame, indent=2)
+    elif kind == 2:
+      subject, payload = "hand.prediction", json.dumps(rng.choice(UNITY_GESTURES))
+    else:
+      pose = {"position": {"z": rng.random(), "y": rng.random(), "x": rng.random()},
+              "orientation": {"x": 0.258819, "w": 0.9659258, "y": 0., "z": 0.},
+              "channel": "B11772DB-2A8B-4647-A9D3-3B6CD439350C"}
+      subject, payload = "subject.pose", json.dumps(pose)
+    payload = payload.encode()
+    messages.append(b"MSG %s 1 %d\r\n%s\r\n" % (subject.encode(), len(payload), payload))
+
+  stream = b"".join(messages)
+  frames = []
+  pos = 0
+  chunk = sum(len(m) for m in messages[:per_frame])
+  while pos < len(stream):
+    size = max(1, int(chunk * rng.uniform(0.5, 1.5)))
+    frames.append(stream[pos:pos + size])
+    pos += size
+  return frames
+
+
+def bench(frames, repeat=5):
+  total_bytes = sum(len(f) for f in frames)
+  results = {}
+  for name, decode in (("parse", False), ("parse+decode", True)):
+    best = float("inf")
+    for _ in range(repeat):
+      parser = MsgParser()
+      count = 0
+      start = time.perf_counter()
+      for frame in frames:
+        for op, subject, sid, reply, payload in parser.feed(frame):
+          if op == "MSG":
+            count += 1
+            if decode:
+              decode_payload(payload)
+      best = min(best, time.perf_counter() - start)
+    results[name] = count / best
+    print(f"{name:>13}: {count} msgs, {count / best:,.0f} msgs/s, {total_bytes / best / 1e6:.1f} MB/s")
+  return results
+
+
+async def receive_nats_messages(uri=DEFAULT_URI, subjects=("subject.pose",), count=0, record=None):
+  capture = open(record, "wb") if record else None
+  try:
+    async with NatsSubscriber(uri, subjects, capture=capture) as sub:
+      print(f"Subscribed to {', '.join(subjects)} on {uri}")
+      received = 0
+      async for message in sub:
+        print(f" Received on {message.subject}: {message.data!r}")
+        received += 1
+        if count and received >= count:
+          break
+  finally:
+    if capture is not None:
+      capture.close()
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="subscribe to NATS subjects over WebSocket")
+  parser.add_argument("--uri", default=DEFAULT_URI, help="NATS WebSocket endpoint (ws://127.0.0.1:8081 for natsstandin.py)")
+  parser.add_argument("--subject", action="append", help="Subject to subscribe to, repeatable (default subject.pose)")
+  parser.add_argument("--count", type=int, default=0, help="Stop after this many messages (0: run forever)")
+  parser.add_argument("--record", help="Append every raw frame to this capture file")
+  parser.add_argument("--make-capture", help="Write a synthetic capture to this file and exit")
+  parser.add_argument("--bench", help="Parse this capture file and report msgs/sec")
+  args = parser.parse_args()
 
-asyncio.run(receive_nats_messages()) 
+  if args.make_capture:
+    write_capture(args.make_capture, make_capture())
+    print(f"Wrote synthetic capture to {args.make_capture}")
+  elif args.bench:
+    bench(read_capture(args.bench))
+  else:
+    asyncio.run(receive_nats_messages(args.uri, args.subject or ["subject.pose"], args.count, args.record))